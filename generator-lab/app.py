@@ -1,20 +1,45 @@
 
 import os
+import re
 import json
 import uuid
 import asyncio
 import logging
 import sys
+import time
+import functools
 import base64
+import hashlib
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Form, File, UploadFile
+from fastapi import FastAPI, HTTPException, Form, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from groq import AsyncGroq
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from neo4j import GraphDatabase
+from contextlib import asynccontextmanager
+from executors import run_blocking, shutdown_executors, stage_config
+from embeddings import encode_texts, warmup as warmup_embeddings, embedding_status, MAX_SEQ_LENGTH, EMBEDDING_DIMENSION, QueryEmbeddingCache
+from chunking import chunk_course
+from dedup import NearDuplicateIndex
+from pdf_render import render_course_pdf
+from course_artifacts import artifact_writes, assemble_course, MANIFEST, LEGACY_MASTER
+from github_storage import get_github_storage
+from llm_cache import LLMCache, cache_from_env
+from job_store import job_store_from_env
+from stream_json import IncrementalObjectParser, MalformedStream
+from events import CourseEventBus
+from json_repair import parse_llm_json
+from health import HealthMonitor
+from metrics import PhaseTracker, LLMSpan, render_metrics
+from scheduler import JobScheduler, QueueFull
+from groq_client import ResilientGroq
+from qa_checks import check_course, heuristic_score, CRITICAL
+from prereq_graph import PrerequisiteGraph, GraphCache, GraphSyncer
+from pdf_ingest import spool_upload, UploadTooLarge, pdf_overview, extract_page_range, build_source_context
 
 # Configure Logging
 logging.basicConfig(
@@ -33,8 +58,40 @@ else:
 print(f"[*] DEBUG: PORT from env is {os.getenv('PORT')}")
 print(f"[*] DEBUG: GROQ_API_KEY present? {bool(os.getenv('GROQ_API_KEY'))}")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if neo4j_handler.driver:
+        try:
+            await run_blocking("neo4j", neo4j_handler.ensure_schema)
+            print("[+] Neo4j schema constraints ensured.", flush=True)
+        except Exception as e:
+            print(f"[!] Neo4j schema setup failed: {str(e)}", flush=True)
+    if qdrant_client:
+        try:
+            await run_blocking("qdrant", ensure_qdrant_schema)
+            print("[+] Qdrant collection and payload indexes ensured.", flush=True)
+        except Exception as e:
+            print(f"[!] Qdrant schema setup failed: {str(e)}", flush=True)
+    scheduler.start()
+    graph_sync.start()
+    await resume_interrupted_jobs()
+    if qdrant_client and EMBEDDING_WARMUP:
+        # Load the embedding model off the request path; the server accepts traffic meanwhile
+        task = asyncio.create_task(warmup_embedding_model())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    register_health_probes()
+    health_monitor.start()
+    yield
+    await health_monitor.stop()
+    await scheduler.stop()
+    await graph_sync.stop()
+    # Drain executor pools so in-flight storage/vector writes finish before exit
+    shutdown_executors(wait=True)
+    neo4j_handler.close()
+
 # Initialize Clients
-app = FastAPI(title="SOVAP Course Generator Lab")
+app = FastAPI(title="SOVAP Course Generator Lab", lifespan=lifespan)
 
 # Add CORS Middleware for Production Bridge
 app.add_middleware(
@@ -45,15 +102,105 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Groq Rate Budget + retries (shared by every pipeline in this process)
+# Defaults follow Groq's free-tier limits for llama-3.3-70b-versatile; 0 disables a limit
+# until Groq's x-ratelimit-* response headers report one.
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", 30))
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", 12000))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 4))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", 120))
+# Cheap calls (QA) move to GROQ_FALLBACK_MODEL when the primary model fails or is slower than GROQ_LATENCY_SLO seconds
+GROQ_FALLBACK_MODEL = os.getenv("GROQ_FALLBACK_MODEL", "llama-3.1-8b-instant")
+GROQ_LATENCY_SLO = float(os.getenv("GROQ_LATENCY_SLO", 20))
+MODULE_CONCURRENCY = max(1, int(os.getenv("MODULE_CONCURRENCY", 4)))
+MODULE_MAX_TOKENS = 3500
+
 # Defensive Client Initialization
 groq_api_key = os.getenv("GROQ_API_KEY")
 if not groq_api_key:
     logger.warning("GROQ_API_KEY not found. Course generation will fail.")
     client = None
 else:
-    client = AsyncGroq(api_key=groq_api_key)
+    # Retries and timeouts are handled by ResilientGroq, per model and with the shared budget
+    client = AsyncGroq(api_key=groq_api_key, max_retries=0, timeout=GROQ_TIMEOUT)
     logger.info("AsyncGroq client initialized.")
 
+llm = ResilientGroq(client, GROQ_RPM_LIMIT, GROQ_TPM_LIMIT, GROQ_MAX_RETRIES, GROQ_TIMEOUT, latency_slo=GROQ_LATENCY_SLO)
+module_semaphore = asyncio.Semaphore(MODULE_CONCURRENCY)
+
+# LLM Response Cache (content-addressed, on-disk)
+LLM_MODEL = "llama-3.3-70b-versatile"
+QA_MODEL = os.getenv("GROQ_QA_MODEL", LLM_MODEL)
+# Phase 2 QA: heuristics over every module, LLM audits for at most QA_MAX_AUDITS flagged ones
+QA_MIN_THEORY_WORDS = int(os.getenv("QA_MIN_THEORY_WORDS", 600))
+QA_DUPLICATE_SIMILARITY = float(os.getenv("QA_DUPLICATE_SIMILARITY", 0.8))
+QA_MAX_AUDITS = int(os.getenv("QA_MAX_AUDITS", 4))
+llm_cache = cache_from_env()
+
+# Persistent Job Store (phase + module checkpoints behind /status)
+job_store = job_store_from_env()
+AUTO_RESUME_MAX_ATTEMPTS = int(os.getenv("AUTO_RESUME_MAX_ATTEMPTS", 2))
+
+# Pipeline scheduler: bounded in-flight pipelines, priority queue, duplicate coalescing
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", 2))
+MAX_QUEUED_PIPELINES = int(os.getenv("MAX_QUEUED_PIPELINES", 20))
+RESUME_PRIORITY = 10 # interrupted jobs go ahead of new submissions
+scheduler = JobScheduler(MAX_CONCURRENT_PIPELINES, MAX_QUEUED_PIPELINES)
+
+# Live module events for /stream/{course_id} (server-sent events)
+course_events = CourseEventBus()
+
+# Phase/LLM spans behind /metrics
+phase_tracker = PhaseTracker()
+
+async def set_phase(course_id: str, phase: str):
+    await run_blocking("sqlite", job_store.set_phase, course_id, phase)
+    phase_tracker.start(course_id, phase)
+    course_events.publish(course_id, {"type": "phase", "phase": phase})
+
+async def chat_completion(messages: list, use_cache: bool = True, reserve_tokens: int = 1000, model: str = LLM_MODEL,
+                          fallback_model: Optional[str] = None, **params) -> str:
+    """
+    Single entry point for Groq chat completions: cache lookup, rate budget, call, cache store.
+    use_cache=False skips the lookup but still stores the fresh answer for later runs.
+    `fallback_model` lets cheap calls move to a faster model (see ResilientGroq.complete).
+    """
+    key = LLMCache.make_key(model, messages, params)
+    with LLMSpan(model) as span:
+        if use_cache:
+            cached = await run_blocking("sqlite", llm_cache.get, key)
+            if cached is not None:
+                span.cached()
+                return cached
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        content = await llm.complete(messages, model, span, prompt_chars // 4 + reserve_tokens, fallback_model, **params)
+
+    # The key names `model`: a fallback model's answer is not cached, so the next run asks `model` again
+    if span.fallback_from is None:
+        await run_blocking("sqlite", llm_cache.put, key, content)
+    return content
+
+async def chat_completion_stream(messages: list, on_delta, use_cache: bool = True, reserve_tokens: int = 1000, model: str = LLM_MODEL, **params) -> str:
+    """
+    Streaming twin of chat_completion (same cache keys). Every text delta is passed to
+    `on_delta`; if it raises, the Groq stream is closed so no further tokens are billed.
+    """
+    key = LLMCache.make_key(model, messages, params)
+    with LLMSpan(model, stream=True) as span:
+        if use_cache:
+            cached = await run_blocking("sqlite", llm_cache.get, key)
+            if cached is not None:
+                span.cached()
+                on_delta(cached)
+                return cached
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        content = await llm.stream(messages, model, span, on_delta, prompt_chars // 4 + reserve_tokens, **params)
+
+    await run_blocking("sqlite", llm_cache.put, key, content)
+    return content
+
 # Vector DB Client
 qdrant_url = os.getenv("QDRANT_URL")
 qdrant_key = os.getenv("QDRANT_API_KEY")
@@ -63,16 +210,38 @@ else:
     print("[!] WARNING: Qdrant configuration incomplete. Vectorizing will be skipped.")
     qdrant_client = None
 
-# Global Embedding Model Singleton (To prevent OOM restarts on Render)
-_embedding_model = None
+# Vectorization Settings
+QDRANT_COLLECTION = "sovap_concepts"
+EMBED_BATCH_SIZE = max(1, int(os.getenv("EMBED_BATCH_SIZE", 32)))
+QDRANT_UPSERT_PAGE = max(1, int(os.getenv("QDRANT_UPSERT_PAGE", 128)))
+CONCEPT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://sovap.in/concepts")
+# Concept Unit windows, in embedding-model tokens (MiniLM reads at most MAX_SEQ_LENGTH incl. [CLS]/[SEP])
+CHUNK_MAX_TOKENS = min(int(os.getenv("CHUNK_MAX_TOKENS", MAX_SEQ_LENGTH - 2)), MAX_SEQ_LENGTH - 2)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", 48))
+# Units at or above this cosine similarity collapse into one point (0 disables)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.95))
+DEDUP_AGAINST_EXISTING = os.getenv("DEDUP_AGAINST_EXISTING", "false").lower() in ("1", "true", "yes")
 
-def get_embedding_model():
-    global _embedding_model
-    if _embedding_model is None:
-        print("[*] Loading SentenceTransformer 'all-MiniLM-L6-v2' (Singleton)...", flush=True)
-        from sentence_transformers import SentenceTransformer
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    return _embedding_model
+# Retrieval (/search)
+SEARCH_MAX_QUERIES = int(os.getenv("SEARCH_MAX_QUERIES", 16))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 50))
+query_embeddings = QueryEmbeddingCache(int(os.getenv("QUERY_EMBED_CACHE_SIZE", 4096)))
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes")
+_embedding_readiness = {}  # last warmup result, for when the model lives in "embed" process workers
+_background_tasks = set()
+
+# Source PDF Ingestion (/generate-from-pdf)
+PDF_MAX_UPLOAD_MB = int(os.getenv("PDF_MAX_UPLOAD_MB", 100))
+PDF_PAGES_PER_TASK = max(1, int(os.getenv("PDF_PAGES_PER_TASK", 25)))
+PDF_CONTEXT_CHARS = int(os.getenv("PDF_CONTEXT_CHARS", 4000))
+PDF_EXCERPT_CHARS = 1500
+UPLOAD_DIR = "storage/uploads"
+COURSE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$") # course_id ends up in file paths
+
+# Course Artifacts (Phase 3): manifest.json + per-module shards, plus master.json for existing readers
+COURSE_SHARD_COMPRESSION = os.getenv("COURSE_SHARD_COMPRESSION", "gzip").lower()
+COURSE_WRITE_MASTER_JSON = os.getenv("COURSE_WRITE_MASTER_JSON", "true").lower() in ("1", "true", "yes")
 
 # Knowledge Graph Client (Neo4j)
 class Neo4jHandler:
@@ -80,25 +249,66 @@ class Neo4jHandler:
         uri = os.getenv("NEO4J_URI")
         user = os.getenv("NEO4J_USER")
         password = os.getenv("NEO4J_PASSWORD")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password)) if uri else None
+        # One driver per process; its connection pool is shared by every pipeline
+        pool_size = int(os.getenv("NEO4J_POOL_SIZE", 10))
+        self.driver = GraphDatabase.driver(uri, auth=(user, password), max_connection_pool_size=pool_size) if uri else None
 
     def close(self):
         if self.driver:
             self.driver.close()
 
-    def add_dependency(self, course_id, concept, prerequisite):
+    def ensure_schema(self):
+        """Composite uniqueness on (name, course_id) so every MERGE is an index seek, not a label scan."""
         if not self.driver: return
         with self.driver.session() as session:
-            session.execute_write(self._create_relationship, course_id, concept, prerequisite)
+            try:
+                session.run(
+                    "CREATE CONSTRAINT concept_name_course IF NOT EXISTS "
+                    "FOR (c:Concept) REQUIRE (c.name, c.course_id) IS UNIQUE"
+                ).consume()
+            except Exception as e:
+                # Existing duplicate nodes (or an older server) block the constraint; a plain index still avoids the scan
+                print(f"[!] Neo4j constraint unavailable ({str(e)}), falling back to composite index.", flush=True)
+                session.run(
+                    "CREATE INDEX concept_name_course IF NOT EXISTS "
+                    "FOR (c:Concept) ON (c.name, c.course_id)"
+                ).consume()
+
+    def set_dependencies(self, course_id, concepts, edges):
+        """
+        Makes `edges` the only prerequisites of `concepts` (one transaction): their incoming
+        edges are replaced, and concepts left with no edges at all are removed.
+        """
+        if not self.driver or not concepts: return
+        with self.driver.session() as session:
+            session.execute_write(self._replace_dependencies, course_id, concepts, edges)
 
     @staticmethod
-    def _create_relationship(tx, course_id, concept, prerequisite):
+    def _replace_dependencies(tx, course_id, concepts, edges):
+        record = tx.run(
+            "UNWIND $concepts AS name "
+            "MATCH (p:Concept)-[r:PREREQUISITE_OF]->(c:Concept {name: name, course_id: $course_id}) "
+            "DELETE r RETURN collect(DISTINCT p.name) AS prerequisites",
+            concepts=concepts, course_id=course_id
+        ).single()
+        if edges:
+            Neo4jHandler._merge_dependencies(tx, course_id, edges)
+        candidates = list(set(concepts) | set(record["prerequisites"] if record else []))
+        tx.run(
+            "UNWIND $names AS name "
+            "MATCH (n:Concept {name: name, course_id: $course_id}) WHERE NOT (n)--() DELETE n",
+            names=candidates, course_id=course_id
+        ).consume()
+
+    @staticmethod
+    def _merge_dependencies(tx, course_id, edges):
         query = (
-            "MERGE (c:Concept {name: $concept, course_id: $course_id}) "
-            "MERGE (p:Concept {name: $prerequisite, course_id: $course_id}) "
+            "UNWIND $edges AS edge "
+            "MERGE (c:Concept {name: edge.concept, course_id: $course_id}) "
+            "MERGE (p:Concept {name: edge.prerequisite, course_id: $course_id}) "
             "MERGE (p)-[:PREREQUISITE_OF]->(c)"
         )
-        tx.run(query, concept=concept, prerequisite=prerequisite, course_id=course_id)
+        tx.run(query, edges=edges, course_id=course_id).consume()
 
 neo4j_handler = Neo4jHandler()
 
@@ -119,6 +329,16 @@ class QAStatus(BaseModel):
     score: int
     critical_errors: List[str]
     suggested_fixes: List[str]
+    modules: List[dict] = [] # Per-module heuristic / audit results
+
+class SearchRequest(BaseModel):
+    query: str | None = None
+    queries: List[str] = [] # Batched lookups: one result list per query, in order (after `query`)
+    course_id: str | None = None
+    module: str | None = None
+    type: str | None = None # "theory" or "source"
+    limit: int = 5
+    score_threshold: float | None = None # Drop hits below this cosine similarity
 
 class CourseRequest(BaseModel):
     course_id: str
@@ -129,6 +349,145 @@ class CourseRequest(BaseModel):
     labs_per_module: int = 1
     mcqs_per_module: int = 5 # Reduced for performance/cost during test
     callback_url: str | None = None
+    bypass_cache: bool = False # Force fresh LLM output instead of replaying cached completions
+    resume: bool = False # Reuse checkpointed syllabus/modules/phases from a previous interrupted run
+    stream: bool = False # Stream module completions and publish fields on /stream/{course_id} as they complete
+    priority: int = 0 # Higher runs first when pipelines are queued
+    incremental: bool = False # Diff against the stored course: only changed modules are regenerated, re-embedded and re-linked
+    regenerate_modules: List[int] = [] # With incremental: syllabus positions to rewrite even though their inputs are unchanged
+
+class RegenerateRequest(BaseModel):
+    modules: List[int] = [] # 0-based syllabus positions to rewrite
+    bypass_cache: bool = True # A cached completion would reproduce the module being fixed
+    callback_url: str | None = None
+    stream: bool = False
+    priority: int = 0
+
+def validate_course_id(course_id: str):
+    if not COURSE_ID_PATTERN.match(course_id):
+        raise HTTPException(status_code=400, detail="course_id may only contain letters, digits, '-' and '_'")
+
+def request_key(request: CourseRequest, **extra) -> str:
+    """What makes two submissions for a course the same job (priority only orders the queue)."""
+    return json.dumps({**request.model_dump(exclude={"priority"}), **extra}, sort_keys=True)
+
+async def schedule_pipeline(request: CourseRequest, factory, priority: int, source_pdf: dict | None = None, key: str | None = None) -> dict:
+    """
+    Admits a pipeline run through the scheduler. Identical requests for an active course_id
+    are coalesced and different ones wait behind it; a full queue raises QueueFull. Jobs that
+    get a queue slot are recorded as 'queued' first so a restart does not drop them
+    (`source_pdf` lets a queued PDF job find its upload again).
+    """
+    key = key or request_key(request)
+    if scheduler.state(request.course_id) is None:
+        scheduler.check_admission(request.course_id, key)
+        stored = request.model_dump()
+        if source_pdf:
+            stored["source_pdf"] = source_pdf
+        # Stays on the loop: no other request may interleave between admission, this row and submit()
+        job_store.enqueue_job(request.course_id, request.title, stored)
+    state = await scheduler.submit(request.course_id, factory, priority, key)
+    if state["status"] == "queued" and not state["coalesced"]:
+        course_events.publish(request.course_id, {"type": "queued", "queue_position": state["queue_position"]})
+    return state
+
+def queue_full_response(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail={"message": str(e), "queued": e.queued, "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def resume_interrupted_jobs():
+    """
+    Jobs still 'running' belong to a process that died (e.g. OOM); they are resumed from
+    their checkpoints ahead of new work. Jobs that were still queued are scheduled again as submitted.
+    """
+    kept_uploads = set()
+    for job in await run_blocking("sqlite", job_store.mark_interrupted):
+        source_pdf = job["request"].pop("source_pdf", None)
+        if job["attempts"] > AUTO_RESUME_MAX_ATTEMPTS or not job["request"]:
+            print(f"[!] Not resuming {job['course_id']}: {job['attempts']} attempts already made.", flush=True)
+            if source_pdf:
+                discard_upload(source_pdf["path"])
+            continue
+        if job["queued"]:
+            print(f"[*] Re-queueing {job['course_id']} (was waiting for a slot at shutdown)...", flush=True)
+            request = CourseRequest(**job["request"])
+            priority = request.priority
+        else:
+            print(f"[*] Resuming interrupted pipeline for {job['course_id']} from checkpoints...", flush=True)
+            request = CourseRequest(**{**job["request"], "resume": True})
+            priority = RESUME_PRIORITY
+        if source_pdf and os.path.exists(source_pdf["path"]):
+            # Still spooled, so ingestion never finished: run it again
+            factory = functools.partial(generate_from_pdf_pipeline, request, source_pdf["path"], source_pdf["filename"], source_pdf["vectorize"])
+        else:
+            source_pdf = None
+            factory = functools.partial(generate_pipeline, request.course_id, request)
+        try:
+            await schedule_pipeline(request, factory, priority, source_pdf)
+            if source_pdf:
+                kept_uploads.add(source_pdf["path"])
+        except QueueFull:
+            print(f"[!] Not resuming {job['course_id']}: generation queue is full.", flush=True)
+            if source_pdf:
+                discard_upload(source_pdf["path"])
+    # Anything else in the upload directory belonged to a request that waited behind an active
+    # job (those are not persisted) or to a process that died while spooling
+    if os.path.isdir(UPLOAD_DIR):
+        for name in os.listdir(UPLOAD_DIR):
+            if os.path.join(UPLOAD_DIR, name) not in kept_uploads:
+                discard_upload(os.path.join(UPLOAD_DIR, name))
+
+async def warmup_embedding_model():
+    _embedding_readiness.update(state="loading")
+    try:
+        _embedding_readiness.update(await run_blocking("embed", warmup_embeddings))
+    except Exception as e:
+        _embedding_readiness.update(state="error", error=str(e))
+        print(f"[!] Embedding warmup failed: {str(e)}", flush=True)
+
+def embedding_readiness() -> dict:
+    if stage_config("embed")[0] == "process":
+        return dict(_embedding_readiness) or embedding_status()
+    return embedding_status()
+
+# Dependency probes run in the background; /health only reads the cached snapshot
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 30))
+HEALTH_REMOTE_API_INTERVAL = float(os.getenv("HEALTH_REMOTE_API_INTERVAL", 300)) # Groq/GitHub: spare the API quota
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", 5))
+health_monitor = HealthMonitor(run_blocking, HEALTH_PROBE_TIMEOUT)
+
+async def probe_groq() -> dict:
+    models_page = await client.models.list()
+    return {"models": len(models_page.data)}
+
+def probe_qdrant() -> dict:
+    info = qdrant_client.get_collection(QDRANT_COLLECTION)
+    return {"points": info.points_count}
+
+def probe_neo4j() -> dict:
+    neo4j_handler.driver.verify_connectivity()
+    return {}
+
+async def probe_embeddings() -> dict:
+    status = embedding_readiness()
+    if status.get("state") == "error":
+        raise RuntimeError(status.get("error") or "embedding model failed to load")
+    return status
+
+def register_health_probes():
+    if client:
+        health_monitor.register("groq", probe_groq, HEALTH_REMOTE_API_INTERVAL)
+    if qdrant_client:
+        health_monitor.register("qdrant", probe_qdrant, HEALTH_PROBE_INTERVAL)
+        health_monitor.register("embeddings", probe_embeddings, min(HEALTH_PROBE_INTERVAL, 5))
+    if neo4j_handler.driver:
+        health_monitor.register("neo4j", probe_neo4j, HEALTH_PROBE_INTERVAL)
+    github_storage = get_github_storage()
+    if github_storage:
+        health_monitor.register("github", github_storage.probe, HEALTH_REMOTE_API_INTERVAL)
 
 @app.get("/")
 async def root():
@@ -136,91 +495,438 @@ async def root():
 
 @app.get("/health")
 async def health():
-    groq_available = client is not None
-    qdrant_available = qdrant_client is not None
-    neo4j_available = neo4j_handler.driver is not None
+    checks = health_monitor.snapshot()
 
-    github_ok = False
-    try:
-        from github import Github
-        gh_token = os.getenv("GITHUB_TOKEN")
-        gh_repo = os.getenv("GITHUB_REPO", "ShrE333/sovap1")
-        if gh_token and gh_repo:
-            g = Github(gh_token)
-            r = g.get_repo(gh_repo)
-            github_ok = True
-    except Exception: # Catch any exception during GitHub access
-        github_ok = False
+    def ok(name):
+        return checks.get(name, {}).get("ok") is True
 
     return {
         "status": "UP",
-        "groq": groq_available,
-        "qdrant": qdrant_available,
-        "neo4j": neo4j_available,
-        "github": github_ok,
-        "github_repo": os.getenv("GITHUB_REPO", "ShrE333/sovap1"),
+        "groq": ok("groq"),
+        "qdrant": ok("qdrant"),
+        "neo4j": ok("neo4j"),
+        "github": ok("github"),
+        "github_repo": checks.get("github", {}).get("repo") or os.getenv("GITHUB_REPO", "ShrE333/sovap1"),
+        "checks": checks,
+        "llm_cache": llm_cache.stats(),
+        "embeddings": embedding_readiness(),
+        "query_embedding_cache": query_embeddings.stats(),
+        "scheduler": scheduler.stats(),
+        "groq_budgets": llm.stats(),
+        "graph_cache": prerequisite_graphs.stats(),
+        "graph_sync": graph_sync.stats(),
         "port": os.getenv("PORT", "10000")
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition: phase/pipeline/LLM histograms, token counters, retries, process RSS."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/health/live")
+async def liveness():
+    """Process is up and the event loop is serving; touches no dependency."""
+    return {"status": "UP"}
+
+def scheduled_response(message: str, course_id: str, state: dict) -> dict:
+    if state["coalesced"]:
+        message = f"Generation already {state['status']} for this course"
+    elif state["status"] == "queued":
+        message = f"{message} (queued)"
+    return {"message": message, "course_id": course_id, **state}
+
 @app.post("/generate")
-async def generate_course(request: CourseRequest, background_tasks: BackgroundTasks):
+async def generate_course(request: CourseRequest):
     print(f"[*] Received request to generate course: {request.title} ({request.course_id})", flush=True)
-    background_tasks.add_task(generate_pipeline, request.course_id, request)
-    return {"message": "Generation started", "course_id": request.course_id}
+    validate_course_id(request.course_id)
+    try:
+        state = await schedule_pipeline(request, functools.partial(generate_pipeline, request.course_id, request), request.priority)
+    except QueueFull as e:
+        raise queue_full_response(e)
+    return scheduled_response("Generation started", request.course_id, state)
+
+class UploadSizeLimit:
+    """
+    ASGI guard for upload routes: a body over `max_bytes` gets a 413 from its Content-Length,
+    or as soon as that many bytes have arrived, instead of after Starlette has buffered it all.
+    """
+    def __init__(self, app, paths: tuple, max_bytes: int):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or not self.max_bytes:
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": f"Upload exceeds {PDF_MAX_UPLOAD_MB} MB"}, status_code=413)
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {PDF_MAX_UPLOAD_MB} MB")
+            return message
+        await self.app(scope, limited_receive, send)
+
+# The form fields around the file get 64 KB on top of the file size limit
+app.add_middleware(UploadSizeLimit, paths=("/generate-from-pdf",), max_bytes=PDF_MAX_UPLOAD_MB * 1024 * 1024 + 65536)
 
 @app.post("/generate-from-pdf")
 async def generate_from_pdf(
-    background_tasks: BackgroundTasks,
     course_id: str = Form(...),
     title: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    bypass_cache: bool = Form(False),
+    vectorize_source: bool = Form(False),
+    priority: int = Form(0)
 ):
     print(f"[*] PDF Received: {file.filename} for Course: {course_id}", flush=True)
-    background_tasks.add_task(generate_pipeline, course_id, CourseRequest(course_id=course_id, title=title, description=f"PDF: {file.filename}"))
-    return {"message": "PDF Processing started", "course_id": course_id}
+    validate_course_id(course_id)
+    request = CourseRequest(course_id=course_id, title=title, description=f"PDF: {file.filename}", bypass_cache=bypass_cache, priority=priority)
+    filename = file.filename or "source.pdf"
+    key = request_key(request, vectorize_source=vectorize_source)
+    # Coalesce / reject before spooling up to PDF_MAX_UPLOAD_MB to disk
+    if scheduler.coalesces(course_id, key):
+        return scheduled_response("PDF Processing started", course_id, {**scheduler.state(course_id), "coalesced": True})
+    try:
+        scheduler.check_admission(course_id, key)
+    except QueueFull as e:
+        raise queue_full_response(e)
+    # Spool to disk now: the UploadFile is closed once the response is sent. The path is unique
+    # per request, so a concurrent upload for the same course never overwrites a running job's PDF.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    upload_path = os.path.join(UPLOAD_DIR, f"{course_id}-{uuid.uuid4().hex}.pdf")
+    try:
+        size = await run_blocking("storage", spool_upload, file.file, upload_path, PDF_MAX_UPLOAD_MB * 1024 * 1024)
+    except BaseException as e:
+        discard_upload(upload_path)
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+    print(f"[*] Spooled {size // 1024} KB to {upload_path}", flush=True)
 
-def clean_json_string(s: str) -> str:
-    """Bulletproof JSON extraction and cleaning for AI outputs."""
-    if not s: return "{}"
-    
-    # 1. Extract JSON block
     try:
-        start = s.find('{')
-        end = s.rfind('}') + 1
-        if start != -1 and end != 0:
-            s = s[start:end]
-    except: pass
-
-    # 2. SANITIZATION: Remove literal Control Characters that break json.loads
-    # This handles the "Invalid control character" error (tabs, newlines inside strings)
-    # Replace literal tabs with \t
-    s = s.replace('\t', '\\t')
-    
-    # Complex Regex: Replace literal newlines inside double-quotes while preserving 
-    # newlines that are OUTSIDE quotes (separating fields)
-    import re
-    
-    # This regex finds text inside double quotes and lets us process it
-    def escape_inside_quotes(match):
-        content = match.group(0)
-        # Replace actual newlines with escaped \n inside the string value
-        return content.replace('\n', '\\n').replace('\r', '\\r')
-    
-    # Simple recursive replacement for common pitfalls
-    s = re.sub(r'":\s*"(.*?)"', escape_inside_quotes, s, flags=re.DOTALL)
-    
-    return s
+        state = await schedule_pipeline(
+            request, functools.partial(generate_from_pdf_pipeline, request, upload_path, filename, vectorize_source), priority,
+            source_pdf={"path": upload_path, "filename": filename, "vectorize": vectorize_source}, key=key
+        )
+    except BaseException as e:
+        discard_upload(upload_path)
+        if isinstance(e, QueueFull):
+            raise queue_full_response(e)
+        raise
+    if state["coalesced"]:
+        # The same upload for this course got scheduled while this one was spooling
+        discard_upload(upload_path)
+    return scheduled_response("PDF Processing started", course_id, state)
+
+@app.post("/regenerate/{course_id}")
+async def regenerate_course_modules(course_id: str, request: RegenerateRequest):
+    """Incremental run of a stored course that rewrites only the listed modules (the "fix module 3" case)."""
+    validate_course_id(course_id)
+    stored = await run_blocking("storage", load_stored_course, course_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored course for {course_id}")
+    generation = stored.get("generation") or {}
+    modules_count = generation.get("modules_count") or len(stored.get("modules", []))
+    invalid = [i for i in request.modules if not 0 <= i < modules_count]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Module positions out of range 0..{modules_count - 1}: {invalid}")
+    print(f"[*] Received request to regenerate modules {request.modules} of {course_id}", flush=True)
+    course_request = CourseRequest(
+        course_id=course_id, title=stored.get("title", course_id), description=generation.get("context"),
+        modules_count=modules_count, callback_url=request.callback_url, bypass_cache=request.bypass_cache,
+        stream=request.stream, priority=request.priority, incremental=True, regenerate_modules=request.modules
+    )
+    try:
+        state = await schedule_pipeline(course_request, functools.partial(generate_pipeline, course_id, course_request), request.priority)
+    except QueueFull as e:
+        raise queue_full_response(e)
+    return scheduled_response("Regeneration started", course_id, state)
+
+async def generate_from_pdf_pipeline(request: CourseRequest, upload_path: str, filename: str, vectorize_source: bool):
+    """
+    Phase 0 (ingestion) for uploaded textbooks, then the regular generation pipeline.
+    The upload is kept until ingestion ends, so a run interrupted mid-ingest resumes from it.
+    """
+    course_id = request.course_id
+    stored = request.model_dump()
+    stored["source_pdf"] = {"path": upload_path, "filename": filename, "vectorize": vectorize_source}
+    await run_blocking("sqlite", job_store.start_job, course_id, request.title, stored, resume=request.resume)
+    await set_phase(course_id, "ingest")
+    try:
+        context, outline = await ingest_source_pdf(course_id, upload_path, filename, vectorize_source)
+        request.description = context
+        if outline:
+            # One module per chapter, within sane bounds
+            request.modules_count = max(3, min(len(outline), 12))
+        print(f"[+] PDF condensed into {len(context)} chars of syllabus context.", flush=True)
+    except asyncio.CancelledError:
+        print(f"[!] PDF ingestion for {course_id} interrupted by shutdown; upload kept for resume.", flush=True)
+        raise
+    except Exception as e:
+        print(f"[!] PDF ingestion failed for {course_id}, falling back to title-only generation: {str(e)}", flush=True)
+    discard_upload(upload_path)
+    # Ingestion is not checkpointed, so generation starts fresh with the condensed context
+    request.resume = False
+    await generate_pipeline(course_id, request)
+
+def discard_upload(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class ModuleParseError(ValueError):
+    """The completion for a module was not parseable JSON; carries the raw text for the fallback."""
+    def __init__(self, m_title: str, raw_content: str, cause: Exception):
+        super().__init__(f"JSON Parse error for module {m_title}: {str(cause)}")
+        self.raw_content = raw_content
+
+def fallback_module(m_title: str, raw_content: str) -> dict:
+    """Radical fallback: if it's not JSON, it might just be the theory text."""
+    return {
+        "title": m_title,
+        "theory": raw_content if len(raw_content) > 100 else "Content synthesis failed. Please re-run.",
+        "code_lab": "Review full logs for generation details.",
+        "prerequisites": [],
+        "mcqs": [],
+        "fallback": True # never reused by an incremental run
+    }
+
+async def expand_module(i: int, module: dict, ctx: str, use_cache: bool = True, stream: bool = False, course_id: str | None = None,
+                        course_title: str = "") -> dict:
+    """
+    Phase 1.2 worker: expands one syllabus entry, bounded by the shared semaphore and rate budget.
+    The course title is part of the prompt (and so of the cache key): courses that share a
+    context and module titles must not share modules.
+    """
+    m_title = module.get("title", f"Module {i+1}")
+    module_prompt = f"""
+            You are a Lead Technical Instructor. Write an elite, high-quality intelligence unit for the module: {m_title}.
+            Topics: {module.get('subtopics', [])}. 
+            Course: {course_title}.
+            Overall Course Context: {ctx}.
+
+            Instructions:
+            1. **Theory**: Provide EXTENSIVE, DETAILED intelligence. MUST be at least 1500 words. Cover 'Concept', 'Architecture', 'Security', 'Industry Use Cases'.
+            2. **Format**: Use Markdown.
+            3. **Output**: Return a valid JSON object. Escape all quotes and newlines in the content.
+
+            JSON Structure:
+            {{
+              "title": "{m_title}",
+              "theory": "LONG MARKDOWN CONTENT HERE...",
+              "code_lab": "Step-by-step lab instructions...",
+              "prerequisites": ["concept1", "concept2"],
+              "mcqs": [...]
+            }}
+            """
+    messages = [
+        {"role": "system", "content": "You are a technical educator. Respond ONLY with a valid JSON object. No preamble."},
+        {"role": "user", "content": module_prompt}
+    ]
+
+    params = {"max_tokens": MODULE_MAX_TOKENS}
+    module_expanded = None
+
+    async with module_semaphore:
+        print(f"[*] Expanding Module {i+1}: {m_title}...", flush=True)
+        # We don't use response_format="json_object" here because it's too fragile for 1000+ word outputs on Groq/Llama
+        if not stream:
+            raw_content = await chat_completion(messages, use_cache=use_cache, reserve_tokens=MODULE_MAX_TOKENS, **params)
+        else:
+            if course_id:
+                course_events.publish(course_id, {"type": "module_started", "module": i, "title": m_title})
+            parser = IncrementalObjectParser()
+
+            def on_delta(delta):
+                # Fields are published the moment their JSON value closes; MalformedStream aborts the completion
+                for key, value in parser.feed(delta):
+                    if course_id:
+                        course_events.publish(course_id, {"type": "field", "module": i, "key": key, "value": value})
+
+            try:
+                raw_content = await chat_completion_stream(messages, on_delta, use_cache=use_cache, reserve_tokens=MODULE_MAX_TOKENS, **params)
+            except MalformedStream as abort_err:
+                # What arrived before the abort still goes through the repair engine below
+                print(f"[!] Aborted stream for module {m_title}: {str(abort_err)}", flush=True)
+                raw_content = parser.text
+            if parser.done and not parser.malformed:
+                module_expanded = parser.result
+
+    try:
+        if module_expanded is None:
+            module_expanded = parse_llm_json(raw_content)
+        # A streamed object can close cleanly and still lack the theory, so both paths are checked
+        if not isinstance(module_expanded, dict) or not module_expanded.get("theory"):
+            raise ValueError("no 'theory' field recovered")
+        return module_expanded
+    except Exception as parse_err:
+        # Never replay an unparseable completion on the next run
+        await run_blocking("sqlite", llm_cache.discard, LLMCache.make_key(LLM_MODEL, messages, params))
+        raise ModuleParseError(m_title, raw_content, parse_err)
+
+def store_course_github(course_id: str, full_course: dict, pdf_path: str) -> bool:
+    """
+    Phase 3 GitHub upload (blocking PyGithub calls; run on the 'storage' pool).
+    Returns False when GitHub is not configured so the caller can fall back to local storage.
+    """
+    storage = get_github_storage()
+    if not storage:
+        return False
+
+    print(f"[*] Attempting GitHub commit to {storage.repo_name} on branch {storage.branch}...", flush=True)
+    with open(pdf_path, "rb") as f:
+        pdf_content = f.read()
+
+    prefix = f"courses/{course_id}/"
+    previous = storage.read_file(prefix + MANIFEST)
+    writes, skipped = artifact_writes(
+        full_course, json.loads(previous) if previous else None, COURSE_SHARD_COMPRESSION,
+        COURSE_WRITE_MASTER_JSON, lambda: storage.read_file(prefix + LEGACY_MASTER) is not None
+    )
+    if skipped:
+        print(f"[*] {skipped} module shards unchanged, not re-uploading them", flush=True)
+
+    # Manifest, changed shards and source.pdf land together as one atomic commit
+    storage.commit_files(
+        {f"{prefix}source.pdf": pdf_content, **{prefix + path: content for path, content in writes.items()}},
+        f"Store course {course_id}"
+    )
+
+    print(f"[+] Successfully finished GitHub storage phase for {course_id}", flush=True)
+    return True
+
+def save_course_locally(course_id: str, full_course: dict):
+    root = f"storage/{course_id}"
+    previous = None
+    if os.path.exists(f"{root}/{MANIFEST}"):
+        with open(f"{root}/{MANIFEST}", encoding="utf-8") as f:
+            previous = json.load(f)
+    writes, _ = artifact_writes(
+        full_course, previous, COURSE_SHARD_COMPRESSION,
+        COURSE_WRITE_MASTER_JSON, lambda: os.path.exists(f"{root}/{LEGACY_MASTER}")
+    )
+    for path, content in writes.items():
+        target = f"{root}/{path}"
+        if content is None:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write-then-rename, so readers never see a half-written file
+        with open(target + ".tmp", "wb") as f:
+            f.write(content.encode("utf-8") if isinstance(content, str) else content)
+        os.replace(target + ".tmp", target)
+
+def stored_file_reader(course_id: str):
+    """read(relative path) -> bytes | None for a stored course's files (GitHub when configured, else local storage)."""
+    storage = get_github_storage()
+    if storage:
+        return lambda path: storage.read_bytes(f"courses/{course_id}/{path}")
+
+    def read(path):
+        path = f"storage/{course_id}/{path}"
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+def load_stored_course(course_id: str) -> dict | None:
+    """
+    The stored course (GitHub when configured, else local storage), or None. Assembled from
+    manifest.json and its module shards; courses stored before the manifest come from master.json.
+    """
+    read = stored_file_reader(course_id)
+    manifest = read(MANIFEST)
+    if manifest:
+        try:
+            return assemble_course(json.loads(manifest), read)
+        except ValueError as e:
+            print(f"[!] Stored artifacts for {course_id} are inconsistent ({e}), reading {LEGACY_MASTER}", flush=True)
+    master = read(LEGACY_MASTER)
+    return json.loads(master) if master else None
+
+def load_course_outline(course_id: str) -> dict | None:
+    """Module titles and prerequisites of the stored course: from manifest.json alone when there is one."""
+    manifest = stored_file_reader(course_id)(MANIFEST)
+    if manifest:
+        return json.loads(manifest)
+    return load_stored_course(course_id)
+
+def module_fingerprint(entry: dict, ctx: str) -> str:
+    """Identity of a module's generation inputs: same syllabus entry and course context -> same prompt."""
+    return hashlib.sha1(json.dumps([entry.get("title"), entry.get("subtopics", []), ctx]).encode("utf-8")).hexdigest()
+
+def stored_syllabus(stored: dict, title: str, ctx: str, modules_count: int) -> list | None:
+    """The stored syllabus if this request would prompt for the same one, else None."""
+    if stored.get("title") != title:
+        return None
+    generation = stored.get("generation")
+    if generation:
+        if generation.get("context") != ctx or generation.get("modules_count") != modules_count:
+            return None
+        return generation.get("syllabus")
+    # master.json written before incremental runs: rebuild the syllabus from module titles
+    modules = stored.get("modules", [])
+    return [{"title": m.get("title"), "subtopics": []} for m in modules] if len(modules) == modules_count else None
+
+def reusable_modules(stored: dict, modules_list: list, ctx: str, regenerate: set) -> dict:
+    """{syllabus position: stored module} for modules whose inputs match the stored run and are not to be rewritten."""
+    generation = stored.get("generation")
+    if generation:
+        by_input = {module_fingerprint(entry, generation.get("context")): module
+                    for entry, module in zip(generation.get("syllabus", []), stored.get("modules", []))}
+        key = lambda entry: module_fingerprint(entry, ctx)
+    else:
+        by_input = {module.get("title"): module for module in stored.get("modules", [])}
+        key = lambda entry: entry.get("title")
+    reused = {}
+    for i, entry in enumerate(modules_list):
+        module = by_input.get(key(entry))
+        if module is not None and i not in regenerate and not module.get("fallback"):
+            reused[i] = module
+    return reused
 
 async def generate_pipeline(course_id: str, request: CourseRequest):
     print(f"[*] STARTING PIPELINE for {course_id}: {request.title}", flush=True)
     
     if not client:
         print(f"[!] ERROR: Groq Client not initialized. Check GROQ_API_KEY.", flush=True)
+        # Close the queued row too, or every restart would re-queue a job that cannot run
+        await run_blocking("sqlite", job_store.finish, course_id, "failed", "Groq client not initialized")
+        phase_tracker.finish(course_id, "failed")
+        course_events.publish(course_id, {"type": "done", "status": await run_blocking("sqlite", job_store.get_status, course_id)})
+        course_events.close(course_id)
         return
 
+    use_cache = not request.bypass_cache
+    resume = request.resume
+    await run_blocking("sqlite", job_store.start_job, course_id, request.title, request.model_dump(), resume=resume)
+    phases_done = await run_blocking("sqlite", job_store.phases_done, course_id) if resume else set()
+    full_course = {"course_id": course_id, "title": request.title, "modules": []}
+    pipeline_error = None
+    cancelled = False
+    stored_course = None
+    qa_task = None
+
     try:
+        if request.incremental:
+            stored_course = await run_blocking("storage", load_stored_course, course_id)
+            if stored_course is None:
+                print(f"[*] Incremental run requested but no stored course for {course_id}; generating everything.", flush=True)
+
         # --- PHASE 1.1: SYLLABUS GENERATION ---
-        print(f"[*] Phase 1.1: Generating high-level Syllabus for {request.title}...", flush=True)
+        await set_phase(course_id, "syllabus")
         ctx = request.description if request.description and len(request.description) > 5 else f"A comprehensive course on {request.title}"
         syllabus_prompt = f"""
         You are an Lead Technical Instructor at a Top University. 
@@ -240,372 +946,708 @@ async def generate_pipeline(course_id: str, request: CourseRequest):
         Generate exactly {request.modules_count} distinct and non-overlapping modules.
         """
         
-        syllabus_resp = await client.chat.completions.create(
-            messages=[{"role": "user", "content": syllabus_prompt}],
-            model="llama-3.3-70b-versatile",
-            response_format={"type": "json_object"}
-        )
-        
-        raw_syllabus = syllabus_resp.choices[0].message.content
-        syllabus = json.loads(clean_json_string(raw_syllabus))
-        modules_list = syllabus.get("modules", [])
-        print(f"[*] Syllabus generated with {len(modules_list)} modules.", flush=True)
-        
-        # --- PHASE 1.2: DEPTH EXPANSION (Recursive) ---
-        full_course = {"course_id": course_id, "title": request.title, "modules": []}
+        modules_list = await run_blocking("sqlite", job_store.get_syllabus, course_id) if resume else None
+        previous_syllabus = stored_syllabus(stored_course, request.title, ctx, request.modules_count) if stored_course and modules_list is None else None
+        if modules_list is not None:
+            print(f"[*] Phase 1.1: Resumed checkpointed syllabus with {len(modules_list)} modules.", flush=True)
+        elif previous_syllabus is not None:
+            modules_list = previous_syllabus
+            await run_blocking("sqlite", job_store.save_syllabus, course_id, modules_list)
+            print(f"[*] Phase 1.1: Title and context unchanged, reusing the stored syllabus ({len(modules_list)} modules).", flush=True)
+        else:
+            print(f"[*] Phase 1.1: Generating high-level Syllabus for {request.title}...", flush=True)
+            raw_syllabus = await chat_completion(
+                [{"role": "user", "content": syllabus_prompt}],
+                use_cache=use_cache,
+                response_format={"type": "json_object"}
+            )
+            syllabus = parse_llm_json(raw_syllabus)
+            modules_list = syllabus.get("modules", [])
+            await run_blocking("sqlite", job_store.save_syllabus, course_id, modules_list)
+            print(f"[*] Syllabus generated with {len(modules_list)} modules.", flush=True)
         
-        for i, module in enumerate(modules_list):
-            m_title = module.get("title", f"Module {i+1}")
-            print(f"[*] Expanding Module {i+1}: {m_title}...", flush=True)
-            module_prompt = f"""
-            You are a Lead Technical Instructor. Write an elite, high-quality intelligence unit for the module: {m_title}.
-            Topics: {module.get('subtopics', [])}. 
-            Overall Course Context: {ctx}.
+        full_course["generation"] = {"context": ctx, "modules_count": request.modules_count, "syllabus": modules_list}
 
-            Instructions:
-            1. **Theory**: Provide EXTENSIVE, DETAILED intelligence. MUST be at least 1500 words. Cover 'Concept', 'Architecture', 'Security', 'Industry Use Cases'.
-            2. **Format**: Use Markdown.
-            3. **Output**: Return a valid JSON object. Escape all quotes and newlines in the content.
+        # --- PHASE 1.2: DEPTH EXPANSION (Concurrent) ---
+        await set_phase(course_id, "modules")
+        finished = await run_blocking("sqlite", job_store.completed_modules, course_id) if resume else {}
+        if stored_course is not None:
+            reused = reusable_modules(stored_course, modules_list, ctx, set(request.regenerate_modules))
+            for i, module in reused.items():
+                if i not in finished:
+                    await run_blocking("sqlite", job_store.save_module, course_id, i, module)
+                    finished[i] = module
+            print(f"[*] Incremental: reusing {len(reused)} of {len(modules_list)} stored modules.", flush=True)
+        print(f"[*] Phase 1.2: Expanding {len(modules_list) - len(finished)} modules (concurrency={MODULE_CONCURRENCY}, checkpointed={len(finished)})...", flush=True)
 
-            JSON Structure:
-            {{
-              "title": "{m_title}",
-              "theory": "LONG MARKDOWN CONTENT HERE...",
-              "code_lab": "Step-by-step lab instructions...",
-              "prerequisites": ["concept1", "concept2"],
-              "mcqs": [...]
-            }}
-            """
-            
-            # Use a more robust approach for long JSON content
-            # We don't use response_format="json_object" here because it's too fragile for 1000+ word outputs on Groq/Llama
-            chunk_resp = await client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a technical educator. Respond ONLY with a valid JSON object. No preamble."},
-                    {"role": "user", "content": module_prompt}
-                ],
-                model="llama-3.3-70b-versatile",
-                max_tokens=3500
-            )
-            
-            raw_content = chunk_resp.choices[0].message.content
-            try:
-                cleaned_str = clean_json_string(raw_content)
-                module_expanded = json.loads(cleaned_str, strict=False)
-            except Exception as parse_err:
-                print(f"[!] JSON Parse error for module {m_title}: {str(parse_err)}", flush=True)
-                # Radical fallback: if it's not JSON, it might just be the theory text
-                module_expanded = {
-                    "title": m_title,
-                    "theory": raw_content if len(raw_content) > 100 else "Content synthesis failed. Please re-run.",
-                    "code_lab": "Review full logs for generation details.",
-                    "prerequisites": [],
-                    "mcqs": []
-                }
-            
-            full_course["modules"].append(module_expanded)
-            
-            # Memory Cleanup: Free up string memory after each step
-            import gc
-            gc.collect()
-
-        # --- PHASE 2: AI QA AGENT ---
-        print(f"[*] Phase 2: Running AI QA Agent...", flush=True)
-        qa_agent = CourseQA(course_id)
-        report = await qa_agent.validate(full_course)
-        
-        if report.status == "FAIL":
-            print(f"[!] QA NOTIFIED FAIL for {course_id}: {report.critical_errors}", flush=True)
-            print(f"[*] PROCEEDING REGARDLESS because 'Generative Success' is priority 1.", flush=True)
-            # We don't return here anymore, we save it so the user can see what the AI outputted.
-        else:
-            print(f"[+] QA PASSED for {course_id} with score {report.score}/100", flush=True)
+        async def expand_and_checkpoint(i, module):
+            if i in finished:
+                return finished[i]
+            expanded = await expand_module(i, module, ctx, use_cache, request.stream, course_id, request.title)
+            # Only clean expansions are checkpointed, so a resume retries failed/fallback modules
+            await run_blocking("sqlite", job_store.save_module, course_id, i, expanded)
+            return expanded
+
+        # gather() keeps syllabus order; return_exceptions stops one failed module from cancelling the rest
+        results = await asyncio.gather(
+            *(expand_and_checkpoint(i, module) for i, module in enumerate(modules_list)),
+            return_exceptions=True
+        )
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                m_title = modules_list[i].get("title", f"Module {i+1}")
+                print(f"[!] Module {i+1} ({m_title}) failed: {str(result)}", flush=True)
+                course_events.publish(course_id, {"type": "module_failed", "module": i, "error": str(result)})
+                result = fallback_module(m_title, getattr(result, "raw_content", ""))
+            course_events.publish(course_id, {"type": "module_done", "module": i, "content": result})
+            full_course["modules"].append(result)
+
+        if phases_done and len(finished) < len(modules_list):
+            # Fresh module content invalidates whatever the earlier run stored downstream
+            phases_done = set()
+            await run_blocking("sqlite", job_store.clear_phases_done, course_id)
+
+        # Memory Cleanup: Free up raw completion strings
+        import gc
+        gc.collect()
+
+        # --- PHASE 2: AI QA AGENT (runs alongside Phase 3) ---
+        print(f"[*] Phase 2: Running QA checks in the background...", flush=True)
+        qa_agent = CourseQA(course_id, use_cache=use_cache)
+        # The report never blocks delivery, so storage does not wait for the audits.
+        # QA overlaps storage, so it is timed by its own span rather than a set_phase() one.
+        qa_task = asyncio.create_task(qa_agent.validate(full_course))
 
         # --- PHASE 3: STORAGE (GitHub) ---
-        print(f"[*] Phase 3: Committing course to GitHub...", flush=True)
-        
+        await set_phase(course_id, "storage")
+        if "storage" in phases_done:
+            print(f"[*] Phase 3: Already stored in a previous run, skipping.", flush=True)
+        elif stored_course == full_course:
+            print(f"[*] Phase 3: Course unchanged since the stored version, skipping.", flush=True)
+            await run_blocking("sqlite", job_store.mark_phase_done, course_id, "storage")
+        else:
+            print(f"[*] Phase 3: Committing course to GitHub...", flush=True)
+            try:
+                # 1. Generate PDF (CPU-bound: process pool)
+                pdf_path = f"storage/{course_id}/course.pdf"
+                os.makedirs(f"storage/{course_id}", exist_ok=True)
+                await run_blocking("pdf", render_course_pdf, request.title, full_course.get("modules", []), pdf_path)
+                print(f"[*] Local PDF generated at {pdf_path}", flush=True)
+
+                # 2. Upload to GitHub (network-bound: storage thread pool)
+                stored = await run_blocking("storage", store_course_github, course_id, full_course, pdf_path)
+                if not stored:
+                    # Local Save Fallback
+                    await run_blocking("storage", save_course_locally, course_id, full_course)
+                    print(f"[!] GITHUB_TOKEN or REPO not set. Course saved locally in storage/{course_id}/", flush=True)
+                prerequisite_graphs.invalidate(course_id)
+                await run_blocking("sqlite", job_store.mark_phase_done, course_id, "storage")
+            except Exception as e:
+                print(f"[GH-ERROR] Storage phase failed for {course_id}: {str(e)}", flush=True)
+
         try:
-            # 1. Generate PDF
-            pdf_path = f"storage/{course_id}/course.pdf"
-            os.makedirs(f"storage/{course_id}", exist_ok=True)
-            from fpdf import FPDF
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("helvetica", size=12)
-            pdf.cell(200, 10, txt=f"Course: {request.title}", ln=1, align='C')
-            
-            # Simple PDF content
-            for module in full_course.get("modules", []):
-                pdf.ln(10)
-                pdf.set_font("helvetica", style="B", size=14)
-                pdf.cell(0, 10, txt=f"Module: {module.get('title', 'Untitled')}", ln=1)
-                pdf.set_font("helvetica", size=11)
-                # Unicode-safe text cleanup
-                content_text = str(module.get("theory", "No content available."))
-                # Strip or replace characters that aren't in Latin-1 to prevent fpdf crashes
-                safe_text = content_text.encode('ascii', 'ignore').decode('ascii')
-                pdf.multi_cell(0, 7, txt=safe_text)
-                
-            pdf.output(pdf_path)
-            print(f"[*] Local PDF generated at {pdf_path}", flush=True)
-
-            # 2. Upload to GitHub
-            from github import Github, GithubException
-            gh_token = os.getenv("GITHUB_TOKEN")
-            # Force correct repo based on user request
-            gh_repo_name = "ShrE333/sovap-course-storage" 
-            gh_branch = os.getenv("GITHUB_BRANCH", "main")
-            
-            print(f"[*] Attempting GitHub commit to {gh_repo_name} on branch {gh_branch}...", flush=True)
-
-            if gh_token and gh_repo_name:
-                g = Github(gh_token)
-                repo = None
-                try:
-                    repo = g.get_repo(gh_repo_name)
-                    print(f"[+] Connected to repo: {gh_repo_name}", flush=True)
-                except Exception as e:
-                    print(f"[!] FAILED to get repo {gh_repo_name}: {str(e)}", flush=True)
-                    try:
-                        # Try fallback 1: append username if missing
-                        if "/" not in gh_repo_name:
-                            fallback_repo = f"ShrE333/{gh_repo_name}"
-                            print(f"[*] Trying fallback 1: {fallback_repo}", flush=True)
-                            repo = g.get_repo(fallback_repo)
-                    except: 
-                        # Try the specific storage repo the user mentioned
-                        try:
-                            print(f"[*] Trying specific storage repo: ShrE333/sovap-course-storage", flush=True)
-                            repo = g.get_repo("ShrE333/sovap-course-storage")
-                        except: pass
-                    
-                    # Try fallback 2: use the primary project repo confirmed in logs
-                    if not repo:
-                        try:
-                            primary_repo = "ShrE333/sovap1"
-                            print(f"[*] Trying fallback 2 (Primary): {primary_repo}", flush=True)
-                            repo = g.get_repo(primary_repo)
-                        except Exception as final_e:
-                            print(f"[!!] ALL GITHUB FALLBACKS FAILED: {str(final_e)}", flush=True)
-                            raise final_e
-                
-                # Helper to update or create
-                def push_to_gh(path, message, content):
-                    try:
-                        try:
-                            # Try to get existing file
-                            contents = repo.get_contents(path, ref=gh_branch)
-                            sha = contents.sha
-                            repo.update_file(
-                                path=path,
-                                message=f"Update {message}",
-                                content=content,
-                                sha=sha,
-                                branch=gh_branch
-                            )
-                            print(f"[*] GitHub Updated: {path}", flush=True)
-                        except GithubException as e:
-                            if e.status == 404:
-                                repo.create_file(
-                                    path=path,
-                                    message=f"Create {message}",
-                                    content=content,
-                                    branch=gh_branch
-                                )
-                                print(f"[*] GitHub Created: {path}", flush=True)
-                            else:
-                                raise
-                    except Exception as ge:
-                        print(f"[!] Failed to push {path} to GitHub: {str(ge)}", flush=True)
-
-                # Save JSON
-                print(f"[*] Pushing master.json for {course_id}...", flush=True)
-                push_to_gh(
-                    f"courses/{course_id}/master.json",
-                    f"master JSON for {course_id}",
-                    json.dumps(full_course, indent=2)
-                )
-                
-                # Save PDF
-                with open(pdf_path, "rb") as f:
-                    pdf_content = f.read()
-                
-                print(f"[*] Pushing source.pdf for {course_id}...", flush=True)
-                push_to_gh(
-                    f"courses/{course_id}/source.pdf",
-                    f"course PDF for {course_id}",
-                    pdf_content
-                )
-                
-                print(f"[+] Successfully finished GitHub storage phase for {course_id}", flush=True)
+            report = await qa_task
+            course_events.publish(course_id, {"type": "qa", "report": report.model_dump()})
+            if report.status == "FAIL":
+                print(f"[!] QA NOTIFIED FAIL for {course_id}: {report.critical_errors}", flush=True)
+                print(f"[*] PROCEEDING REGARDLESS because 'Generative Success' is priority 1.", flush=True)
+                # We don't return here anymore, we save it so the user can see what the AI outputted.
             else:
-                # Local Save Fallback
-                with open(f"storage/{course_id}/master.json", "w") as f:
-                    json.dump(full_course, f, indent=2)
-                print(f"[!] GITHUB_TOKEN or REPO not set. Course saved locally in storage/{course_id}/", flush=True)
-        except Exception as e:
-            print(f"[GH-ERROR] Storage phase failed for {course_id}: {str(e)}", flush=True)
+                print(f"[+] QA PASSED for {course_id} with score {report.score}/100", flush=True)
+        except Exception as qe:
+            print(f"[!] Phase 2 (QA) Failed: {str(qe)}", flush=True)
 
         # --- PHASE 4: VECTOR CHUNKING ---
-        try:
-            print(f"[*] Phase 4: Chunking and Vectorizing Concept Units...", flush=True)
-            await vectorize_course(course_id, full_course)
-        except Exception as ve:
-            print(f"[!] Phase 4 (Vectorization) Failed: {str(ve)}", flush=True)
-            print("[*] Continuing pipeline to ensure course delivery...", flush=True)
+        await set_phase(course_id, "vectorize")
+        if "vectorize" in phases_done:
+            print(f"[*] Phase 4: Already vectorized in a previous run, skipping.", flush=True)
+        else:
+            try:
+                print(f"[*] Phase 4: Chunking and Vectorizing Concept Units...", flush=True)
+                await vectorize_course(course_id, full_course)
+                await run_blocking("sqlite", job_store.mark_phase_done, course_id, "vectorize")
+            except Exception as ve:
+                print(f"[!] Phase 4 (Vectorization) Failed: {str(ve)}", flush=True)
+                print("[*] Continuing pipeline to ensure course delivery...", flush=True)
 
         # --- PHASE 5: KNOWLEDGE GRAPH ---
-        try:
-            print(f"[*] Phase 5: Building Knowledge Graph in Neo4j...", flush=True)
-            await build_knowledge_graph(course_id, full_course)
-        except Exception as nge:
-            print(f"[!] Phase 5 (Knowledge Graph) Failed: {str(nge)}", flush=True)
-            print("[*] Continuing pipeline...", flush=True)
+        await set_phase(course_id, "graph")
+        if "graph" in phases_done:
+            print(f"[*] Phase 5: Graph already built in a previous run, skipping.", flush=True)
+        else:
+            try:
+                print(f"[*] Phase 5: Building prerequisite graph...", flush=True)
+                # A resumed run cannot tell whether the stored copy predates it, so it relinks every module
+                build_knowledge_graph(course_id, full_course, None if resume else stored_course)
+                if not neo4j_handler.driver:
+                    await run_blocking("sqlite", job_store.mark_phase_done, course_id, "graph")
+                # Otherwise graph_sync marks the phase done once the Neo4j write lands
+            except Exception as nge:
+                print(f"[!] Phase 5 (Knowledge Graph) Failed: {str(nge)}", flush=True)
+                print("[*] Continuing pipeline...", flush=True)
 
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
     except Exception as e:
         print(f"[EX] Pipeline CRITICAL failure for {course_id}: {str(e)}", flush=True)
         import traceback
         traceback.print_exc()
+        pipeline_error = str(e)
         
     finally:
-        # --- PHASE 6: CALLBACK (Guaranteed) ---
-        if request.callback_url:
-            print(f"[*] Phase 6: Sending completion callback to {request.callback_url}...", flush=True)
-            try:
-                import requests
-                # If we have a full course with modules, marks it as pending approval
-                # If critical failure occurred early, we might want to flag it, but for now allow approval of what exists
-                is_valid = len(full_course.get("modules", [])) > 0
+        if qa_task and not qa_task.done():
+            qa_task.cancel()
+        if cancelled:
+            # Shutdown: the job row stays 'running', so the next start marks it interrupted and resumes it
+            print(f"[!] Pipeline for {course_id} interrupted by shutdown; left for resume.", flush=True)
+            phase_tracker.finish(course_id, "interrupted")
+        else:
+            # --- PHASE 6: CALLBACK (Guaranteed) ---
+            await set_phase(course_id, "callback")
+            if request.callback_url:
+                print(f"[*] Phase 6: Sending completion callback to {request.callback_url}...", flush=True)
+                try:
+                    import requests
+                    # If we have a full course with modules, marks it as pending approval
+                    # If critical failure occurred early, we might want to flag it, but for now allow approval of what exists
+                    is_valid = len(full_course.get("modules", [])) > 0
                 
-                callback_data = {
-                    "course_id": course_id,
-                    "status": "published" if is_valid else "rejected", # Auto-publish (No Approval)
-                    "modules_count": len(full_course.get("modules", []))
-                }
-                requests.post(request.callback_url, json=callback_data, timeout=10)
-                print(f"[+] Callback delivered successfully.", flush=True)
-            except Exception as e:
-                print(f"[!] Callback failed: {str(e)}", flush=True)
+                    callback_data = {
+                        "course_id": course_id,
+                        "status": "published" if is_valid else "rejected", # Auto-publish (No Approval)
+                        "modules_count": len(full_course.get("modules", []))
+                    }
+                    await run_blocking("callback", requests.post, request.callback_url, json=callback_data, timeout=10)
+                    print(f"[+] Callback delivered successfully.", flush=True)
+                except Exception as e:
+                    print(f"[!] Callback failed: {str(e)}", flush=True)
+
+            if full_course.get("modules"):
+                await run_blocking("sqlite", job_store.finish, course_id, "completed", pipeline_error)
+                phase_tracker.finish(course_id, "completed")
+            else:
+                await run_blocking("sqlite", job_store.finish, course_id, "failed", pipeline_error or "No modules generated")
+                phase_tracker.finish(course_id, "failed")
+            course_events.publish(course_id, {"type": "done", "status": await run_blocking("sqlite", job_store.get_status, course_id)})
+            course_events.close(course_id)
 
 class CourseQA:
-    def __init__(self, course_id: str):
+    """
+    Phase 2: local heuristics (qa_checks) over every module, then concurrent LLM audits of
+    only the modules they flag. A clean course costs no LLM call at all.
+    """
+    def __init__(self, course_id: str, use_cache: bool = True):
         self.course_id = course_id
+        self.use_cache = use_cache
 
     async def validate(self, course_data: dict) -> QAStatus:
-        """AI Agent evaluates content via Groq."""
-        # Structural sanity check for prompt
-        summary = {
-            "title": course_data.get("title"),
-            "modules_count": len(course_data.get("modules", [])),
-            "modules_preview": [m.get("title") for m in course_data.get("modules", [])],
-        }
+        with phase_tracker.overlapping(self.course_id, "qa"):
+            return await self._validate(course_data)
+
+    async def _validate(self, course_data: dict) -> QAStatus:
+        modules = course_data.get("modules", [])
+        if not modules:
+            return QAStatus(status="FAIL", score=0, critical_errors=["No modules generated"], suggested_fixes=[])
+
+        issues = await run_blocking("qa", check_course, modules, QA_MIN_THEORY_WORDS, QA_DUPLICATE_SIMILARITY)
+        reports = [{
+            "module": i,
+            "title": module.get("title"),
+            "issues": [message for _, message in found],
+            "score": heuristic_score(found),
+            "status": "FAIL" if any(severity == CRITICAL for severity, _ in found) else "PASS",
+            "audited": False,
+        } for i, (module, found) in enumerate(zip(modules, issues))]
 
+        # Worst first; fallback content is known bad, so auditing it would waste a call
+        flagged = [i for i, found in enumerate(issues) if found and not modules[i].get("fallback")]
+        audited = sorted(flagged, key=lambda i: reports[i]["score"])[:QA_MAX_AUDITS]
+        print(f"[*] QA heuristics flagged {sum(1 for found in issues if found)} of {len(modules)} modules; "
+              f"auditing {len(audited)} with the LLM.", flush=True)
+        audits = await asyncio.gather(
+            *(self.audit_module(course_data.get("title"), i, modules[i], reports[i]["issues"]) for i in audited),
+            return_exceptions=True
+        )
+
+        critical_errors, suggested_fixes = [], []
+        for i, audit in zip(audited, audits):
+            if isinstance(audit, Exception):
+                print(f"[!] QA audit of module {i+1} failed, keeping heuristic result: {str(audit)}", flush=True)
+                continue
+            reports[i].update(status=audit.status, score=audit.score, audited=True)
+            critical_errors += [f"Module {i+1}: {error}" for error in audit.critical_errors]
+            suggested_fixes += [f"Module {i+1}: {fix}" for fix in audit.suggested_fixes]
+        for report, found in zip(reports, issues):
+            if not report["audited"]:
+                critical_errors += [f"Module {report['module']+1}: {message}" for severity, message in found if severity == CRITICAL]
+            if report["status"] == "FAIL":
+                suggested_fixes.append(f"Module {report['module']+1}: regenerate it (POST /regenerate/{self.course_id} with modules [{report['module']}])")
+
+        return QAStatus(
+            status="FAIL" if any(r["status"] == "FAIL" for r in reports) else "PASS",
+            score=round(sum(r["score"] for r in reports) / len(reports)),
+            critical_errors=critical_errors,
+            suggested_fixes=suggested_fixes,
+            modules=reports
+        )
+
+    async def audit_module(self, course_title: str, i: int, module: dict, issues: list) -> QAStatus:
+        """AI Agent evaluates one flagged module via Groq."""
         prompt = f"""
-        Audit our generated Intelligence Unit. 
-        Summary: {json.dumps(summary)}
-        Sample Content: {json.dumps(course_data.get('modules', [{}])[0].get('theory', ''))[:1500]}
-        
-        Analyze:
-        1. Contextual Accuracy: Does the intro match the topic?
-        2. Structural Integrity: Are there modules and MCQ components?
-        3. Educational Value: Is the theory substantial?
-        
+        Audit one module of our generated course '{course_title}'.
+        Module {i+1}: {module.get("title")}
+        Automated checks flagged: {json.dumps(issues)}
+        Theory excerpt: {json.dumps(str(module.get("theory", ""))[:2500])}
+        MCQs: {json.dumps(module.get("mcqs", []))[:1000]}
+
+        Decide whether the flagged problems make this module unusable for a student.
         Return JSON: status (PASS/FAIL), score (0-100), critical_errors (list), suggested_fixes (list).
-        PASS if it's usable for a student. FAIL only if it's empty or completely gibberish.
+        FAIL only if the module is empty, gibberish, or its MCQs are unusable.
         """
-        
-        chat_completion = await client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
+
+        raw_report = await chat_completion(
+            [{"role": "user", "content": prompt}],
+            use_cache=self.use_cache,
+            reserve_tokens=500,
+            model=QA_MODEL,
+            fallback_model=GROQ_FALLBACK_MODEL or None,
             response_format={"type": "json_object"}
         )
-        
-        report_data = json.loads(chat_completion.choices[0].message.content)
+
+        report_data = parse_llm_json(raw_report)
         return QAStatus(**report_data)
 
+def unit_key(unit: tuple) -> tuple:
+    """(module key, chunk index) of a unit: theory by module position (titles may repeat), source by its label."""
+    module_title, idx, _, metadata = unit
+    return metadata.get("module_index", module_title), idx
+
+def concept_point_id(course_id: str, unit: tuple) -> str:
+    """Deterministic point ID so re-vectorizing a course overwrites instead of duplicating."""
+    module_key, chunk_index = unit_key(unit)
+    return str(uuid.uuid5(CONCEPT_ID_NAMESPACE, f"{course_id}:{module_key}:{chunk_index}"))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
 async def vectorize_course(course_id: str, course_data: dict):
     """
     Implements Phase 4: Chunk by Concept Unit.
     Vectorizes theory into Qdrant using semantic markers.
+    Diffed against the course's stored points: unchanged chunks keep their point and are not
+    re-embedded, and points of chunks or modules that no longer exist are deleted.
     """
     if not qdrant_client:
         print("[!] Qdrant not configured. Skipping vectorization.")
         return
 
-    model = get_embedding_model()
+    units = await run_blocking("embed", chunk_course, course_data, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_MIN_TOKENS)
+    existing = await run_blocking("qdrant", existing_theory_points, course_id)
+    ids = [concept_point_id(course_id, unit) for unit in units]
 
-    points = []
-    for module in course_data.get("modules", []):
-        module_title = module.get("title", "Unknown Module")
-        theory = module.get("theory", "")
-        
-        # Split theory into paragraphs/concepts (Simplified concept unit logic)
-        chunks = [c.strip() for c in theory.split("\n\n") if len(c.strip()) > 50]
-        
-        for idx, chunk in enumerate(chunks):
-            # Use singleton model for encoding
-            embedding = model.encode(chunk).tolist()
-            point_id = str(uuid.uuid4())
-            
-            points.append(models.PointStruct(
+    kept = {
+        point_id for point_id, (_, _, text, metadata) in zip(ids, units)
+        if point_id in existing and existing[point_id]["content"] == text
+        and existing[point_id]["heading_path"] == metadata["heading_path"]
+    }
+    # Collapsed chunks only exist as back-references on their canonical point
+    collapsed = {
+        (ref.get("module_index", ref["module"]), ref["chunk_index"]): (point_id, ref)
+        for point_id in kept for ref in existing[point_id]["duplicates"] if ref.get("type") == "theory"
+    }
+    refs = {point_id: [ref for ref in existing[point_id]["duplicates"] if ref.get("type") != "theory"] for point_id in kept}
+    fresh, fresh_ids = [], set()
+    for point_id, unit in zip(ids, units):
+        if point_id in kept:
+            continue
+        canonical = collapsed.get(unit_key(unit))
+        if canonical and canonical[1].get("content_hash") == content_hash(unit[2]):
+            refs[canonical[0]].append(canonical[1])
+            continue
+        fresh.append(unit)
+        fresh_ids.add(point_id)
+    # Fresh units overwrite their own IDs (or delete them when collapsed); everything else left over is stale
+    stale = [point_id for point_id in existing if point_id not in kept and point_id not in fresh_ids]
+
+    dedup = await near_duplicate_index(course_id, "theory")
+    dedup.seed(list(kept), [existing[point_id]["vector"] for point_id in kept])
+    dedup.back_refs.update(refs)
+    for point_id in kept:
+        if refs[point_id] != existing[point_id]["duplicates"]:
+            await run_blocking("qdrant", qdrant_client.set_payload, collection_name=QDRANT_COLLECTION,
+                               payload={"duplicates": refs[point_id]}, points=[point_id])
+    total = await embed_and_upsert(course_id, fresh, "theory", dedup)
+    if stale:
+        await run_blocking("qdrant", qdrant_client.delete, collection_name=QDRANT_COLLECTION,
+                           points_selector=models.PointIdsList(points=stale))
+    print(f"[+] Phase 4: Vectorized {total} concept units for {course_id} ({len(units) - len(fresh)} unchanged, "
+          f"{dedup.collapsed} near-duplicates collapsed, {len(stale)} stale points removed)")
+
+async def near_duplicate_index(course_id: str, unit_type: str) -> NearDuplicateIndex:
+    """Dedup state for one vectorization run, optionally seeded with the course's points of other unit types."""
+    dedup = NearDuplicateIndex(DEDUP_THRESHOLD)
+    if dedup.enabled and DEDUP_AGAINST_EXISTING:
+        try:
+            ids, vectors = await run_blocking("qdrant", existing_course_vectors, course_id, unit_type)
+            dedup.seed(ids, vectors)
+        except Exception as e:
+            print(f"[!] Could not load existing points for dedup: {str(e)}", flush=True)
+    return dedup
+
+def ensure_qdrant_schema():
+    """Creates the collection if missing and keyword payload indexes for the /search filters (idempotent)."""
+    if not qdrant_client.collection_exists(QDRANT_COLLECTION):
+        qdrant_client.create_collection(
+            collection_name=QDRANT_COLLECTION,
+            vectors_config=models.VectorParams(size=EMBEDDING_DIMENSION, distance=models.Distance.COSINE)
+        )
+    # course_id is the tenant key: every lookup is scoped to one course
+    try:
+        qdrant_client.create_payload_index(
+            collection_name=QDRANT_COLLECTION, field_name="course_id",
+            field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True)
+        )
+    except Exception:
+        qdrant_client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name="course_id", field_schema=models.PayloadSchemaType.KEYWORD)
+    for field in ("module", "type"):
+        qdrant_client.create_payload_index(collection_name=QDRANT_COLLECTION, field_name=field, field_schema=models.PayloadSchemaType.KEYWORD)
+
+def existing_course_vectors(course_id: str, exclude_type: str) -> tuple:
+    """Scrolls the course's points of other types (the ones of `exclude_type` are about to be rewritten)."""
+    ids, vectors = [], []
+    offset = None
+    scroll_filter = models.Filter(
+        must=[models.FieldCondition(key="course_id", match=models.MatchValue(value=course_id))],
+        must_not=[models.FieldCondition(key="type", match=models.MatchValue(value=exclude_type))]
+    )
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=QDRANT_COLLECTION, scroll_filter=scroll_filter, limit=256,
+            offset=offset, with_payload=False, with_vectors=True
+        )
+        for point in points:
+            ids.append(str(point.id))
+            vectors.append(point.vector)
+        if offset is None:
+            return ids, vectors
+
+def existing_theory_points(course_id: str) -> dict:
+    """{point id: content, heading_path, duplicates, vector} for the course's theory points."""
+    points = {}
+    offset = None
+    scroll_filter = models.Filter(must=[
+        models.FieldCondition(key="course_id", match=models.MatchValue(value=course_id)),
+        models.FieldCondition(key="type", match=models.MatchValue(value="theory")),
+    ])
+    while True:
+        page, offset = qdrant_client.scroll(
+            collection_name=QDRANT_COLLECTION, scroll_filter=scroll_filter, limit=256, offset=offset,
+            with_payload=["content", "metadata", "duplicates"], with_vectors=True
+        )
+        for point in page:
+            payload = point.payload or {}
+            points[str(point.id)] = {
+                "content": payload.get("content"),
+                "heading_path": (payload.get("metadata") or {}).get("heading_path"),
+                "duplicates": payload.get("duplicates", []),
+                "vector": point.vector,
+            }
+        if offset is None:
+            return points
+
+async def embed_and_upsert(course_id: str, units, unit_type: str, dedup: Optional[NearDuplicateIndex] = None) -> int:
+    """
+    Encodes (module_title, chunk_index, text, metadata) units in batches and upserts them in bounded
+    pages as they are produced, so peak memory is one page regardless of course size.
+    With a `dedup` index, near-duplicates are not upserted: the point they collapse into gets a
+    `duplicates` back-reference instead, and any stale point under their ID is deleted.
+    """
+    total = 0
+    page = {}
+    back_refs = dedup.back_refs if dedup else {}
+    late_refs = set() # canonical points already upserted (or pre-existing) when a duplicate arrived
+    collapsed_ids = []
+
+    async def flush_page():
+        nonlocal page, total
+        if page:
+            await run_blocking("qdrant", qdrant_client.upsert, collection_name=QDRANT_COLLECTION, points=list(page.values()))
+            total += len(page)
+            page = {}
+
+    async def encode_batch(batch):
+        embeddings = await run_blocking("embed", encode_texts, [text for _, _, text, _ in batch], EMBED_BATCH_SIZE)
+        ids = [concept_point_id(course_id, unit) for unit in batch]
+        matches = dedup.assign(ids, embeddings) if dedup else [None] * len(batch)
+        for point_id, (module_title, idx, chunk, metadata), embedding, match in zip(ids, batch, embeddings, matches):
+            if match:
+                canonical_id, similarity = match
+                refs = back_refs.setdefault(canonical_id, [])
+                refs.append({"module": module_title, "chunk_index": idx, "type": unit_type,
+                             "similarity": round(similarity, 4), "content_hash": content_hash(chunk)})
+                if "module_index" in metadata:
+                    refs[-1]["module_index"] = metadata["module_index"]
+                if canonical_id in page:
+                    page[canonical_id].payload["duplicates"] = refs
+                else:
+                    late_refs.add(canonical_id)
+                collapsed_ids.append(point_id)
+                continue
+            page[point_id] = models.PointStruct(
                 id=point_id,
-                vector=embedding,
+                vector=embedding.tolist(),
                 payload={
                     "course_id": course_id,
                     "module": module_title,
                     "content": chunk,
-                    "type": "theory",
+                    "type": unit_type,
                     "metadata": {
                         "chunk_index": idx,
-                        "difficulty": "basic" # Default
+                        "difficulty": "basic", # Default
+                        **metadata
                     }
                 }
-            ))
+            )
+        if len(page) >= QDRANT_UPSERT_PAGE:
+            await flush_page()
 
-    # Batch upsert to Qdrant
-    if points:
-        qdrant_client.upsert(
-            collection_name="sovap_concepts",
-            points=points
-        )
-    
-    print(f"[+] Phase 4: Vectorized {len(points)} concept units for {course_id}")
+    batch = []
+    for unit in units:
+        batch.append(unit)
+        if len(batch) >= EMBED_BATCH_SIZE:
+            await encode_batch(batch)
+            batch = []
+    if batch:
+        await encode_batch(batch)
+    await flush_page()
 
+    for canonical_id in late_refs:
+        await run_blocking("qdrant", qdrant_client.set_payload, collection_name=QDRANT_COLLECTION,
+                           payload={"duplicates": back_refs[canonical_id]}, points=[canonical_id])
+    if collapsed_ids:
+        await run_blocking("qdrant", qdrant_client.delete, collection_name=QDRANT_COLLECTION,
+                           points_selector=models.PointIdsList(points=collapsed_ids))
+    return total
 
-async def build_knowledge_graph(course_id: str, course_data: dict):
+async def ingest_source_pdf(course_id: str, pdf_path: str, filename: str, vectorize: bool) -> tuple:
     """
-    Implements Phase 5: Build a concept dependency graph.
-    Extracts prerequisites from course structure and maps them in Neo4j.
+    Extracts a spooled PDF page range by page range on the 'pdf_extract' process pool.
+    Only `workers` ranges are in flight at once, and each range is reduced to headings,
+    an excerpt and (optionally) source chunks that are vectorized before the next window,
+    so memory stays bounded for 500-page textbooks.
+    Returns (syllabus context, top-level outline).
     """
-    if not neo4j_handler.driver:
-        print("[!] Neo4j not configured. Skipping Knowledge Graph build.")
-        return
+    overview = await run_blocking("pdf_extract", pdf_overview, pdf_path)
+    pages = overview["pages"]
+    _, workers = stage_config("pdf_extract")
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, pages)) for start in range(0, pages, PDF_PAGES_PER_TASK)]
+    vectorize = vectorize and qdrant_client is not None
+    print(f"[*] Ingesting {filename}: {pages} pages in {len(ranges)} ranges (workers={workers}, vectorize={vectorize})", flush=True)
+
+    headings, excerpt = [], ""
+    chunk_index = 0
+    vectors = 0
+    dedup = await near_duplicate_index(course_id, "source") if vectorize else None
+    for w in range(0, len(ranges), workers):
+        window = ranges[w:w + workers]
+        results = await asyncio.gather(*(
+            run_blocking("pdf_extract", extract_page_range, pdf_path, start, end, vectorize, PDF_EXCERPT_CHARS if start == 0 else 0)
+            for start, end in window
+        ))
+        for result in results:
+            headings.extend(result["headings"])
+            excerpt = excerpt or result["excerpt"]
+        if vectorize:
+            units = []
+            for result in results:
+                for page_no, text in result["chunks"]:
+                    units.append((f"Source: {filename}", chunk_index, f"[p.{page_no}] {text}", {"page": page_no}))
+                    chunk_index += 1
+            vectors += await embed_and_upsert(course_id, units, "source", dedup)
+        del results
 
+    if vectorize:
+        print(f"[+] Vectorized {vectors} source chunks for {course_id} ({dedup.collapsed} near-duplicates collapsed)", flush=True)
+    context = build_source_context(filename, overview, headings, excerpt, PDF_CONTEXT_CHARS)
+    return context, overview["outline"]
+
+def module_prerequisites(course_data: dict) -> dict:
+    """{module title: [prerequisite, ...]} in course order, without blanks or repeats."""
+    prerequisites = {}
     for module in course_data.get("modules", []):
         module_name = module.get("title")
+        if not module_name: continue
         # LLM-generated modules should include a 'prerequisites' list
-        prereqs = module.get("prerequisites", [])
-        
-        for prereq in prereqs:
-            neo4j_handler.add_dependency(course_id, module_name, prereq)
+        names = prerequisites.setdefault(module_name, [])
+        for prereq in module.get("prerequisites", []):
+            if isinstance(prereq, str) and prereq.strip() and prereq not in names:
+                names.append(prereq)
+    return prerequisites
+
+def build_knowledge_graph(course_id: str, course_data: dict, stored: Optional[dict] = None) -> PrerequisiteGraph:
+    """
+    Implements Phase 5: Build a concept dependency graph.
+    The graph is built in-process from each module's prerequisites and cached for /graph;
+    Neo4j gets it as a write-behind (see sync_knowledge_graph).
+    """
+    current = module_prerequisites(course_data)
+    graph = PrerequisiteGraph(current)
+    prerequisite_graphs.put(course_id, graph)
+    for cycle in graph.cycles:
+        print(f"[!] Prerequisite cycle in {course_id}: {' -> '.join(cycle + cycle[:1])}", flush=True)
+    if graph.dangling:
+        print(f"[*] {len(graph.dangling)} prerequisites of {course_id} are not taught by any module: {graph.dangling}", flush=True)
+    print(f"[+] Phase 5: Prerequisite graph ready for {course_id} ({graph.edges} edges, acyclic={graph.acyclic})")
+
+    if not neo4j_handler.driver:
+        print("[!] Neo4j not configured. Skipping Knowledge Graph sync.")
+        return graph
+    graph_sync.enqueue(course_id, current, None if stored is None else module_prerequisites(stored))
+    return graph
+
+async def sync_knowledge_graph(course_id: str, current: dict, previous: Optional[dict]):
+    """
+    Writes a course's prerequisites to Neo4j (runs on the GraphSyncer task).
+    Given the previously written prerequisites, only modules whose prerequisites changed (or
+    that were removed) are relinked; otherwise every module's edges are replaced.
+    """
+    if previous is None:
+        concepts = list(current)
+    else:
+        concepts = [name for name in dict.fromkeys([*current, *previous]) if current.get(name) != previous.get(name)]
+        if not concepts:
+            print(f"[*] Graph sync: Prerequisites unchanged for {course_id}, graph left as is.")
+            return
+
+    edges = []
+    for module_name in concepts:
+        for prereq in current.get(module_name, []):
+            edges.append({"concept": module_name, "prerequisite": prereq})
             print(f"[*] Graph Edge: {prereq} -> PREREQUISITE_OF -> {module_name}")
 
-    print(f"[+] Phase 5: Knowledge Graph constructed for {course_id}")
+    # Single transaction per course instead of one round trip per edge
+    await run_blocking("neo4j", neo4j_handler.set_dependencies, course_id, concepts, edges)
 
+    print(f"[+] Graph sync: Knowledge Graph updated in Neo4j for {course_id} ({len(concepts)} concepts relinked)")
 
-@app.get("/status/{course_id}")
-async def get_status(course_id: str):
-    github_repo = os.getenv("GITHUB_REPO", "NOT_SET")
+# Prerequisite graphs: queries are answered in-process, Neo4j is a write-behind copy
+prerequisite_graphs = GraphCache(int(os.getenv("GRAPH_CACHE_SIZE", 256)))
+# Pending writes are journaled in the job store; the graph phase is done once its write lands
+graph_sync = GraphSyncer(sync_knowledge_graph, int(os.getenv("GRAPH_SYNC_MAX_ATTEMPTS", 5)),
+                         journal=job_store, on_synced=functools.partial(job_store.mark_phase_done, phase="graph"))
+
+async def course_graph_for(course_id: str) -> PrerequisiteGraph:
+    graph = prerequisite_graphs.get(course_id)
+    if graph is None:
+        outline = await run_blocking("storage", load_course_outline, course_id)
+        if outline is None:
+            raise HTTPException(status_code=404, detail=f"No stored course {course_id}")
+        graph = PrerequisiteGraph(module_prerequisites(outline))
+        prerequisite_graphs.put(course_id, graph)
+    return graph
+
+@app.get("/graph/{course_id}")
+async def course_graph(course_id: str, concept: str | None = None):
+    """
+    The course's prerequisite graph: learning order, cycles, dangling prerequisites and each
+    module's transitive prerequisites. With `concept`, what to learn before it and what it unlocks.
+    """
+    graph = await course_graph_for(course_id)
+    if concept is None:
+        return {"course_id": course_id, **graph.summary(), "closure": graph.closure()}
+    name = graph.find(concept)
+    if name is None:
+        raise HTTPException(status_code=404, detail=f"Concept '{concept}' is not part of {course_id}")
     return {
-        "course_id": course_id, 
-        "storage_mode": "GITHUB",
-        "repository": github_repo,
-        "github_token_present": bool(os.getenv("GITHUB_TOKEN")),
-        "message": "Check GitHub repository for course files."
+        "course_id": course_id,
+        "concept": name,
+        "prerequisites": graph.prerequisites(name),
+        "before": graph.before(name),
+        "unlocks": graph.unlocks(name),
     }
 
+@app.get("/stream/{course_id}")
+async def stream_course(course_id: str):
+    """Server-sent events: phase changes, module fields as they are parsed, and a final 'done'."""
+    async def event_source():
+        async for event in course_events.subscribe(course_id):
+            if event["type"] == "heartbeat":
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def embed_queries(queries: list) -> list:
+    """Query vectors from the LRU; all misses are encoded together in one batch."""
+    vectors = [query_embeddings.get(q) for q in queries]
+    misses = {query_embeddings.key(q): q for q, v in zip(queries, vectors) if v is None}
+    if misses:
+        # With "embed" process workers the model lives there; encoding on "search" threads would
+        # load a second copy into the API process
+        stage = "embed" if stage_config("embed")[0] == "process" else "search"
+        encoded = await run_blocking(stage, encode_texts, list(misses.values()), EMBED_BATCH_SIZE)
+        fresh = {}
+        for key, q, vector in zip(misses, misses.values(), encoded):
+            fresh[key] = vector.tolist()
+            query_embeddings.put(q, fresh[key])
+        vectors = [v if v is not None else fresh[query_embeddings.key(q)] for q, v in zip(queries, vectors)]
+    return vectors
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    if not qdrant_client:
+        raise HTTPException(status_code=503, detail="Qdrant not configured")
+    queries = ([request.query] if request.query else []) + [q for q in request.queries if q.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="Provide `query` or `queries`")
+    if len(queries) > SEARCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_MAX_QUERIES} queries per request")
+    started = time.perf_counter()
+
+    conditions = [
+        models.FieldCondition(key=field, match=models.MatchValue(value=value))
+        for field, value in (("course_id", request.course_id), ("module", request.module), ("type", request.type))
+        if value
+    ]
+    query_filter = models.Filter(must=conditions) if conditions else None
+    limit = min(max(1, request.limit), SEARCH_MAX_LIMIT)
+
+    vectors = await embed_queries(queries)
+    responses = await run_blocking(
+        "search", qdrant_client.query_batch_points, collection_name=QDRANT_COLLECTION,
+        requests=[
+            models.QueryRequest(query=vector, filter=query_filter, limit=limit,
+                                score_threshold=request.score_threshold, with_payload=True)
+            for vector in vectors
+        ]
+    )
+    results = [
+        [{"id": str(point.id), "score": round(point.score, 4), **(point.payload or {})} for point in response.points]
+        for response in responses
+    ]
+    return {"results": results, "took_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+@app.get("/status/{course_id}")
+async def get_status(course_id: str):
+    status = await run_blocking("sqlite", job_store.get_status, course_id)
+    if not status:
+        raise HTTPException(status_code=404, detail=f"No generation job recorded for {course_id}")
+    status["storage_mode"] = "GITHUB" if os.getenv("GITHUB_TOKEN") else "LOCAL"
+    active = scheduler.state(course_id)
+    if active:
+        status["queue_position"] = active["queue_position"]
+    return status
+
 if __name__ == "__main__":
-    import uvicorn
     # Render and other hosts provide a PORT environment variable
-    port = int(os.getenv("PORT", 10000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    port = os.getenv("PORT", "10000")
+    # Re-exec as `uvicorn app:app`: spawned pool workers re-import the __main__ module, and
+    # when that is this file every worker would rebuild the Groq/Qdrant/Neo4j clients
+    os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "app:app", "--host", "0.0.0.0", "--port", port,
+                              "--app-dir", os.path.dirname(os.path.abspath(__file__))])
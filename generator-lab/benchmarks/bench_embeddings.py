@@ -0,0 +1,91 @@
+"""
+Benchmark: embedding backends (sentence-transformers vs onnx vs onnx-int8).
+
+Each backend runs in a fresh interpreter so cold start and memory are measured honestly.
+Reports, per backend:
+- cold start: import + model load + first encode, from a clean process
+- peak RSS of that process after encoding the sample
+- throughput in sentences/sec over the sample (batch size 32, after warmup)
+- mean/min cosine agreement with the first backend's vectors (drift check before
+  switching backends on an existing Qdrant collection)
+
+Usage (from generator-lab/):
+    python benchmarks/bench_embeddings.py [--backends sentence-transformers,onnx,onnx-int8] [--sentences 512]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def sample_sentences(n: int) -> list:
+    """Concept-Unit-like text of mixed length, similar to what vectorize_course encodes."""
+    topics = ["TCP handshakes", "binary search trees", "gradient descent", "SQL joins", "Python decorators",
+              "HTTP caching", "public key cryptography", "React hooks", "Docker layers", "graph traversal"]
+    sentences = []
+    for i in range(n):
+        topic = topics[i % len(topics)]
+        sentences.append(f"Module {i // 8 + 1}: {topic}. " + "This lesson explains the core idea with an example. " * (1 + i % 6))
+    return sentences
+
+WORKER = r"""
+import os, sys, json, time, resource
+started = time.perf_counter()
+os.environ["EMBEDDING_BACKEND"] = sys.argv[1]
+sys.path.insert(0, sys.argv[2])
+import numpy as np
+from embeddings import encode_texts
+encode_texts(["warmup"])
+cold = time.perf_counter() - started
+sentences = json.load(open(sys.argv[3]))
+started = time.perf_counter()
+vectors = encode_texts(sentences, 32)
+elapsed = time.perf_counter() - started
+np.save(sys.argv[4], vectors)
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"cold_start_s": cold, "rss_mb": rss_mb, "sent_per_s": len(sentences) / elapsed}))
+"""
+
+def run_backend(backend: str, sentences_path: str, vectors_path: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", WORKER, backend, os.path.join(HERE, ".."), sentences_path, vectors_path],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="sentence-transformers,onnx,onnx-int8")
+    parser.add_argument("--sentences", type=int, default=512)
+    args = parser.parse_args()
+
+    import numpy as np
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        sentences_path = os.path.join(tmp, "sentences.json")
+        with open(sentences_path, "w") as f:
+            json.dump(sample_sentences(args.sentences), f)
+
+        print(f"Sample: {args.sentences} sentences\n")
+        print(f"{'backend':<22} {'cold start s':>12} {'peak RSS MB':>12} {'sent/s':>9} {'cos mean':>9} {'cos min':>8}")
+        baseline = None
+        for backend in backends:
+            vectors_path = os.path.join(tmp, f"{backend}.npy")
+            result = run_backend(backend, sentences_path, vectors_path)
+            if "error" in result:
+                print(f"{backend:<22} error: {result['error']}")
+                continue
+            vectors = np.load(vectors_path)
+            if baseline is None:
+                baseline = vectors
+            cosines = (vectors * baseline).sum(axis=1)
+            print(f"{backend:<22} {result['cold_start_s']:>12.2f} {result['rss_mb']:>12.0f} "
+                  f"{result['sent_per_s']:>9.1f} {cosines.mean():>9.4f} {cosines.min():>8.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: json_repair.parse_llm_json vs the legacy clean_json_string.
+
+Reports, per implementation:
+- recovery rate over json_repair_corpus.jsonl (module/syllabus outputs reconstructed
+  to cover each malformation Llama produces for our prompts: fences, raw newlines,
+  stray quotes, truncation at max_tokens, echoed `[...]` templates, ...)
+- throughput on the corpus and on a synthetic long module (quoted terms and raw
+  newlines throughout the theory), plus whether that long output was recovered
+
+Usage (from generator-lab/):
+    python benchmarks/bench_json_repair.py [--iterations 200] [--long-kb 64]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from json_repair import parse_llm_json
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_repair_corpus.jsonl")
+
+def legacy_clean_json_string(s: str) -> str:
+    """Verbatim behaviour of the pre-repair-engine clean_json_string (baseline)."""
+    if not s: return "{}"
+    try:
+        start = s.find('{')
+        end = s.rfind('}') + 1
+        if start != -1 and end != 0:
+            s = s[start:end]
+    except: pass
+    s = s.replace('\t', '\\t')
+    def escape_inside_quotes(match):
+        content = match.group(0)
+        return content.replace('\n', '\\n').replace('\r', '\\r')
+    s = re.sub(r'":\s*"(.*?)"', escape_inside_quotes, s, flags=re.DOTALL)
+    return s
+
+def legacy_parse(s: str):
+    return json.loads(legacy_clean_json_string(s), strict=False)
+
+IMPLEMENTATIONS = {
+    "legacy clean_json_string": legacy_parse,
+    "json_repair.parse_llm_json": parse_llm_json,
+}
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def recovered(case: dict, parse) -> bool:
+    try:
+        data = parse(case["raw"])
+    except Exception:
+        return False
+    if not isinstance(data, dict) or any(k not in data for k in case["expect_keys"]):
+        return False
+    return all(data.get(k) == v for k, v in case["expect"].items())
+
+def long_output(kb: int) -> str:
+    """A well-formed-looking module whose theory has raw newlines and many short quoted terms."""
+    paragraph = 'The "handshake" step: the client sends SYN,\nthe server replies "SYN-ACK", then "ACK".\n\n'
+    theory = paragraph * max(1, (kb * 1024) // len(paragraph))
+    return '{"title": "Long Module", "theory": "' + theory + '", "code_lab": "done", "mcqs": []}'
+
+def throughput(parse, inputs: list, iterations: int) -> float:
+    total_bytes = sum(len(s.encode("utf-8")) for s in inputs) * iterations
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for s in inputs:
+            try:
+                parse(s)
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - start
+    return total_bytes / elapsed / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--long-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    raws = [c["raw"] for c in corpus]
+    long_inputs = [long_output(args.long_kb)]
+
+    print(f"Corpus: {len(corpus)} cases | long input: {args.long_kb} KB\n")
+    print(f"{'implementation':<30} {'recovered':>10} {'corpus MB/s':>12} {'long MB/s':>10} {'long ok':>8}")
+    per_case = {}
+    for name, parse in IMPLEMENTATIONS.items():
+        ok = [recovered(c, parse) for c in corpus]
+        per_case[name] = ok
+        corpus_mbps = throughput(parse, raws, args.iterations)
+        long_mbps = throughput(parse, long_inputs, max(1, args.iterations // 20))
+        long_ok = recovered({"raw": long_inputs[0], "expect_keys": ["theory", "code_lab", "mcqs"], "expect": {"code_lab": "done"}}, parse)
+        print(f"{name:<30} {sum(ok):>4}/{len(ok):<5} {corpus_mbps:>12.2f} {long_mbps:>10.2f} {'yes' if long_ok else 'no':>8}")
+
+    print("\nPer case (legacy / repair):")
+    names = list(IMPLEMENTATIONS)
+    for i, case in enumerate(corpus):
+        marks = " / ".join("ok " if per_case[n][i] else "FAIL" for n in names)
+        print(f"  {case['case']:<26} {marks}   ({case['failure']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+In-process stand-ins for Groq, Qdrant, Neo4j, GitHub and the embedding model.
+
+Used by loadtest.py to drive the real FastAPI app without API credits or live services.
+Every fake has configurable latency; FakeGroq also injects errors. Shapes mirror exactly
+what app.py reads from each SDK (choices[0].message.content, usage, x_groq.usage on the
+last stream chunk, session().execute_write, commit_files, ...), nothing more.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import types
+
+def _ns(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+def fake_status_error(status: int, retry_after: float | None = None):
+    """A real groq.APIStatusError subclass, so the client's retry classification applies."""
+    import groq
+    import httpx
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions"))
+    error = groq.RateLimitError if status == 429 else groq.InternalServerError
+    return error(f"fake Groq {status}", response=response, body=None)
+
+def _usage(prompt: str, completion: str):
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    return _ns(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+def canned_syllabus(prompt: str) -> str:
+    m = re.search(r"Generate exactly (\d+)", prompt)
+    count = int(m.group(1)) if m else 5
+    return json.dumps({"modules": [
+        {"title": f"Module {i + 1}: Topic {i + 1}", "subtopics": ["Fundamentals", "Applications", "Best practices"]}
+        for i in range(count)
+    ]})
+
+def canned_module(prompt: str, theory_words: int) -> str:
+    m = re.search(r"intelligence unit for the module: (.+?)\.\n", prompt)
+    title = m.group(1) if m else "Module"
+    sections = []
+    for s in range(1, 5):
+        body = " ".join(f"{title} concept {s}.{w} explains how the system behaves under load." for w in range(theory_words // 40))
+        sections.append(f"## Section {s}\n\n{body}\n\n```python\nprint('lab {s}')\n```")
+    # Shared boilerplate so the near-duplicate stage has something to collapse
+    sections.append("## Summary\n\nIn this module you learned the key ideas and practiced them in the lab.")
+    return json.dumps({
+        "title": title,
+        "theory": "\n\n".join(sections),
+        "code_lab": "1. Clone the repo\n2. Run the lab",
+        "prerequisites": ["Fundamentals", f"Basics of {title.split(':')[0]}"],
+        "mcqs": [{"question": f"Q{q}?", "options": ["A", "B", "C", "D"], "answer": "A"} for q in range(5)],
+    })
+
+QA_REPORT = json.dumps({"status": "PASS", "score": 90, "critical_errors": [], "suggested_fixes": []})
+
+class FakeGroq:
+    """
+    AsyncGroq look-alike: client.chat.completions.with_raw_response.create(...) (headers +
+    parse()) and client.models.list(). Injected errors are 503s, or 429s with Retry-After.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, error_rate: float = 0.0,
+                 theory_words: int = 1500, stream_chunk_chars: int = 400, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.theory_words = theory_words
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self.chat = _ns(completions=_ns(create=self._create, with_raw_response=_ns(create=self._create_raw)))
+        self.models = _ns(list=self._list_models)
+
+    async def _list_models(self):
+        return _ns(data=[_ns(id="llama-3.3-70b-versatile")])
+
+    def _answer(self, messages: list) -> str:
+        prompt = messages[-1]["content"]
+        if "intelligence unit for the module" in prompt:
+            return canned_module(prompt, self.theory_words)
+        if "syllabus" in prompt:
+            return canned_syllabus(prompt)
+        return QA_REPORT
+
+    async def _create(self, messages: list, model: str, stream: bool = False, **params):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self._random.gauss(self.latency, self.jitter)))
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise fake_status_error(429, 0.5) if self.errors % 2 else fake_status_error(503)
+        content = self._answer(messages)
+        usage = _usage("".join(m["content"] for m in messages), content)
+        if not stream:
+            return _ns(usage=usage, choices=[_ns(message=_ns(content=content))])
+        return FakeStream(self._stream(content, usage))
+
+    async def _create_raw(self, **kwargs):
+        result = await self._create(**kwargs)
+
+        async def parse():
+            return result
+        headers = {"x-ratelimit-limit-tokens": "1000000000", "x-ratelimit-remaining-tokens": "1000000000"}
+        return _ns(headers=headers, parse=parse)
+
+    async def _stream(self, content: str, usage):
+        step = self.stream_chunk_chars
+        for i in range(0, len(content), step):
+            await asyncio.sleep(0)
+            yield _ns(choices=[_ns(delta=_ns(content=content[i:i + step]))], x_groq=None, usage=None)
+        yield _ns(choices=[], x_groq=_ns(usage=usage), usage=None)
+
+class FakeStream:
+    """AsyncStream look-alike: async iteration plus close()."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self._chunks.__aiter__()
+
+    async def close(self):
+        await self._chunks.aclose()
+
+class LatencyProxy:
+    """Wraps a blocking client so every method call first sleeps `latency` seconds (they run on executor threads)."""
+
+    def __init__(self, target, latency: float):
+        self._target = target
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attr(*args, **kwargs)
+        return call
+
+def fake_qdrant(latency: float = 0.01):
+    """A real in-memory qdrant_client behind a network-latency proxy."""
+    import warnings
+    from qdrant_client import QdrantClient
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect in the local Qdrant")
+    return LatencyProxy(QdrantClient(":memory:"), latency)
+
+class FakeNeo4jDriver:
+    """driver.session() -> execute_write(fn, ...) / run(...).consume(); records edge counts."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.edges = 0
+        self._lock = threading.Lock()
+
+    def session(self):
+        driver = self
+
+        class Session:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def run(self, query, **params):
+                time.sleep(driver.latency)
+                with driver._lock:
+                    driver.edges += len(params.get("edges", ()))
+                return _ns(consume=lambda: None, single=lambda: {"prerequisites": []})
+
+            def execute_write(self, fn, *args):
+                return fn(self, *args)
+
+        return Session()
+
+    def verify_connectivity(self):
+        time.sleep(self.latency)
+
+    def close(self):
+        pass
+
+class FakeGitHubStorage:
+    """GitHubStorage look-alike: one simulated atomic commit per course."""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+        self.repo_name = "fake/sovap-course-storage"
+        self.branch = "main"
+        self.commits = 0
+        self.bytes_written = 0
+        self.files = {}  # files as of the last commit, for read_file() / read_bytes()
+        self._lock = threading.Lock()
+
+    def commit_files(self, files: dict, message: str, retries: int = 3) -> str:
+        time.sleep(self.latency)
+        files = {path: v.encode("utf-8") if isinstance(v, str) else v for path, v in files.items()}
+        size = sum(len(v) for v in files.values() if v is not None)
+        with self._lock:
+            self.commits += 1
+            self.bytes_written += size
+            for path, v in files.items():
+                if v is None:
+                    self.files.pop(path, None)
+                else:
+                    self.files[path] = v
+        return hashlib.sha1(message.encode()).hexdigest()
+
+    def read_bytes(self, path: str):
+        time.sleep(self.latency)
+        with self._lock:
+            return self.files.get(path)
+
+    def read_file(self, path: str):
+        content = self.read_bytes(path)
+        return content.decode("utf-8") if content is not None else None
+
+    def probe(self) -> dict:
+        time.sleep(self.latency)
+        return {"repo": self.repo_name, "rate_remaining": 5000, "rate_limit": 5000}
+
+def fake_encode_texts(texts: list, batch_size: int = 32, dimension: int = 384, per_text_seconds: float = 0.0005):
+    """Deterministic unit vectors (identical texts -> identical vectors) at a MiniLM-like CPU cost."""
+    import numpy as np
+    time.sleep(per_text_seconds * len(texts))
+    vectors = np.empty((len(texts), dimension), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vectors[i] = np.random.default_rng(seed).standard_normal(dimension)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
@@ -0,0 +1,219 @@
+"""
+Offline load test: N concurrent courses through the real FastAPI app against local fakes.
+
+The app runs under uvicorn in this process, with Groq, Qdrant, Neo4j, GitHub and the
+embedding model swapped for the stand-ins in fakes.py (configurable latency, Groq error
+rate). Courses are submitted over HTTP to /generate and /generate-from-pdf, completion is
+tracked through /status/{course_id}, and /health is polled throughout. Everything else
+(prompts, JSON repair, chunking, dedup, PDF rendering on the process pool, executors,
+job store) is the production code path.
+
+Reports courses/minute, per-phase latency percentiles (from the pipeline's [span]
+records), /health latency and peak memory, so regressions in generate_pipeline,
+vectorize_course or storage show up before deploy.
+
+Usage (from generator-lab/):
+    python benchmarks/loadtest.py [--courses 20] [--concurrency 5] [--modules 5] [--pdf-share 0.2]
+                                  [--llm-latency 0.5] [--llm-error-rate 0.02] [--github-latency 0.3]
+"""
+import os
+import io
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import contextlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5, help="courses submitted at once by the client")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="MAX_CONCURRENT_PIPELINES for the server (default: app default)")
+    parser.add_argument("--modules", type=int, default=5)
+    parser.add_argument("--pdf-share", type=float, default=0.2, help="fraction of courses submitted via /generate-from-pdf")
+    parser.add_argument("--pdf-pages", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--theory-words", type=int, default=1500)
+    parser.add_argument("--qdrant-latency", type=float, default=0.01)
+    parser.add_argument("--neo4j-latency", type=float, default=0.02)
+    parser.add_argument("--github-latency", type=float, default=0.3)
+    parser.add_argument("--health-interval", type=float, default=0.5, help="seconds between /health polls")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the Groq RPM/TPM budget (default: off)")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    return parser.parse_args()
+
+def percentiles(values: list) -> str:
+    if not values:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    values = sorted(values)
+    def pick(q):
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return f"{pick(0.5):>8.2f} {pick(0.95):>8.2f} {pick(0.99):>8.2f}"
+
+def make_pdf(path: str, pages: int):
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=11)
+    for p in range(pages):
+        pdf.add_page()
+        if p % 5 == 0:
+            pdf.cell(0, 10, f"Chapter {p // 5 + 1} Load Testing", new_x="LMARGIN", new_y="NEXT")
+        pdf.multi_cell(0, 6, "Throughput and latency depend on queueing at every stage of the pipeline. " * 12)
+    pdf.output(path)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def run(args, workdir: str):
+    import httpx
+    import uvicorn
+    import metrics
+    import app as lab
+    from fakes import FakeGroq, FakeNeo4jDriver, FakeGitHubStorage, fake_qdrant, fake_encode_texts
+
+    spans = []
+    metrics.emit = lambda kind, record: spans.append({"span": kind, **record})
+
+    groq = FakeGroq(args.llm_latency, args.llm_jitter, args.llm_error_rate, args.theory_words)
+    github = FakeGitHubStorage(args.github_latency)
+    neo4j = FakeNeo4jDriver(args.neo4j_latency)
+    lab.client = groq
+    lab.llm.client = groq
+    lab.qdrant_client = fake_qdrant(args.qdrant_latency)
+    lab.neo4j_handler.driver = neo4j
+    lab.get_github_storage = lambda: github
+    lab.encode_texts = fake_encode_texts
+
+    pdf_path = os.path.join(workdir, "textbook.pdf")
+    make_pdf(pdf_path, args.pdf_pages)
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(lab.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}"
+    health_latencies, finished = [], {}
+    rejected = [0]
+    peak_rss = 0
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=base, timeout=60) as http:
+        async def poll_health():
+            nonlocal peak_rss
+            while not stop.is_set():
+                started = time.perf_counter()
+                await http.get("/health")
+                health_latencies.append((time.perf_counter() - started) * 1000)
+                peak_rss = max(peak_rss, metrics.rss_bytes())
+                await asyncio.sleep(args.health_interval)
+
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one_course(n: int):
+            course_id = f"load-{n:04d}"
+            async with slots:
+                started = time.perf_counter()
+                while True:
+                    if n < args.courses * args.pdf_share:
+                        r = await http.post("/generate-from-pdf", data={"course_id": course_id, "title": f"Load Course {n}"},
+                                            files={"file": ("textbook.pdf", io.BytesIO(pdf_bytes), "application/pdf")})
+                    else:
+                        r = await http.post("/generate", json={"course_id": course_id, "title": f"Load Course {n}",
+                                                               "modules_count": args.modules, "bypass_cache": True})
+                    if r.status_code != 429:
+                        break
+                    rejected[0] += 1
+                    await asyncio.sleep(min(float(r.headers.get("Retry-After", 1)), 5))
+                while True:
+                    await asyncio.sleep(0.2)
+                    r = await http.get(f"/status/{course_id}")
+                    status = r.json() if r.status_code == 200 else {}
+                    if status.get("status") in ("completed", "failed"):
+                        finished[course_id] = (status["status"], time.perf_counter() - started)
+                        return
+
+        health_task = asyncio.create_task(poll_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(one_course(n) for n in range(args.courses)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await health_task
+
+    server.should_exit = True
+    await server_task
+    return {
+        "elapsed": elapsed, "finished": finished, "spans": spans, "health_ms": health_latencies,
+        "peak_rss": max(peak_rss, metrics.rss_bytes()), "groq": groq, "github": github, "neo4j": neo4j,
+        "rejected": rejected[0], "scheduler": lab.scheduler.stats(),
+    }
+
+def report(args, result: dict):
+    finished, spans = result["finished"], result["spans"]
+    completed = sum(1 for status, _ in finished.values() if status == "completed")
+    print(f"\nCourses: {len(finished)} ({completed} completed, {len(finished) - completed} failed) "
+          f"| concurrency {args.concurrency} | {args.modules} modules | pdf share {args.pdf_share}")
+    print(f"Wall time: {result['elapsed']:.1f}s -> {len(finished) / result['elapsed'] * 60:.1f} courses/minute")
+    print(f"Scheduler: {result['scheduler']['max_in_flight']} pipelines in flight, {result['rejected']} submissions rejected with 429")
+    print(f"Groq calls: {result['groq'].calls} ({result['groq'].errors} injected errors) | "
+          f"GitHub commits: {result['github'].commits} ({result['github'].bytes_written / 2**20:.1f} MB) | "
+          f"Neo4j edges: {result['neo4j'].edges}")
+
+    print(f"\n{'latency (s)':<24} {'p50':>8} {'p95':>8} {'p99':>8} {'n':>6}")
+    course_seconds = [seconds for _, seconds in finished.values()]
+    print(f"{'course end-to-end':<24} {percentiles(course_seconds)} {len(course_seconds):>6}")
+    phases = {}
+    for span in spans:
+        if span["span"] == "phase":
+            phases.setdefault(span["phase"], []).append(span["seconds"])
+    for phase, values in phases.items():
+        print(f"{'phase ' + phase:<24} {percentiles(values)} {len(values):>6}")
+    llm = [s["seconds"] for s in spans if s["span"] == "llm" and s["source"] == "groq"]
+    wait = [s["budget_wait"] for s in spans if s["span"] == "llm" and s["source"] == "groq"]
+    print(f"{'llm call':<24} {percentiles(llm)} {len(llm):>6}")
+    print(f"{'llm rate-budget wait':<24} {percentiles(wait)} {len(wait):>6}")
+    health = [ms / 1000 for ms in result["health_ms"]]
+    print(f"{'/health':<24} {percentiles(health)} {len(health):>6}")
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\nPeak RSS: API process {result['peak_rss'] / 2**20:.0f} MB | largest pool worker {children:.0f} MB")
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="sovap-load-")
+    # Isolated state and no network: must be set before app.py is imported
+    os.environ.update({
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+        "JOB_STORE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "HF_HUB_OFFLINE": "1",
+        "EMBEDDING_WARMUP": "false",
+        "GITHUB_TOKEN": "",
+    })
+    if args.max_in_flight:
+        os.environ["MAX_CONCURRENT_PIPELINES"] = str(args.max_in_flight)
+    if not args.keep_rate_limits:
+        os.environ.update({"GROQ_RPM_LIMIT": "0", "GROQ_TPM_LIMIT": "0"})
+    sys.path[:0] = [HERE, APP_DIR]
+    os.chdir(workdir)  # storage/ and uploads land in the scratch directory
+
+    sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with sink:
+        result = asyncio.run(run(args, workdir))
+    report(args, result)
+    print(f"\nScratch directory: {workdir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Token-aware Concept Unit chunking for module theory.
+
+Theory is Markdown. It is parsed into heading, paragraph and fenced-code blocks, each
+measured with the embedding model's own tokenizer. Blocks are then packed into windows of
+up to `max_tokens` (MiniLM's 256-token limit less [CLS]/[SEP]), so nothing is silently
+truncated at encode time:
+
+- a heading starts a new window, unless the current one is still under `min_tokens`, so
+  short headings travel with their content instead of becoming their own vector
+- code blocks are never split unless a single block exceeds the window (then by lines)
+- oversized paragraphs are split at sentence boundaries, then at word boundaries
+- when a window is cut for size inside a section, the trailing ~`overlap_tokens` of
+  blocks/sentences are repeated at the start of the next window
+
+Every chunk records the heading path it belongs to. Kept free of app-level imports so it
+can run on the "embed" pool, including process workers.
+"""
+import re
+from embeddings import count_tokens
+
+_HEADING_LINE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_END = re.compile(r"(?<=[.!?:;])\s+")
+
+def parse_blocks(markdown: str) -> list:
+    """Returns [(kind, text, heading_path)] with kind in heading | paragraph | code."""
+    blocks = []
+    headings = []  # [(level, title)]
+    paragraph, code, fence = [], [], None
+
+    def path():
+        return tuple(title for _, title in headings)
+
+    def flush_paragraph():
+        if paragraph:
+            text = "\n".join(paragraph).strip()
+            if text:
+                blocks.append(("paragraph", text, path()))
+            paragraph.clear()
+
+    for line in markdown.splitlines():
+        if fence:
+            code.append(line)
+            if line.strip().startswith(fence):
+                blocks.append(("code", "\n".join(code), path()))
+                code, fence = [], None
+            continue
+        m = _FENCE.match(line)
+        if m:
+            flush_paragraph()
+            fence = m.group(1)
+            code = [line]
+            continue
+        m = _HEADING_LINE.match(line)
+        if m:
+            flush_paragraph()
+            level, title = len(m.group(1)), m.group(2).strip("*_ ")
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, title))
+            blocks.append(("heading", title, path()))
+        elif not line.strip():
+            flush_paragraph()
+        else:
+            paragraph.append(line)
+    flush_paragraph()
+    if code:
+        blocks.append(("code", "\n".join(code), path()))  # unterminated fence: keep what was generated
+    return blocks
+
+def _pack(pieces: list, counts: list, joiner: str, max_tokens: int) -> list:
+    """Greedily joins consecutive pieces into [(text, tokens)] of at most max_tokens each."""
+    packed, current, current_tokens = [], [], 0
+    for piece, tokens in zip(pieces, counts):
+        if current and current_tokens + tokens > max_tokens:
+            packed.append((joiner.join(current), current_tokens))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        packed.append((joiner.join(current), current_tokens))
+    return packed
+
+def _split_block(kind: str, text: str, max_tokens: int) -> list:
+    """Splits one oversized block into [(text, tokens)] lines/sentences that each fit a window."""
+    if kind == "code":
+        segments = text.split("\n")
+    else:
+        segments = [s for s in _SENTENCE_END.split(text) if s.strip()]
+    pieces = []
+    for segment, tokens in zip(segments, count_tokens(segments)):
+        if tokens <= max_tokens:
+            pieces.append((segment, tokens))
+        else:
+            words = segment.split()
+            pieces.extend(_pack(words, count_tokens(words), " ", max_tokens))
+    return pieces
+
+def chunk_markdown(markdown: str, max_tokens: int = 254, overlap_tokens: int = 32, min_tokens: int = 48) -> list:
+    """Packs Markdown into [{"text", "tokens", "heading_path"}] windows of at most max_tokens."""
+    blocks = parse_blocks(markdown or "")
+    if not blocks:
+        return []
+    counts = count_tokens([text for _, text, _ in blocks])
+
+    # (kind, text, tokens, path, separator); an oversized block becomes several units that
+    # rejoin with " " (sentences) or "\n" (code lines) when they land in the same window
+    units = []
+    for (kind, text, path), tokens in zip(blocks, counts):
+        if tokens <= max_tokens:
+            units.append((kind, text, tokens, path, "\n\n"))
+        else:
+            joiner = "\n" if kind == "code" else " "
+            for i, (piece, piece_tokens) in enumerate(_split_block(kind, text, max_tokens)):
+                units.append((kind, piece, piece_tokens, path, "\n\n" if i == 0 else joiner))
+
+    chunks = []
+    window = []
+
+    def window_tokens():
+        return sum(u[2] for u in window)
+
+    def flush():
+        content = [u for u in window if u[0] != "heading"]
+        if content:
+            chunks.append({
+                "text": window[0][1] + "".join(u[4] + u[1] for u in window[1:]),
+                "tokens": window_tokens(),
+                "heading_path": list(content[0][3]),
+            })
+
+    for unit in units:
+        kind, _, tokens, path, _ = unit
+        if window and kind == "heading" and window_tokens() >= min_tokens:
+            flush()
+            window = []
+        elif window and window_tokens() + tokens > max_tokens:
+            # Headings at the end of a full window belong to the next one, in front of their content
+            lead = []
+            while window and window[-1][0] == "heading":
+                lead.insert(0, window.pop())
+            flush()
+            # Overlap: repeat the tail of this section, if it leaves room for the new unit
+            carry, carried = [], 0
+            if not lead:
+                for prev in reversed(window):
+                    if prev[3] != path or prev[0] == "heading" or carried + prev[2] > overlap_tokens:
+                        break
+                    carry.insert(0, prev)
+                    carried += prev[2]
+            window = carry if carried + tokens <= max_tokens else []
+            if lead and sum(u[2] for u in lead) + tokens <= max_tokens:
+                window = lead
+        window.append(unit)
+    flush()
+    return chunks
+
+def chunk_course(course_data: dict, max_tokens: int = 254, overlap_tokens: int = 32, min_tokens: int = 48) -> list:
+    """
+    [(module_title, chunk_index, text, metadata)] for every Concept Unit in the course.
+    metadata["module_index"] is the module's position; titles are not unique within a course.
+    """
+    units = []
+    for i, module in enumerate(course_data.get("modules", [])):
+        module_title = module.get("title", "Unknown Module")
+        chunks = chunk_markdown(module.get("theory", ""), max_tokens, overlap_tokens, min_tokens)
+        for idx, chunk in enumerate(chunks):
+            units.append((module_title, idx, chunk["text"],
+                          {"module_index": i, "heading_path": chunk["heading_path"], "tokens": chunk["tokens"]}))
+    return units
@@ -0,0 +1,122 @@
+"""
+Sharded course artifacts: a small manifest plus one compressed shard per module.
+
+    manifest.json               course fields (title, generation, ...) and per-module
+                                index, title, prerequisites, shard path, sizes, sha256
+    modules/000.json.gz         one module as compact JSON (gzip, or .zst with zstandard)
+    master.json                 optional full single-file copy for readers that predate the manifest
+
+A reader renders the outline from the manifest alone and fetches module shards on demand.
+Shard hashes are of the uncompressed JSON, so a writer compares them with the previous
+manifest and re-uploads only the shards whose module changed. Shards are written with a
+fixed gzip mtime, so identical modules always produce identical bytes.
+
+Kept free of app-level imports; zstandard is optional and falls back to gzip.
+"""
+import gzip
+import json
+import hashlib
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+LEGACY_MASTER = "master.json"
+_EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+
+def resolve_compression(name: str) -> str:
+    """'zstd' when requested and zstandard is installed, else 'gzip'."""
+    if name == "zstd":
+        try:
+            import zstandard  # noqa: F401
+            return "zstd"
+        except ImportError:
+            print("[!] COURSE_SHARD_COMPRESSION=zstd but zstandard is not installed, using gzip", flush=True)
+    return "gzip"
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def encode_module(module: dict) -> bytes:
+    return json.dumps(module, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def build_artifacts(course: dict, compression: str = "gzip") -> tuple:
+    """(manifest dict, {relative shard path: compressed bytes}) for a full course dict."""
+    compression = resolve_compression(compression)
+    manifest = {k: v for k, v in course.items() if k != "modules"}
+    manifest["artifact"] = {"format": FORMAT_VERSION, "compression": compression, "master_json": False}
+    manifest["modules"] = []
+    shards = {}
+    for i, module in enumerate(course.get("modules", [])):
+        raw = encode_module(module)
+        path = f"modules/{i:03d}.json.{_EXTENSIONS[compression]}"
+        shards[path] = compress(raw, compression)
+        manifest["modules"].append({
+            "index": i,
+            "title": module.get("title"),
+            "prerequisites": module.get("prerequisites", []),
+            "fallback": bool(module.get("fallback")),
+            "path": path,
+            "sha256": hashlib.sha256(raw).hexdigest(),
+            "size": len(raw),
+            "compressed_size": len(shards[path]),
+        })
+    return manifest, shards
+
+def changed_shards(manifest: dict, previous: dict | None) -> tuple:
+    """(shard paths whose content differs from `previous`, shard paths `previous` had that are gone)."""
+    before = {}
+    if previous and previous.get("artifact", {}).get("compression") == manifest["artifact"]["compression"]:
+        before = {m["path"]: m["sha256"] for m in previous.get("modules", [])}
+    current = {m["path"]: m["sha256"] for m in manifest["modules"]}
+    changed = [path for path, digest in current.items() if before.get(path) != digest]
+    stale = [m["path"] for m in (previous or {}).get("modules", []) if m["path"] not in current]
+    return changed, stale
+
+def dump_manifest(manifest: dict) -> str:
+    return json.dumps(manifest, indent=2, ensure_ascii=False)
+
+def artifact_writes(course: dict, previous: dict | None, compression: str, write_master: bool, has_master) -> tuple:
+    """
+    ({relative path: str | bytes | None}, shards skipped) to bring a stored course up to date;
+    None deletes a path. The manifest comes last so a reader never sees it before its shards.
+    `has_master()` is only asked when master.json is off and no previous manifest knows.
+    """
+    manifest, shards = build_artifacts(course, compression)
+    changed, stale = changed_shards(manifest, previous)
+    writes = {path: shards[path] for path in changed}
+    writes.update((path, None) for path in stale)
+    if write_master:
+        # Full single-file copy for readers that predate the manifest
+        writes[LEGACY_MASTER] = json.dumps(course, indent=2)
+        manifest["artifact"]["master_json"] = True
+    elif previous.get("artifact", {}).get("master_json") if previous else has_master():
+        writes[LEGACY_MASTER] = None
+    writes[MANIFEST] = dump_manifest(manifest)
+    return writes, len(shards) - len(changed)
+
+def assemble_course(manifest: dict, read_shard) -> dict:
+    """The full course dict back from a manifest; `read_shard(path)` returns a shard's bytes."""
+    compression = manifest.get("artifact", {}).get("compression", "gzip")
+    course = {k: v for k, v in manifest.items() if k not in ("artifact", "modules")}
+    modules = []
+    for entry in manifest.get("modules", []):
+        data = read_shard(entry["path"])
+        if data is None:
+            raise ValueError(f"shard {entry['path']} is missing")
+        try:
+            raw = decompress(data, compression)
+        except Exception as e:
+            raise ValueError(f"shard {entry['path']} is corrupt: {e}")
+        if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+            raise ValueError(f"shard {entry['path']} does not match its manifest hash")
+        modules.append(json.loads(raw))
+    course["modules"] = modules
+    return course
@@ -0,0 +1,71 @@
+"""
+Near-duplicate collapse for Concept Unit embeddings before they reach Qdrant.
+
+LLM-written modules repeat boilerplate ("In this module you will learn...", recap
+paragraphs), and every copy used to become its own point in the shared collection.
+NearDuplicateIndex keeps the embedding matrix of the points a course has kept so far and,
+for each new batch, computes cosine similarity against it (one matrix product; vectors are
+L2-normalized, so cosine == dot). A unit at or above the threshold is collapsed into the
+first point it matches, which keeps a back-reference to it instead.
+"""
+import numpy as np
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.collapsed = 0
+        self.back_refs = {}  # canonical point id -> [{module, chunk_index, type, similarity}], across batches
+        self._ids = []
+        self._matrix = None
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.threshold < 1
+
+    def seed(self, ids: list, vectors):
+        """Registers points that already exist (e.g. the course's other unit types) as canonical."""
+        if ids:
+            self._append(ids, np.asarray(vectors, dtype=np.float32))
+
+    def assign(self, ids: list, vectors) -> list:
+        """
+        For each row returns None if it is kept (and becomes canonical), or
+        (canonical_id, similarity) if it duplicates an earlier point. Greedy in input order.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.enabled or not len(ids):
+            return [None] * len(ids)
+
+        # Best match among previously kept points, for the whole batch at once
+        if self._matrix is not None:
+            prior = vectors @ self._matrix.T
+            best_prior = prior.argmax(axis=1)
+            best_prior_sim = prior[np.arange(len(ids)), best_prior]
+        else:
+            best_prior_sim = np.full(len(ids), -1.0, dtype=np.float32)
+            best_prior = None
+        within = vectors @ vectors.T
+
+        result = []
+        kept = np.zeros(len(ids), dtype=bool)
+        for i in range(len(ids)):
+            if best_prior_sim[i] >= self.threshold:
+                result.append((self._ids[best_prior[i]], float(best_prior_sim[i])))
+                continue
+            earlier = np.flatnonzero(kept[:i])
+            if len(earlier):
+                j = earlier[within[i, earlier].argmax()]
+                if within[i, j] >= self.threshold:
+                    result.append((ids[j], float(within[i, j])))
+                    continue
+            kept[i] = True
+            result.append(None)
+
+        self.collapsed += len(ids) - int(kept.sum())
+        if kept.any():
+            self._append([ids[i] for i in np.flatnonzero(kept)], vectors[kept])
+        return result
+
+    def _append(self, ids: list, vectors):
+        self._ids.extend(ids)
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
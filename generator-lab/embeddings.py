@@ -0,0 +1,198 @@
+"""
+Embedding model access.
+
+The model is a per-process singleton: loaded once in the API process when the "embed"
+stage runs on threads, or once per worker when it runs on a process pool.
+
+EMBEDDING_BACKEND picks the implementation:
+- "sentence-transformers" (default): the original torch model.
+- "onnx": the same model exported to ONNX, run by onnxruntime with a `tokenizers`
+  tokenizer. No torch import, so startup is faster and the resident set is far smaller.
+- "onnx-int8": the int8 dynamically quantized export. It is smaller and faster on CPU, and
+  its vectors stay within ~0.99 cosine of the fp32 model (see benchmarks/bench_embeddings.py).
+
+All backends produce the same 384-dim, L2-normalized vectors for all-MiniLM-L6-v2, so an
+existing Qdrant collection stays valid when the backend changes.
+"""
+import os
+import time
+import threading
+import collections
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+# Hub repo holding tokenizer.json and the ONNX exports, or a local directory with the same layout (baked into the image)
+EMBEDDING_ONNX_SOURCE = os.getenv(
+    "EMBEDDING_ONNX_SOURCE",
+    EMBEDDING_MODEL_NAME if "/" in EMBEDDING_MODEL_NAME else f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+)
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", ONNX_FILES.get(EMBEDDING_BACKEND, ""))
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", 384))
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length; chunking.py packs Concept Units to fit it
+
+class SentenceTransformerBackend:
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: list, batch_size: int = 32):
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+
+class OnnxBackend:
+    """Tokenize -> onnxruntime forward pass -> masked mean pooling -> L2 normalize (what SentenceTransformer does)."""
+
+    def __init__(self, source: str, onnx_file: str, name: str = "onnx"):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        self.name = name
+        self.tokenizer = Tokenizer.from_file(_resolve_file(source, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        options = ort.SessionOptions()
+        # Respect the embed pool's parallelism instead of grabbing every core per session
+        options.intra_op_num_threads = int(os.getenv("EMBEDDING_THREADS", 0)) or min(4, os.cpu_count() or 1)
+        self.session = ort.InferenceSession(
+            _resolve_file(source, onnx_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: list, batch_size: int = 32):
+        import numpy as np
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i:i + batch_size])
+            ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feed = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feed)[0]
+            weights = mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled.astype(np.float32))
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(vectors)
+
+def _resolve_file(source: str, filename: str) -> str:
+    if os.path.isdir(source):
+        return os.path.join(source, filename)
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=source, filename=filename)
+
+# Global Embedding Model Singleton (To prevent OOM restarts on Render)
+_embedding_model = None
+_load_lock = threading.Lock()
+_status = {"state": "cold", "backend": EMBEDDING_BACKEND, "model": EMBEDDING_MODEL_NAME, "load_seconds": None, "error": None}
+
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is not None:
+        return _embedding_model
+    with _load_lock:
+        if _embedding_model is None:
+            print(f"[*] Loading embedding model '{EMBEDDING_MODEL_NAME}' via {EMBEDDING_BACKEND} (Singleton)...", flush=True)
+            _status.update(state="loading", error=None)
+            started = time.perf_counter()
+            try:
+                if EMBEDDING_BACKEND in ONNX_FILES:
+                    model = OnnxBackend(EMBEDDING_ONNX_SOURCE, EMBEDDING_ONNX_FILE, EMBEDDING_BACKEND)
+                elif EMBEDDING_BACKEND == "sentence-transformers":
+                    model = SentenceTransformerBackend(EMBEDDING_MODEL_NAME)
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}'")
+            except Exception as e:
+                _status.update(state="error", error=str(e))
+                raise
+            _status.update(state="ready", load_seconds=round(time.perf_counter() - started, 2))
+            print(f"[+] Embedding model ready in {_status['load_seconds']}s.", flush=True)
+            _embedding_model = model
+    return _embedding_model
+
+def encode_texts(texts: list, batch_size: int = 32):
+    """One vectorized forward pass per batch; normalized so cosine == dot product."""
+    return get_embedding_model().encode(texts, batch_size=batch_size)
+
+def warmup() -> dict:
+    """Loads the model and runs one encode so the first course does not pay for it; returns embedding_status()."""
+    try:
+        encode_texts(["warmup"])
+    except Exception as e:
+        print(f"[!] Embedding warmup failed: {str(e)}", flush=True)
+    return embedding_status()
+
+def embedding_status() -> dict:
+    return dict(_status)
+
+# The chunker only needs the tokenizer, which loads in milliseconds without the model
+_tokenizer = None
+_tokenizer_failed = False
+
+def get_tokenizer():
+    """The embedding model's own WordPiece tokenizer (same tokenizer.json for every backend), or None if unavailable."""
+    global _tokenizer, _tokenizer_failed
+    if _tokenizer is None and not _tokenizer_failed:
+        with _load_lock:
+            if _tokenizer is None and not _tokenizer_failed:
+                try:
+                    from tokenizers import Tokenizer
+                    _tokenizer = Tokenizer.from_file(_resolve_file(EMBEDDING_ONNX_SOURCE, "tokenizer.json"))
+                except Exception as e:
+                    _tokenizer_failed = True
+                    print(f"[!] Tokenizer unavailable, estimating token counts: {str(e)}", flush=True)
+    return _tokenizer
+
+def count_tokens(texts: list) -> list:
+    """Content tokens per text, excluding [CLS]/[SEP] (MAX_SEQ_LENGTH - 2 fit in one window)."""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        # ~1.3 WordPiece tokens per whitespace word for English prose
+        return [int(len(t.split()) * 1.3) + 1 for t in texts]
+    return [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+class QueryEmbeddingCache:
+    """LRU of normalized query text -> vector for /search, so repeated tutor-chat questions skip the model."""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def key(text: str) -> str:
+        # The MiniLM tokenizer is uncased, so case and whitespace variants share one vector
+        return " ".join(text.split()).lower()
+
+    def get(self, text: str):
+        key = self.key(text)
+        vector = self._entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, text: str, vector):
+        if self.max_size <= 0:
+            return
+        self._entries[self.key(text)] = vector
+        self._entries.move_to_end(self.key(text))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
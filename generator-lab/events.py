@@ -0,0 +1,63 @@
+"""
+Per-course event bus backing the /stream/{course_id} server-sent events endpoint.
+
+Subscribers get a bounded replay of recent events so a client that connects after
+generation started still sees the modules already produced.
+"""
+import asyncio
+import collections
+import time
+
+class CourseEventBus:
+    def __init__(self, history_size: int = 500, retention_seconds: float = 600):
+        self.history_size = history_size
+        self.retention_seconds = retention_seconds
+        self._history = {}      # course_id -> deque of events
+        self._subscribers = {}  # course_id -> set of asyncio.Queue
+        self._closed = {}       # course_id -> close timestamp
+
+    def publish(self, course_id: str, event: dict):
+        self._prune()
+        event = {"ts": round(time.time(), 3), **event}
+        self._history.setdefault(course_id, collections.deque(maxlen=self.history_size)).append(event)
+        self._closed.pop(course_id, None)
+        for queue in self._subscribers.get(course_id, ()):
+            queue.put_nowait(event)
+
+    def close(self, course_id: str):
+        """Marks the course stream finished; subscribers drain and disconnect."""
+        self._closed[course_id] = time.time()
+        for queue in self._subscribers.get(course_id, ()):
+            queue.put_nowait(None)
+
+    async def subscribe(self, course_id: str, heartbeat: float = 15.0):
+        """Async iterator of events (None = heartbeat tick) that ends when the course stream closes."""
+        queue = asyncio.Queue()
+        for event in self._history.get(course_id, ()):
+            queue.put_nowait(event)
+        if course_id in self._closed:
+            queue.put_nowait(None)
+        self._subscribers.setdefault(course_id, set()).add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield {"type": "heartbeat"}
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            subscribers = self._subscribers.get(course_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    self._subscribers.pop(course_id, None)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for course_id, closed_at in list(self._closed.items()):
+            if closed_at < cutoff and not self._subscribers.get(course_id):
+                self._closed.pop(course_id, None)
+                self._history.pop(course_id, None)
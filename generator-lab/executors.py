@@ -0,0 +1,69 @@
+"""
+Executor Layer: keeps blocking clients and CPU-heavy work off the asyncio event loop.
+
+Every pipeline stage gets its own pool so a slow dependency (e.g. GitHub) can never
+starve another (e.g. Qdrant), and /health + /generate stay responsive while courses
+are being stored. Pool kind and size are configurable per stage:
+
+    POOL_<STAGE>_WORKERS=4        # pool size
+    POOL_<STAGE>_KIND=thread      # "thread" or "process"
+"""
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+# stage -> (default kind, default workers)
+# Network-bound SDK clients get thread pools; CPU work (PDF rendering/extraction) gets process pools.
+# Embedding defaults to a single thread: torch releases the GIL during matmuls, and a process
+# pool would load a second copy of the model per worker (set POOL_EMBED_KIND=process to opt in).
+STAGE_DEFAULTS = {
+    "qdrant": ("thread", 4),
+    "neo4j": ("thread", 4),
+    "storage": ("thread", 4),
+    "callback": ("thread", 2),
+    "health": ("thread", 4),
+    "embed": ("thread", 1),
+    "search": ("thread", 2),  # /search query embedding + Qdrant lookups; never queued behind course batch encodes
+    "qa": ("thread", 2),      # Phase 2 heuristics (qa_checks); never queued behind course batch encodes
+    "sqlite": ("thread", 2),  # job store checkpoints and LLM cache reads/writes
+    "pdf": ("process", 2),
+    "pdf_extract": ("process", min(4, os.cpu_count() or 1)),
+}
+
+_executors: dict = {}
+
+def stage_config(stage: str) -> tuple:
+    kind, workers = STAGE_DEFAULTS.get(stage, ("thread", 2))
+    kind = os.getenv(f"POOL_{stage.upper()}_KIND", kind).lower()
+    workers = max(1, int(os.getenv(f"POOL_{stage.upper()}_WORKERS", workers)))
+    return kind, workers
+
+def get_executor(stage: str) -> Executor:
+    """Lazily creates the pool for a stage (pools are process-wide singletons)."""
+    executor = _executors.get(stage)
+    if executor is None:
+        kind, workers = stage_config(stage)
+        if kind == "process":
+            # spawn: children start clean and import the worker function's module. They also
+            # re-import the __main__ module, which is why app.py re-execs itself as `uvicorn app:app`
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"sovap-{stage}")
+        _executors[stage] = executor
+        print(f"[*] Executor '{stage}' ready ({kind} x{workers})", flush=True)
+    return executor
+
+async def run_blocking(stage: str, fn, *args, **kwargs):
+    """
+    Runs `fn(*args, **kwargs)` on the stage's pool and awaits the result.
+    For process stages `fn` and its arguments must be picklable (module-level functions).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(stage), functools.partial(fn, *args, **kwargs))
+
+def shutdown_executors(wait: bool = True):
+    for stage, executor in list(_executors.items()):
+        executor.shutdown(wait=wait, cancel_futures=True)
+        _executors.pop(stage, None)
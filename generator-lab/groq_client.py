@@ -0,0 +1,248 @@
+"""
+Resilient Groq client shared by every LLM call site.
+
+Wraps an AsyncGroq client (created with the SDK's own retries off) with:
+- per-model rate budgets: a 60 s request window plus a token bucket whose capacity and
+  level follow the x-ratelimit-* headers of every response; a 429's Retry-After pauses
+  every caller of that model, not just the one that hit it
+- jittered exponential retries on 429/408/409/498/5xx, timeouts and connection errors
+- a per-call timeout (for streams: per chunk, so a long completion is not cut off)
+- optional fallback to a faster model for cheap calls (QA): used when the primary model
+  keeps failing, or for a cooldown period after one of its calls breaches the latency SLO
+"""
+import re
+import time
+import random
+import asyncio
+import collections
+import groq
+
+RETRYABLE_STATUS = {408, 409, 429, 498}
+_DURATION_UNITS = {"ms": 0.001, "h": 3600.0, "m": 60.0, "s": 1.0}
+
+def parse_duration(value) -> float | None:
+    """Seconds from a Retry-After or reset header: '12', '7.66s', '2m59.56s', '1h2m' or '250ms'."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts) if parts else None
+
+def retry_hint(e: Exception) -> tuple:
+    """(retryable, seconds the server asked us to wait or None) for an exception from a Groq call."""
+    if isinstance(e, (asyncio.TimeoutError, groq.APIConnectionError)):
+        return True, None
+    if isinstance(e, groq.APIStatusError) and (e.status_code in RETRYABLE_STATUS or e.status_code >= 500):
+        return True, parse_duration(e.response.headers.get("retry-after"))
+    return False, None
+
+def describe(e: Exception) -> str:
+    if isinstance(e, groq.APIStatusError):
+        return f"HTTP {e.status_code}"
+    return type(e).__name__
+
+class RateBudget:
+    """
+    Limits for one model: a sliding 60 s window on request count (Groq's headers only report
+    the daily request quota) and a token bucket on tokens per minute that refills continuously.
+    tpm=0 leaves tokens unlimited until a response reports x-ratelimit-limit-tokens.
+    """
+    WINDOW = 60.0
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.capacity = float(tpm)
+        self.level = float(tpm)
+        self._updated = time.monotonic()
+        self._requests = collections.deque()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / self.WINDOW)
+        self._updated = now
+
+    async def acquire(self, tokens: int) -> int:
+        """Waits until the call fits and reserves `tokens` for it; returns the reservation."""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                while self._requests and now - self._requests[0] >= self.WINDOW:
+                    self._requests.popleft()
+                waits = [self._paused_until - now]
+                if self.rpm and len(self._requests) >= self.rpm:
+                    waits.append(self.WINDOW - (now - self._requests[0]))
+                # A call larger than the whole bucket waits for a full bucket, not forever
+                needed = min(tokens, self.capacity)
+                if self.capacity and self.level < needed:
+                    waits.append((needed - self.level) * self.WINDOW / self.capacity)
+                wait = max(waits)
+                if wait <= 0:
+                    self._requests.append(now)
+                    if self.capacity:
+                        self.level -= tokens
+                    return tokens
+            await asyncio.sleep(max(wait, 0.05))
+
+    def settle(self, reserved: int, used_tokens: int | None):
+        """Replaces the reservation with the real usage reported by Groq."""
+        if used_tokens is not None and self.capacity:
+            self.level = min(self.capacity, self.level + reserved - used_tokens)
+
+    def observe(self, headers):
+        """Aligns the bucket with Groq's own view: x-ratelimit-limit-tokens / x-ratelimit-remaining-tokens."""
+        try:
+            limit = float(headers.get("x-ratelimit-limit-tokens") or 0)
+            remaining = headers.get("x-ratelimit-remaining-tokens")
+            remaining = float(remaining) if remaining is not None else None
+        except ValueError:
+            return
+        self._refill(time.monotonic())
+        if limit and limit != self.capacity:
+            self.level = limit if not self.capacity else min(self.level, limit)
+            self.capacity = limit
+        if remaining is not None and self.capacity:
+            self.level = min(self.level, remaining)
+
+    def pause(self, seconds: float):
+        """Holds back every caller of this model, e.g. for a 429's Retry-After."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "tokens_per_minute": round(self.capacity) or None,
+            "tokens_available": round(self.level) if self.capacity else None,
+            "paused_seconds": round(max(0.0, self._paused_until - now), 1),
+        }
+
+class ResilientGroq:
+    SLO_COOLDOWN = 120.0 # seconds cheap calls stay on the fallback model after an SLO breach
+
+    def __init__(self, client, rpm: int, tpm: int, max_retries: int = 4, timeout: float = 120.0,
+                 backoff: float = 1.0, max_backoff: float = 30.0, latency_slo: float = 0.0):
+        self.client = client
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max(0, max_retries)
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_slo = latency_slo
+        self._budgets = {}
+        self._slow_until = {} # model -> monotonic time its latency SLO breach expires
+
+    def budget(self, model: str) -> RateBudget:
+        if model not in self._budgets:
+            self._budgets[model] = RateBudget(self.rpm, self.tpm)
+        return self._budgets[model]
+
+    async def complete(self, messages: list, model: str, span, reserve_tokens: int = 1000,
+                       fallback_model: str | None = None, **params) -> str:
+        """
+        Non-streaming completion; returns the message content. With `fallback_model`, the call
+        moves to it while `model` is over its latency SLO, or after `model` exhausted its retries.
+        """
+        if fallback_model and self._slow_until.get(model, 0) > time.monotonic():
+            span.fallback(fallback_model, "latency_slo")
+            model = fallback_model
+        try:
+            return await self._complete(messages, model, span, reserve_tokens, fallback_model is not None, **params)
+        except Exception as e:
+            if not fallback_model or model == fallback_model or not retry_hint(e)[0]:
+                raise
+            print(f"[!] Groq {model} unavailable ({describe(e)}), falling back to {fallback_model}", flush=True)
+            span.fallback(fallback_model, "errors")
+            return await self._complete(messages, fallback_model, span, reserve_tokens, True, **params)
+
+    async def _complete(self, messages: list, model: str, span, reserve_tokens: int, track_latency: bool, **params) -> str:
+        started = time.monotonic()
+        raw, reserved = await self._request(model, span, reserve_tokens, lambda: self.client.chat.completions.with_raw_response.create(
+            messages=messages, model=model, **params
+        ))
+        resp = await raw.parse()
+        usage = getattr(resp, "usage", None)
+        span.set_usage(usage)
+        budget = self.budget(model)
+        budget.settle(reserved, getattr(usage, "total_tokens", None))
+        budget.observe(raw.headers)
+        if track_latency:
+            self._check_slo(model, time.monotonic() - started)
+        return resp.choices[0].message.content or ""
+
+    async def stream(self, messages: list, model: str, span, on_delta, reserve_tokens: int = 1000, **params) -> str:
+        """
+        Streaming completion; every text delta is passed to `on_delta`. Opening the stream is
+        retried like complete(); once text has been delivered a broken stream raises instead,
+        since the deltas cannot be taken back. If `on_delta` raises, the stream is closed so
+        no further tokens are billed.
+        """
+        raw, reserved = await self._request(model, span, reserve_tokens, lambda: self.client.chat.completions.with_raw_response.create(
+            messages=messages, model=model, stream=True, **params
+        ))
+        budget = self.budget(model)
+        budget.observe(raw.headers)
+        stream = await raw.parse()
+        chunks = stream.__aiter__()
+        parts = []
+        usage = None
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                # Groq reports usage on the final chunk under x_groq
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+        except BaseException:
+            await stream.close()
+            raise
+        finally:
+            span.set_usage(usage)
+            budget.settle(reserved, getattr(usage, "total_tokens", None))
+        return "".join(parts)
+
+    async def _request(self, model: str, span, reserve_tokens: int, send) -> tuple:
+        """Runs `send()` under the model's budget, retrying retryable failures; returns (raw response, reservation)."""
+        budget = self.budget(model)
+        for attempt in range(self.max_retries + 1):
+            waited = time.perf_counter()
+            reserved = await budget.acquire(reserve_tokens)
+            span.waited(time.perf_counter() - waited)
+            try:
+                return await asyncio.wait_for(send(), self.timeout), reserved
+            except Exception as e:
+                budget.settle(reserved, 0)
+                retryable, server_wait = retry_hint(e)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                if server_wait:
+                    budget.pause(server_wait)
+                # Full jitter, but never sooner than the server asked for
+                delay = max(server_wait or 0.0, random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                print(f"[*] Groq {model} call failed ({describe(e)}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s", flush=True)
+                span.retry()
+                await asyncio.sleep(delay)
+
+    def _check_slo(self, model: str, seconds: float):
+        if self.latency_slo and seconds > self.latency_slo:
+            if self._slow_until.get(model, 0) <= time.monotonic():
+                print(f"[!] Groq {model} took {seconds:.1f}s (SLO {self.latency_slo:g}s); cheap calls use the fallback model for {self.SLO_COOLDOWN:.0f}s", flush=True)
+            self._slow_until[model] = time.monotonic() + self.SLO_COOLDOWN
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            model: {**budget.snapshot(), "over_latency_slo": self._slow_until.get(model, 0) > now}
+            for model, budget in self._budgets.items()
+        }
@@ -0,0 +1,65 @@
+"""
+Background dependency probes behind /health.
+
+Each dependency is checked on its own schedule by a background task, never by the
+request handler: the load balancer polls /health every few seconds, and a live GitHub or
+Groq round trip per poll burned API quota and blocked on slow networks. /health returns
+the last snapshot instantly; an entry older than 3x its interval is reported as stale.
+"""
+import time
+import asyncio
+import inspect
+
+class HealthMonitor:
+    def __init__(self, run_blocking, timeout: float = 5.0):
+        self._run_blocking = run_blocking
+        self.timeout = timeout
+        self._probes = {}    # name -> (fn, interval)
+        self._snapshot = {}  # name -> last result
+        self._tasks = []
+
+    def register(self, name: str, fn, interval: float):
+        """`fn` is a coroutine function or a blocking callable (run on the 'health' pool); it returns a detail dict or raises."""
+        self._probes[name] = (fn, interval)
+        self._snapshot[name] = {"ok": None, "checked_at": None, "latency_ms": None, "interval": interval}
+
+    async def check(self, name: str) -> dict:
+        fn, interval = self._probes[name]
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(fn):
+                detail = await asyncio.wait_for(fn(), self.timeout)
+            else:
+                detail = await asyncio.wait_for(self._run_blocking("health", fn), self.timeout)
+            result = {"ok": True, **(detail or {})}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)[:200]}
+        result.update(checked_at=round(time.time(), 3), latency_ms=round((time.perf_counter() - started) * 1000, 1), interval=interval)
+        self._snapshot[name] = result
+        return result
+
+    async def _loop(self, name: str):
+        _, interval = self._probes[name]
+        while True:
+            await self.check(name)
+            await asyncio.sleep(interval)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(name)) for name in self._probes]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        result = {}
+        for name, entry in self._snapshot.items():
+            entry = dict(entry)
+            entry["stale"] = entry["checked_at"] is None or now - entry["checked_at"] > 3 * entry["interval"]
+            result[name] = entry
+        return result
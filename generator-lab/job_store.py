@@ -0,0 +1,195 @@
+"""
+Persistent Job Store (SQLite).
+
+Checkpoints every pipeline phase and every expanded module as it completes, so a crash or
+OOM restart midway through generate_pipeline loses at most the modules that were in flight.
+A resumed run reads the syllabus and finished modules back instead of re-prompting Groq.
+Also backs /status/{course_id} with real progress.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "course_id TEXT PRIMARY KEY, title TEXT, status TEXT NOT NULL, phase TEXT NOT NULL, "
+            "phases_done TEXT NOT NULL DEFAULT '[]', modules_total INTEGER NOT NULL DEFAULT 0, "
+            "request_json TEXT, syllabus_json TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS module_outputs ("
+            "course_id TEXT NOT NULL, idx INTEGER NOT NULL, title TEXT, output_json TEXT NOT NULL, "
+            "completed_at REAL NOT NULL, PRIMARY KEY (course_id, idx))"
+        )
+        # Graph writes queued for Neo4j (GraphSyncer journal): replayed after a restart
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS graph_syncs ("
+            "course_id TEXT PRIMARY KEY, prerequisites_json TEXT NOT NULL, baseline_json TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def start_job(self, course_id: str, title: str, request: dict, resume: bool = False):
+        """Registers a run. Without resume, any previous checkpoints for the course are discarded."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE course_id = ?", (course_id,)).fetchone()
+            if row and resume:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', phase = 'starting', error = NULL, finished_at = NULL, "
+                    "attempts = attempts + 1, started_at = ?, updated_at = ?, request_json = ? WHERE course_id = ?",
+                    (now, now, json.dumps(request), course_id)
+                )
+                return
+            self._conn.execute("DELETE FROM module_outputs WHERE course_id = ?", (course_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (course_id, title, status, phase, phases_done, modules_total, request_json, "
+                "syllabus_json, error, attempts, created_at, started_at, updated_at, finished_at) "
+                "VALUES (?, ?, 'running', 'starting', '[]', 0, ?, NULL, NULL, 1, ?, ?, ?, NULL)",
+                (course_id, title, json.dumps(request), now, now, now)
+            )
+
+    def enqueue_job(self, course_id: str, title: str, request: dict):
+        """Records an admitted job that is waiting for a scheduler slot (survives a restart)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM jobs WHERE course_id = ?", (course_id,)).fetchone()
+            if row:
+                # Keep checkpoints: a queued resume still needs them, and start_job clears them otherwise
+                self._conn.execute(
+                    "UPDATE jobs SET title = ?, status = 'queued', phase = 'queued', request_json = ?, error = NULL, "
+                    "finished_at = NULL, updated_at = ? WHERE course_id = ?",
+                    (title, json.dumps(request), now, course_id)
+                )
+                return
+            self._conn.execute(
+                "INSERT INTO jobs (course_id, title, status, phase, phases_done, modules_total, request_json, "
+                "syllabus_json, error, attempts, created_at, started_at, updated_at, finished_at) "
+                "VALUES (?, ?, 'queued', 'queued', '[]', 0, ?, NULL, NULL, 0, ?, ?, ?, NULL)",
+                (course_id, title, json.dumps(request), now, now, now)
+            )
+
+    def set_phase(self, course_id: str, phase: str):
+        self._execute("UPDATE jobs SET phase = ?, updated_at = ? WHERE course_id = ?", (phase, time.time(), course_id))
+
+    def mark_phase_done(self, course_id: str, phase: str):
+        with self._lock:
+            row = self._conn.execute("SELECT phases_done FROM jobs WHERE course_id = ?", (course_id,)).fetchone()
+            if not row:
+                return
+            done = json.loads(row[0])
+            if phase not in done:
+                done.append(phase)
+            self._conn.execute(
+                "UPDATE jobs SET phases_done = ?, updated_at = ? WHERE course_id = ?",
+                (json.dumps(done), time.time(), course_id)
+            )
+
+    def clear_phases_done(self, course_id: str):
+        self._execute("UPDATE jobs SET phases_done = '[]', updated_at = ? WHERE course_id = ?", (time.time(), course_id))
+
+    def phases_done(self, course_id: str) -> set:
+        rows = self._execute("SELECT phases_done FROM jobs WHERE course_id = ?", (course_id,))
+        return set(json.loads(rows[0][0])) if rows else set()
+
+    def save_syllabus(self, course_id: str, modules_list: list):
+        self._execute(
+            "UPDATE jobs SET syllabus_json = ?, modules_total = ?, updated_at = ? WHERE course_id = ?",
+            (json.dumps(modules_list), len(modules_list), time.time(), course_id)
+        )
+
+    def get_syllabus(self, course_id: str):
+        rows = self._execute("SELECT syllabus_json FROM jobs WHERE course_id = ?", (course_id,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] else None
+
+    def save_module(self, course_id: str, idx: int, module: dict):
+        self._execute(
+            "INSERT OR REPLACE INTO module_outputs (course_id, idx, title, output_json, completed_at) VALUES (?, ?, ?, ?, ?)",
+            (course_id, idx, module.get("title"), json.dumps(module), time.time())
+        )
+
+    def completed_modules(self, course_id: str) -> dict:
+        rows = self._execute("SELECT idx, output_json FROM module_outputs WHERE course_id = ?", (course_id,))
+        return {idx: json.loads(output) for idx, output in rows}
+
+    def finish(self, course_id: str, status: str, error: str | None = None):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, phase = ?, error = ?, finished_at = ?, updated_at = ? WHERE course_id = ?",
+            (status, "done" if status == "completed" else "stopped", error, now, now, course_id)
+        )
+
+    def mark_interrupted(self) -> list:
+        """
+        Called at startup: any job still 'running' was killed with the previous process, and
+        'queued' ones never got a slot. Returns both; `queued` tells them apart.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT course_id, request_json, attempts, status FROM jobs WHERE status IN ('running', 'queued') "
+                "ORDER BY created_at"
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'interrupted', error = 'Process restarted mid-pipeline', updated_at = ? "
+                "WHERE status IN ('running', 'queued')",
+                (time.time(),)
+            )
+        return [{"course_id": r[0], "request": json.loads(r[1] or "{}"), "attempts": r[2], "queued": r[3] == "queued"} for r in rows]
+
+    def save_graph_sync(self, course_id: str, prerequisites: dict, baseline: dict | None):
+        self._execute(
+            "INSERT OR REPLACE INTO graph_syncs (course_id, prerequisites_json, baseline_json, updated_at) VALUES (?, ?, ?, ?)",
+            (course_id, json.dumps(prerequisites), None if baseline is None else json.dumps(baseline), time.time())
+        )
+
+    def delete_graph_sync(self, course_id: str):
+        self._execute("DELETE FROM graph_syncs WHERE course_id = ?", (course_id,))
+
+    def pending_graph_syncs(self) -> dict:
+        """{course_id: (prerequisites, baseline)} of graph writes that never landed."""
+        rows = self._execute("SELECT course_id, prerequisites_json, baseline_json FROM graph_syncs ORDER BY updated_at")
+        return {r[0]: (json.loads(r[1]), json.loads(r[2]) if r[2] else None) for r in rows}
+
+    def get_status(self, course_id: str):
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT title, status, phase, phases_done, modules_total, error, attempts, created_at, started_at, "
+                "updated_at, finished_at FROM jobs WHERE course_id = ?",
+                (course_id,)
+            ).fetchone()
+            if not job:
+                return None
+            modules_done = self._conn.execute(
+                "SELECT COUNT(*) FROM module_outputs WHERE course_id = ?", (course_id,)
+            ).fetchone()[0]
+        title, status, phase, phases_done, modules_total, error, attempts, created_at, started_at, updated_at, finished_at = job
+        return {
+            "course_id": course_id,
+            "title": title,
+            "status": status,
+            "phase": phase,
+            "phases_done": json.loads(phases_done),
+            "modules_total": modules_total,
+            "modules_done": modules_done,
+            "attempts": attempts,
+            "elapsed_seconds": round((finished_at or time.time()) - started_at, 1),
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "error": error,
+        }
+
+def job_store_from_env() -> JobStore:
+    return JobStore(os.getenv("JOB_STORE_PATH", "storage/jobs.sqlite3"))
@@ -0,0 +1,257 @@
+"""
+Single-pass, tolerant JSON repair for LLM output.
+
+repair_json() walks the text once, tracking the container stack and what the grammar
+expects next, and writes a corrected copy as it goes. Runs of ordinary string content are
+copied in slices; the only regexes are single-character classes and anchored token
+matches, so nothing backtracks and cost stays linear in the output length. Output that is
+already valid once fences/preamble are trimmed takes a json.loads fast path. It handles:
+
+- preambles, Markdown fences and trailing chatter around the object
+- raw control characters (newlines, tabs) inside strings
+- unescaped quotes inside strings (decided by what follows the quote)
+- invalid escapes such as \\' or \\x
+- trailing and missing commas, stray colons
+- unquoted keys, template placeholders like `[...]` and Python literals (True/False/None)
+- truncated output: open strings, dangling keys and unclosed containers are closed
+"""
+import re
+import json
+
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_VALID_ESCAPES = set('"\\/bfnrt')
+_HEX = set("0123456789abcdefABCDEF")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_WHITESPACE = " \t\r\n"
+# Single-character classes / anchored matches only: never backtrack
+_STRING_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+_PLAIN_WHITESPACE = re.compile(r"[ \t\r\n]+")
+_UNQUOTED_KEY = re.compile(r"[A-Za-z_][A-Za-z0-9_]*[ \t]*:")
+
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+
+def _is_literal(token: str) -> bool:
+    return token in ("true", "false", "null") or _NUMBER.fullmatch(token) is not None
+
+def repair_json(s: str, opening: str = "{[") -> str:
+    """
+    Returns a best-effort valid JSON text for the first object/array in `s` ("{}" if none).
+    `opening` limits where the JSON may start: "{" skips preambles such as "Here are [notes]: {...}".
+    """
+    if not s:
+        return "{}"
+    n = len(s)
+    start = -1
+    for i, ch in enumerate(s):
+        if ch in opening:
+            start = i
+            break
+    if start == -1:
+        return "{}"
+
+    # Fast path: most completions are already valid once the surrounding chatter is cut away
+    end = max(s.rfind("}"), s.rfind("]")) + 1
+    if end > start:
+        try:
+            json.loads(s[start:end])
+            return s[start:end]
+        except ValueError:
+            pass
+
+    out = []
+    stack = []          # "{" or "["
+    expect = "value"    # object: key | colon | value | comma ; array: value | comma
+    in_string = False
+    string_is_key = False
+    literal = []
+    i = start
+
+    def after_whitespace(j):
+        while j < n and s[j] in _WHITESPACE:
+            j += 1
+        return j
+
+    def flush_literal():
+        nonlocal expect
+        if not literal:
+            return
+        token = "".join(literal)
+        literal.clear()
+        if expect == "key" and token.replace("_", "a").isalnum():
+            out.append(json.dumps(token))  # unquoted key
+            expect = "colon"
+            return
+        token = _PY_LITERALS.get(token, token)
+        if token[0] in "-0123456789":
+            token = token.rstrip(".eE+-") or token  # number cut off mid-exponent/fraction
+        if expect == "value" and _is_literal(token):
+            out.append(token)
+            expect = "comma"
+        # anything else (`...`, bare words) is dropped; a missing value becomes null at the next delimiter
+
+    def fill_missing_value():
+        # `"key":` followed by a delimiter, or a key that never got its colon
+        nonlocal expect
+        if stack and stack[-1] == "{":
+            if expect == "colon":
+                out.append(":null")
+                expect = "comma"
+            elif expect == "value" and _last_significant() == ":":
+                out.append("null")
+                expect = "comma"
+
+    # `out` holds chunks (single tokens or copied runs), so look at chunks, not characters
+    def _last_significant():
+        for chunk in reversed(out):
+            stripped = chunk.rstrip(_WHITESPACE)
+            if stripped:
+                return stripped[-1]
+        return ""
+
+    def drop_trailing_comma():
+        j = len(out) - 1
+        while j >= 0 and not out[j].strip(_WHITESPACE):
+            j -= 1
+        if j >= 0 and out[j] == ",":
+            del out[j]
+
+    while i < n:
+        ch = s[i]
+
+        if in_string:
+            if ch == "\\":
+                nxt = s[i + 1] if i + 1 < n else ""
+                if nxt == "u":
+                    hex_digits = s[i + 2:i + 6]
+                    if len(hex_digits) == 4 and all(c in _HEX for c in hex_digits):
+                        out.append(s[i:i + 6])
+                        i += 6
+                        continue
+                    if i + 6 > n:
+                        break  # truncated inside \uXXXX: drop the partial escape
+                elif nxt in _VALID_ESCAPES and nxt:
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                if nxt == "'":
+                    out.append("'")
+                    i += 2
+                    continue
+                out.append("\\\\")
+                i += 1
+                continue
+            if ch == '"':
+                j = after_whitespace(i + 1)
+                nxt = s[j] if j < n else ""
+                if string_is_key:
+                    closes = nxt in (":", "") or nxt in "}"
+                else:
+                    closes = nxt in ("", "}", "]") or (nxt == "," and _comma_continues(s, j, n, stack)) \
+                        or (nxt == '"' and stack and stack[-1] == "{")
+                if closes:
+                    out.append('"')
+                    in_string = False
+                    if stack and stack[-1] == "{":
+                        expect = "colon" if string_is_key else "comma"
+                    else:
+                        expect = "comma"
+                else:
+                    out.append('\\"')
+                i += 1
+                continue
+            if ch < " ":
+                out.append(_CONTROL_ESCAPES.get(ch) or "\\u%04x" % ord(ch))
+                i += 1
+            else:
+                # Copy the run of ordinary characters up to the next quote/backslash/control char in one slice
+                m = _STRING_SPECIAL.search(s, i)
+                j = m.start() if m else n
+                out.append(s[i:j])
+                i = j
+            continue
+
+        if ch in _WHITESPACE:
+            flush_literal()
+            j = _PLAIN_WHITESPACE.match(s, i).end()
+            out.append(s[i:j])
+            i = j
+            continue
+        elif ch == '"':
+            flush_literal()
+            if expect == "comma":
+                out.append(",")  # missing comma between members
+                expect = "key" if stack and stack[-1] == "{" else "value"
+            string_is_key = bool(stack) and stack[-1] == "{" and expect == "key"
+            if stack and stack[-1] == "{" and expect == "colon":
+                out.append(":")
+                string_is_key = False
+            in_string = True
+            out.append('"')
+        elif ch == "{" or ch == "[":
+            flush_literal()
+            if not stack or expect == "value" or (stack[-1] == "[" and expect == "comma"):
+                if stack and expect == "comma":
+                    out.append(",")
+                stack.append(ch)
+                out.append(ch)
+                expect = "key" if ch == "{" else "value"
+        elif ch == "}" or ch == "]":
+            flush_literal()
+            fill_missing_value()
+            drop_trailing_comma()
+            if stack:
+                out.append("}" if stack.pop() == "{" else "]")
+                expect = "comma"
+                if not stack:
+                    break
+        elif ch == ",":
+            flush_literal()
+            fill_missing_value()
+            if expect == "comma":
+                out.append(",")
+                expect = "key" if stack and stack[-1] == "{" else "value"
+        elif ch == ":":
+            flush_literal()
+            if stack and stack[-1] == "{" and expect == "colon":
+                out.append(":")
+                expect = "value"
+        else:
+            literal.append(ch)
+        i += 1
+
+    # Truncated output: close whatever is still open
+    if in_string:
+        if out and out[-1] == "\\\\":
+            out.pop()
+        out.append('"')
+        if stack and stack[-1] == "{":
+            expect = "colon" if string_is_key else "comma"
+        else:
+            expect = "comma"
+    flush_literal()
+    if stack:
+        fill_missing_value()
+        drop_trailing_comma()
+        while stack:
+            out.append("}" if stack.pop() == "{" else "]")
+    return "".join(out)
+
+def _comma_continues(s: str, j: int, n: int, stack: list) -> bool:
+    """After `",` inside an object the next token must be a key; arrays accept any value."""
+    if stack and stack[-1] == "[":
+        return True
+    k = j + 1
+    while k < n and s[k] in _WHITESPACE:
+        k += 1
+    if k >= n or s[k] in '"}':
+        return True
+    # unquoted key: `, name:`
+    m = _UNQUOTED_KEY.match(s, k)
+    return m is not None
+
+def parse_llm_json(s: str) -> dict:
+    """repair_json + json.loads for an object; raises ValueError when no object could be recovered."""
+    value = json.loads(repair_json(s, "{"), strict=False)
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+    return value
@@ -0,0 +1,134 @@
+"""
+Content-addressed LLM response cache.
+
+Completions are keyed by sha256(model + messages + params), so re-generating or cloning a
+course with the same title/level/context replays the stored output instead of paying for
+the tokens again. Backed by a single SQLite file with TTL expiry and size-bounded LRU
+eviction (least recently *read* entries go first).
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+class LLMCache:
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+        if enabled:
+            self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions(accessed)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, messages: list, params: dict) -> str:
+        blob = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Returns the cached completion text, or None on miss/expiry."""
+        if not self._conn:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, size, created = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str):
+        if not self._conn or not value:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+
+    def discard(self, key: str):
+        """Drops an entry, e.g. a completion that turned out to be unparseable."""
+        if not self._conn:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        # Expired entries first, then least recently used until back under budget
+        if self.ttl_seconds:
+            cutoff = time.time() - self.ttl_seconds
+            expired = self._conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM completions WHERE created < ?", (cutoff,)).fetchone()
+            if expired[1]:
+                self._conn.execute("DELETE FROM completions WHERE created < ?", (cutoff,))
+                self._total_bytes -= expired[0]
+                self.evictions += expired[1]
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM completions ORDER BY accessed ASC LIMIT 32").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": bool(self._conn),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+def cache_from_env() -> LLMCache:
+    return LLMCache(
+        path=os.getenv("LLM_CACHE_PATH", "storage/llm_cache.sqlite3"),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", 256)) * 1024 * 1024),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_HOURS", 168)) * 3600,
+        enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+    )
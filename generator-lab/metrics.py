@@ -0,0 +1,163 @@
+"""
+Pipeline instrumentation: structured spans and Prometheus metrics behind /metrics.
+
+Two kinds of span:
+- phase spans, driven by set_phase(): a course's phase span ends when its next phase
+  starts (or the job finishes), so the pipeline body needs no extra nesting. Work that runs
+  alongside other phases (QA) gets its own span from PhaseTracker.overlapping()
+- LLM call spans around every Groq completion (wall time, rate-budget wait, prompt and
+  completion tokens from the response `usage`, retries, model fallbacks, cache hits)
+
+Each finished span is logged as one `[span] {json}` line and folded into histograms.
+The active phase is carried in a contextvar, so LLM calls from concurrent module tasks are
+attributed to the phase that spawned them. Process RSS is sampled at the end of every span.
+"""
+import os
+import json
+import time
+import resource
+import contextlib
+import contextvars
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+current_phase = contextvars.ContextVar("sovap_phase", default="none")
+
+_PHASE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+PHASE_SECONDS = Histogram("sovap_phase_seconds", "Wall time per pipeline phase", ["phase"], buckets=_PHASE_BUCKETS)
+PHASE_END_RSS = Gauge("sovap_phase_end_rss_bytes", "Process RSS when the phase last finished", ["phase"])
+PIPELINE_SECONDS = Histogram("sovap_pipeline_seconds", "Wall time per course pipeline", ["status"], buckets=_PHASE_BUCKETS)
+PIPELINES_ACTIVE = Gauge("sovap_pipelines_active", "Course pipelines currently running")
+LLM_SECONDS = Histogram("sovap_llm_call_seconds", "Wall time per LLM completion", ["phase", "model", "source"], buckets=_LLM_BUCKETS)
+LLM_BUDGET_WAIT = Histogram("sovap_llm_budget_wait_seconds", "Time spent waiting on the Groq rate budget", ["phase"], buckets=_LLM_BUCKETS)
+LLM_TOKENS = Counter("sovap_llm_tokens_total", "Groq tokens reported in response usage", ["phase", "model", "kind"])
+LLM_COMPLETION_TOKENS = Histogram("sovap_llm_completion_tokens", "Completion tokens per Groq call", ["phase"],
+                                  buckets=(50, 100, 250, 500, 1000, 2000, 3000, 4000, 8000))
+LLM_FAILURES = Counter("sovap_llm_failures_total", "LLM completions that raised", ["phase", "model"])
+LLM_FALLBACKS = Counter("sovap_llm_fallbacks_total", "LLM calls moved to the fallback model", ["from_model", "to_model", "reason"])
+RETRIES = Counter("sovap_retries_total", "Retried operations", ["operation"])
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, not current (macOS/dev)
+
+def emit(kind: str, record: dict):
+    print(f"[span] {json.dumps({'span': kind, **record})}", flush=True)
+
+def record_retry(operation: str):
+    RETRIES.labels(operation=operation).inc()
+
+class PhaseTracker:
+    """One open phase span per course; set_phase() rolls it over, finish() closes it."""
+
+    def __init__(self):
+        self._open = {}      # course_id -> (phase, started)
+        self._pipelines = {} # course_id -> started
+
+    def start(self, course_id: str, phase: str):
+        self._end_phase(course_id)
+        if course_id not in self._pipelines:
+            self._pipelines[course_id] = time.perf_counter()
+            PIPELINES_ACTIVE.inc()
+        self._open[course_id] = (phase, time.perf_counter())
+        current_phase.set(phase)
+
+    def finish(self, course_id: str, status: str):
+        self._end_phase(course_id)
+        started = self._pipelines.pop(course_id, None)
+        if started is not None:
+            PIPELINES_ACTIVE.dec()
+            seconds = time.perf_counter() - started
+            PIPELINE_SECONDS.labels(status=status).observe(seconds)
+            emit("pipeline", {"course_id": course_id, "status": status, "seconds": round(seconds, 3), "rss_mb": round(rss_bytes() / 2**20, 1)})
+
+    def _end_phase(self, course_id: str):
+        opened = self._open.pop(course_id, None)
+        if opened is None:
+            return
+        phase, started = opened
+        self._record(course_id, phase, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def overlapping(self, course_id: str, phase: str):
+        """Span for work that runs next to the course's current phase instead of replacing it."""
+        token = current_phase.set(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            current_phase.reset(token)
+            self._record(course_id, phase, time.perf_counter() - started)
+
+    def _record(self, course_id: str, phase: str, seconds: float):
+        rss = rss_bytes()
+        PHASE_SECONDS.labels(phase=phase).observe(seconds)
+        PHASE_END_RSS.labels(phase=phase).set(rss)
+        emit("phase", {"course_id": course_id, "phase": phase, "seconds": round(seconds, 3), "rss_mb": round(rss / 2**20, 1)})
+
+class LLMSpan:
+    """`with LLMSpan(model) as span:` around one completion; the call site reports what it learns."""
+
+    def __init__(self, model: str, stream: bool = False):
+        self.model = model
+        self.stream = stream
+        self.phase = current_phase.get()
+        self.source = "groq"
+        self.budget_wait = 0.0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.retries = 0
+        self.fallback_from = None
+
+    def cached(self):
+        self.source = "cache"
+
+    def waited(self, seconds: float):
+        self.budget_wait += seconds
+
+    def retry(self):
+        self.retries += 1
+        record_retry("llm")
+
+    def fallback(self, model: str, reason: str):
+        LLM_FALLBACKS.labels(from_model=self.model, to_model=model, reason=reason).inc()
+        self.fallback_from = self.fallback_from or self.model
+        self.model = model
+
+    def set_usage(self, usage):
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+            self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._started
+        LLM_SECONDS.labels(phase=self.phase, model=self.model, source=self.source).observe(seconds)
+        if self.source == "groq":
+            LLM_BUDGET_WAIT.labels(phase=self.phase).observe(self.budget_wait)
+        if self.prompt_tokens:
+            LLM_TOKENS.labels(phase=self.phase, model=self.model, kind="prompt").inc(self.prompt_tokens)
+        if self.completion_tokens:
+            LLM_TOKENS.labels(phase=self.phase, model=self.model, kind="completion").inc(self.completion_tokens)
+            LLM_COMPLETION_TOKENS.labels(phase=self.phase).observe(self.completion_tokens)
+        if exc_type is not None:
+            LLM_FAILURES.labels(phase=self.phase, model=self.model).inc()
+        emit("llm", {
+            "phase": self.phase, "model": self.model, "source": self.source, "stream": self.stream,
+            "seconds": round(seconds, 3), "budget_wait": round(self.budget_wait, 3),
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "retries": self.retries, "fallback_from": self.fallback_from, "error": exc_type.__name__ if exc_type else None,
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+        })
+        return False
+
+def render_metrics() -> tuple:
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
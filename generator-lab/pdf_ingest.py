@@ -0,0 +1,112 @@
+"""
+Source PDF ingestion for /generate-from-pdf.
+
+The upload is spooled to disk in fixed-size chunks, then text is extracted page range by
+page range inside process-pool workers (pypdf is pure Python and CPU-bound). Workers return
+only what the pipeline needs: detected headings, an opening excerpt and, when the source is
+being vectorized, ~CHUNK_CHARS text windows. The API process never holds the whole book.
+
+Kept free of app-level imports so it can run inside spawned workers.
+"""
+import re
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+CHUNK_CHARS = 1200
+MAX_HEADINGS = 60  # per page range and per course context; the outline matters, not every sub-heading
+_HEADING = re.compile(r"^(?:(?:chapter|section|part|unit|module|lesson)\s+[\w.]+|\d+(?:\.\d+){0,2}\.?\s+[A-Z])", re.IGNORECASE)
+
+class UploadTooLarge(ValueError):
+    pass
+
+def spool_upload(src, dest_path: str, max_bytes: int) -> int:
+    """Copies a file-like upload to disk SPOOL_CHUNK_BYTES at a time; returns the byte count."""
+    written = 0
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = src.read(SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            written += len(chunk)
+            if max_bytes and written > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+            out.write(chunk)
+    return written
+
+def pdf_overview(path: str) -> dict:
+    """Page count plus the top-level bookmark titles (the book's own table of contents)."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    outline = []
+    try:
+        for item in reader.outline:
+            # Nested lists are sub-sections; the syllabus only needs chapters
+            if not isinstance(item, list) and getattr(item, "title", None):
+                outline.append(item.title.strip())
+    except Exception:
+        pass
+    return {"pages": len(reader.pages), "outline": outline}
+
+def _heading_lines(text: str) -> list:
+    headings = []
+    for line in text.splitlines():
+        line = line.strip()
+        if 4 <= len(line) <= 80 and (_HEADING.match(line) or (line.isupper() and len(line.split()) <= 8)):
+            headings.append(line)
+    return headings
+
+def _windows(text: str, size: int) -> list:
+    """Splits text into ~size-char windows on whitespace boundaries."""
+    text = re.sub(r"\s+", " ", text).strip()
+    chunks = []
+    while text:
+        if len(text) <= size:
+            chunks.append(text)
+            break
+        cut = text.rfind(" ", 0, size)
+        cut = cut if cut > size // 2 else size
+        chunks.append(text[:cut].strip())
+        text = text[cut:].lstrip()
+    return chunks
+
+def extract_page_range(path: str, start: int, end: int, want_chunks: bool, excerpt_chars: int = 0) -> dict:
+    """Process-pool worker: extracts pages [start, end) and reduces them to headings/excerpt/chunks."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    headings, chunks = [], []
+    excerpt = ""
+    chars = 0
+    for page_no in range(start, min(end, len(reader.pages))):
+        try:
+            text = reader.pages[page_no].extract_text() or ""
+        except Exception:
+            continue
+        chars += len(text)
+        if len(headings) < MAX_HEADINGS:
+            headings.extend((page_no + 1, h) for h in _heading_lines(text))
+        if excerpt_chars and len(excerpt) < excerpt_chars:
+            excerpt = (excerpt + " " + re.sub(r"\s+", " ", text)).strip()[:excerpt_chars]
+        if want_chunks:
+            chunks.extend((page_no + 1, c) for c in _windows(text, CHUNK_CHARS) if len(c) > 50)
+    return {"start": start, "end": end, "chars": chars, "headings": headings[:MAX_HEADINGS], "excerpt": excerpt, "chunks": chunks}
+
+def build_source_context(filename: str, overview: dict, headings: list, excerpt: str, max_chars: int) -> str:
+    """Condenses what was extracted into the `Context:` the syllabus/module prompts consume."""
+    parts = [f"Source textbook '{filename}' ({overview['pages']} pages). Build the course around this material."]
+    if overview["outline"]:
+        parts.append("Table of contents: " + "; ".join(overview["outline"]))
+    seen = set()
+    section_lines = []
+    for page_no, heading in headings:
+        key = heading.lower()
+        if key not in seen:
+            seen.add(key)
+            section_lines.append(f"{heading} (p.{page_no})")
+    if excerpt:
+        parts.append("Opening excerpt: " + excerpt)
+    if section_lines:
+        # Sample evenly so late chapters are represented, and go last so truncation only trims headings
+        step = -(-len(section_lines) // MAX_HEADINGS)
+        parts.append("Section headings: " + "; ".join(section_lines[::step]))
+
+    context = "\n".join(parts)
+    return context[:max_chars]
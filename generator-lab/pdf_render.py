@@ -0,0 +1,264 @@
+"""
+Course PDF rendering.
+
+Runs on the "pdf" process pool. Kept free of app-level imports so it can run inside a
+spawned process-pool worker.
+
+- Unicode: DejaVu (or the TTF fonts in PDF_FONT_DIR) is embedded when available. Without
+  it the core Helvetica/Courier fonts are used, and text is folded to Latin-1 instead of
+  being dropped.
+- Font metrics (character widths, glyph ids) are parsed once per worker and reused by
+  every document that worker renders. Each document only reopens the font file for its
+  own glyph subset.
+- Markdown theory is laid out as headings, paragraphs, bullet/numbered lists, block quotes
+  and code blocks. Inline markers (**, `, _) are stripped.
+- The document is written to a temporary file next to `pdf_path` and renamed into place,
+  so readers never see a half-written PDF.
+"""
+import os
+import re
+import copy
+import logging
+import tempfile
+import unicodedata
+from fpdf import FPDF
+
+# fontTools logs every glyph-subsetting step at INFO, once per embedded font per document
+logging.getLogger("fontTools.subset").setLevel(logging.WARNING)
+
+FONT_DIRS = [d for d in (os.getenv("PDF_FONT_DIR"), "/usr/share/fonts/truetype/dejavu", "/usr/share/fonts/dejavu",
+                         "/usr/share/fonts/TTF", "/Library/Fonts") if d]
+FONT_FILES = {
+    ("sans", ""): "DejaVuSans.ttf",
+    ("sans", "B"): "DejaVuSans-Bold.ttf",
+    ("mono", ""): "DejaVuSansMono.ttf",
+}
+CORE_FONTS = {"sans": "helvetica", "mono": "courier"}
+
+_font_paths = None
+_font_metrics = {}  # (path, style) -> parsed TTFFont, reused across documents in this worker
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_INLINE = re.compile(r"(\*\*|__|`)")
+_EMPHASIS = re.compile(r"(?<![\w*])[*_](?=\S)(.+?)(?<=\S)[*_](?![\w*])")
+# Typographic characters the core fonts lack, folded to their closest Latin-1 form
+_LATIN1_FOLD = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+                              "…": "...", "•": "-", "→": "->", "←": "<-", "≤": "<=", "≥": ">=",
+                              "≠": "!=", "\u200b": ""})
+
+def unicode_fonts() -> dict | None:
+    """{(family, style): path} when every font in FONT_FILES is found, else None."""
+    global _font_paths
+    if _font_paths is None:
+        found = {}
+        for key, name in FONT_FILES.items():
+            path = next((os.path.join(d, name) for d in FONT_DIRS if os.path.exists(os.path.join(d, name))), None)
+            if path:
+                found[key] = path
+        _font_paths = found if len(found) == len(FONT_FILES) else {}
+        if not _font_paths:
+            print(f"[!] PDF fonts {sorted(FONT_FILES.values())} not found in {FONT_DIRS}; non-Latin-1 text will be approximated", flush=True)
+    return _font_paths or None
+
+def _add_font(pdf: FPDF, family: str, style: str, path: str):
+    """
+    add_font() with the parsed metrics cached per worker. fpdf subsets a font's glyph table
+    in place when writing, so each document gets a copy of the metrics with its own freshly
+    opened font file and subset state.
+    """
+    global _font_metrics
+    cached = _font_metrics.get((path, style)) if _font_metrics is not None else None
+    if cached is not None:
+        try:
+            from fontTools import ttLib
+            from fpdf.fonts import SubsetMap
+            font = copy.copy(cached)
+            font.i = len(pdf.fonts) + 1
+            font.ttfont = ttLib.TTFont(path, recalcTimestamp=False, lazy=True)
+            font.missing_glyphs = []
+            font.biggest_size_pt = 0
+            font._hbfont = None
+            font.subset = SubsetMap(font)
+            pdf.fonts[font.fontkey] = font
+            return
+        except Exception as e:
+            # fpdf internals moved: stop caching and let add_font parse every time
+            print(f"[!] PDF font metrics cache disabled: {e}", flush=True)
+            _font_metrics = None
+    pdf.add_font(family, style, path)
+    if _font_metrics is not None:
+        cached = copy.copy(pdf.fonts[f"{family}{style}"])
+        cached.ttfont = cached.subset = None  # per-document state, replaced on every reuse
+        _font_metrics[(path, style)] = cached
+
+def fold_latin1(text: str) -> str:
+    """Text the core fonts can show: typographic characters and accents folded, anything else '?'."""
+    text = text.translate(_LATIN1_FOLD)
+    try:
+        text.encode("latin-1")
+        return text
+    except UnicodeEncodeError:
+        pass
+    folded = []
+    for ch in text:
+        if ord(ch) > 0xFF:
+            ch = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+            ch = ch.encode("latin-1", "replace").decode("latin-1") or "?"
+        folded.append(ch)
+    return "".join(folded)
+
+class CoursePDF(FPDF):
+    def __init__(self, title: str):
+        super().__init__()
+        self.set_auto_page_break(auto=True, margin=15)
+        self.set_title(title)
+        fonts = unicode_fonts()
+        self.unicode = fonts is not None
+        if self.unicode:
+            for (family, style), path in fonts.items():
+                _add_font(self, family, style, path)
+
+    def use(self, family: str, style: str = "", size: float = 11):
+        if self.unicode:
+            self.set_font(family, "B" if style and family == "sans" else "", size)
+        else:
+            self.set_font(CORE_FONTS[family], style, size)
+
+    def text_of(self, text: str) -> str:
+        return text if self.unicode else fold_latin1(text)
+
+    def footer(self):
+        self.set_y(-12)
+        self.use("sans", size=8)
+        self.set_text_color(128)
+        self.cell(0, 8, str(self.page_no()), align="C")
+        self.set_text_color(0)
+
+def inline(text: str) -> str:
+    """Strips inline Markdown markers, keeping their text."""
+    return _EMPHASIS.sub(r"\1", _INLINE.sub("", text))
+
+def markdown_blocks(markdown: str) -> list:
+    """[(kind, payload)] with kind in heading | paragraph | item | quote | code | rule."""
+    blocks = []
+    paragraph, code, fence = [], [], None
+
+    def flush():
+        if paragraph:
+            blocks.append(("paragraph", " ".join(paragraph)))
+            paragraph.clear()
+
+    for line in markdown.replace("\r\n", "\n").replace("\t", "    ").split("\n"):
+        if fence:
+            if line.strip().startswith(fence):
+                blocks.append(("code", "\n".join(code)))
+                code, fence = [], None
+            else:
+                code.append(line)
+            continue
+        opening = _FENCE.match(line)
+        if opening:
+            flush()
+            fence = opening.group(1)
+            continue
+        heading = _HEADING.match(line)
+        item = _LIST_ITEM.match(line)
+        if heading:
+            flush()
+            blocks.append(("heading", (len(heading.group(1)), heading.group(2))))
+        elif _RULE.match(line):
+            flush()
+            blocks.append(("rule", None))
+        elif item:
+            flush()
+            marker = item.group(2)
+            blocks.append(("item", (len(item.group(1)) // 2, marker if marker[0].isdigit() else None, item.group(3))))
+        elif line.lstrip().startswith(">"):
+            flush()
+            blocks.append(("quote", line.lstrip()[1:].strip()))
+        elif not line.strip():
+            flush()
+        elif blocks and blocks[-1][0] == "item" and not paragraph and line.startswith(" "):
+            # Continuation line of a list item
+            depth, marker, text = blocks[-1][1]
+            blocks[-1] = ("item", (depth, marker, f"{text} {line.strip()}"))
+        else:
+            paragraph.append(line.strip())
+    flush()
+    if code:
+        blocks.append(("code", "\n".join(code)))  # unclosed fence
+    return blocks
+
+HEADING_SIZES = {1: 16, 2: 14, 3: 12.5}
+
+def render_markdown(pdf: CoursePDF, markdown: str):
+    width = pdf.epw
+    for kind, payload in markdown_blocks(markdown):
+        pdf.set_x(pdf.l_margin)
+        if kind == "heading":
+            level, text = payload
+            pdf.ln(3)
+            pdf.use("sans", "B", HEADING_SIZES.get(level, 11.5))
+            pdf.multi_cell(width, 7, pdf.text_of(inline(text)), new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(1)
+        elif kind == "paragraph":
+            pdf.use("sans", size=11)
+            pdf.multi_cell(width, 6, pdf.text_of(inline(payload)), new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(2)
+        elif kind == "item":
+            depth, number, text = payload
+            indent = 5 + 6 * min(depth, 4)
+            bullet = number or ("•" if pdf.unicode else "-")
+            pdf.use("sans", size=11)
+            pdf.set_x(pdf.l_margin + indent)
+            pdf.cell(6, 6, pdf.text_of(bullet))
+            pdf.multi_cell(width - indent - 6, 6, pdf.text_of(inline(text)), new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(0.5)
+        elif kind == "quote":
+            pdf.use("sans", size=11)
+            pdf.set_text_color(90)
+            pdf.set_x(pdf.l_margin + 6)
+            pdf.multi_cell(width - 6, 6, pdf.text_of(inline(payload)), new_x="LMARGIN", new_y="NEXT")
+            pdf.set_text_color(0)
+            pdf.ln(1)
+        elif kind == "code":
+            pdf.use("mono", size=8.5)
+            pdf.set_fill_color(242, 242, 242)
+            pdf.multi_cell(width, 4.5, pdf.text_of(payload) or " ", fill=True, new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(2)
+        elif kind == "rule":
+            pdf.ln(2)
+            pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + width, pdf.get_y())
+            pdf.ln(3)
+
+def render_module(pdf: CoursePDF, module: dict):
+    title = str(module.get("title", "Untitled"))
+    pdf.add_page()
+    pdf.start_section(pdf.text_of(title))
+    pdf.use("sans", "B", 18)
+    pdf.multi_cell(pdf.epw, 9, pdf.text_of(f"Module: {title}"), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+    theory = module.get("theory") or "No content available."
+    render_markdown(pdf, theory if isinstance(theory, str) else str(theory))
+
+def render_course_pdf(title: str, modules: list, pdf_path: str) -> str:
+    pdf = CoursePDF(title)
+    pdf.add_page()
+    pdf.use("sans", "B", 20)
+    pdf.ln(60)
+    pdf.multi_cell(pdf.epw, 11, pdf.text_of(f"Course: {title}"), align="C", new_x="LMARGIN", new_y="NEXT")
+    for module in modules:
+        render_module(pdf, module)
+
+    fd, staged = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(pdf_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pdf.output(f)
+        os.replace(staged, pdf_path)
+    except BaseException:
+        os.remove(staged)
+        raise
+    return pdf_path
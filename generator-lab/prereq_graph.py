@@ -0,0 +1,311 @@
+"""
+In-process prerequisite graph for a course, built from each module's `prerequisites` list.
+
+Learning-path queries (topological order, cycles, transitive prerequisites, "what must I
+learn before X") are answered from memory, so /graph works without Neo4j and without a
+round trip. Neo4j is only a write-behind copy:
+
+- PrerequisiteGraph: one course's DAG. Concept names match case- and whitespace-
+  insensitively. Prerequisites that are not modules of the course are reported as
+  dangling. Transitive queries are memoized on the instance.
+- GraphCache: LRU of graphs per course_id. It is replaced when a course is regenerated
+  and invalidated when a new version is stored.
+- GraphSyncer: background task that writes graphs to the remote store. Several updates of
+  one course that arrive while a write is pending are coalesced into a single write
+  against the oldest baseline. Failed writes are retried with backoff. With a journal,
+  pending writes are persisted until they land and replayed by the next process.
+"""
+import heapq
+import asyncio
+import collections
+
+def concept_key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+class PrerequisiteGraph:
+    def __init__(self, prerequisites: dict):
+        """`prerequisites`: {module title: [prerequisite, ...]} in course order."""
+        self._names = {}         # key -> display name, modules first, in course order
+        self._prereqs = {}       # key -> [direct prerequisite keys]
+        self._dependents = {}    # key -> [direct dependent keys]
+        self.modules = []
+        for title in prerequisites:
+            self.modules.append(self._node(title))
+        for title, names in prerequisites.items():
+            concept = concept_key(title)
+            for name in names:
+                prereq = self._node(name)
+                if prereq not in self._prereqs[concept]:
+                    self._prereqs[concept].append(prereq)
+                    self._dependents[prereq].append(concept)
+        self._position = {key: i for i, key in enumerate(self._names)}
+        self._ancestors = {}
+        self._descendants = {}
+        self.cycles = self._find_cycles()
+        self.order = self._topological_order()
+
+    def _node(self, name: str) -> str:
+        key = concept_key(name)
+        if key not in self._names:
+            self._names[key] = " ".join(name.split())
+            self._prereqs[key] = []
+            self._dependents[key] = []
+        return key
+
+    @property
+    def edges(self) -> int:
+        return sum(len(p) for p in self._prereqs.values())
+
+    @property
+    def acyclic(self) -> bool:
+        return not self.cycles
+
+    @property
+    def dangling(self) -> list:
+        """Prerequisites that no module of the course teaches."""
+        modules = set(self.modules)
+        return [self._names[key] for key in self._names if key not in modules]
+
+    def find(self, name: str) -> str | None:
+        """Display name of a concept, or None if the course does not mention it."""
+        return self._names.get(concept_key(name))
+
+    def _find_cycles(self) -> list:
+        """Strongly connected components with a cycle (Tarjan, iterative), as lists of names."""
+        index, low, on_stack, stack, cycles = {}, {}, set(), [], []
+        counter = 0
+        for root in self._names:
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child = work.pop()
+                if child == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                successors = self._dependents[node]
+                if child < len(successors):
+                    work.append((node, child + 1))
+                    nxt = successors[child]
+                    if nxt not in index:
+                        work.append((nxt, 0))
+                    elif nxt in on_stack:
+                        low[node] = min(low[node], index[nxt])
+                    continue
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in self._prereqs[node]:
+                        component.sort(key=self._position.get)
+                        cycles.append([self._names[k] for k in component])
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return cycles
+
+    def _topological_order(self) -> list:
+        """Prerequisites before dependents, ties in course order; concepts stuck behind a cycle go last."""
+        pending = {key: len(p) for key, p in self._prereqs.items()}
+        ready = [self._position[key] for key, n in pending.items() if n == 0]
+        heapq.heapify(ready)
+        keys = list(self._names)
+        order = []
+        while ready:
+            key = keys[heapq.heappop(ready)]
+            order.append(key)
+            for dependent in self._dependents[key]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    heapq.heappush(ready, self._position[dependent])
+        placed = set(order)
+        order += [key for key in keys if key not in placed]
+        return [self._names[key] for key in order]
+
+    def _reach(self, key: str, edges: dict, memo: dict) -> frozenset:
+        if key not in memo:
+            seen, todo = set(), list(edges[key])
+            while todo:
+                node = todo.pop()
+                if node not in seen:
+                    seen.add(node)
+                    todo.extend(edges[node])
+            seen.discard(key)
+            memo[key] = frozenset(seen)
+        return memo[key]
+
+    def _in_order(self, keys) -> list:
+        names = {self._names[k] for k in keys}
+        return [name for name in self.order if name in names]
+
+    def prerequisites(self, name: str) -> list:
+        return [self._names[k] for k in self._prereqs[concept_key(name)]]
+
+    def before(self, name: str) -> list:
+        """Everything to learn before `name`, in a valid learning order."""
+        return self._in_order(self._reach(concept_key(name), self._prereqs, self._ancestors))
+
+    def unlocks(self, name: str) -> list:
+        """Every concept that directly or transitively depends on `name`."""
+        return self._in_order(self._reach(concept_key(name), self._dependents, self._descendants))
+
+    def closure(self) -> dict:
+        """{module: transitive prerequisites in learning order} for every module."""
+        return {self._names[key]: self.before(key) for key in self.modules}
+
+    def summary(self) -> dict:
+        return {
+            "concepts": len(self._names),
+            "modules": len(self.modules),
+            "edges": self.edges,
+            "acyclic": self.acyclic,
+            "cycles": self.cycles,
+            "dangling": self.dangling,
+            "order": self.order,
+        }
+
+class GraphCache:
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._graphs = collections.OrderedDict()
+
+    def get(self, course_id: str) -> PrerequisiteGraph | None:
+        graph = self._graphs.get(course_id)
+        if graph is None:
+            self.misses += 1
+            return None
+        self._graphs.move_to_end(course_id)
+        self.hits += 1
+        return graph
+
+    def put(self, course_id: str, graph: PrerequisiteGraph):
+        if self.max_size <= 0:
+            return
+        self._graphs[course_id] = graph
+        self._graphs.move_to_end(course_id)
+        while len(self._graphs) > self.max_size:
+            self._graphs.popitem(last=False)
+
+    def invalidate(self, course_id: str):
+        self._graphs.pop(course_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._graphs), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+class GraphSyncer:
+    def __init__(self, write, max_attempts: int = 5, backoff: float = 2.0, max_backoff: float = 60.0,
+                 journal=None, on_synced=None):
+        """
+        `write(course_id, prerequisites, baseline)` is a coroutine; baseline None means relink everything.
+        `journal` (e.g. the JobStore) has save_graph_sync / delete_graph_sync / pending_graph_syncs.
+        `on_synced(course_id)` is called once the latest enqueued version of a course has landed.
+        """
+        self._write = write
+        self._journal = journal
+        self._on_synced = on_synced
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._pending = {}  # course_id -> (prerequisites, baseline, failed attempts)
+        self._wakeup = None
+        self._idle = None
+        self._task = None
+        self.synced = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+        if self._journal:
+            replayed = self._journal.pending_graph_syncs()
+            for course_id, (prerequisites, baseline) in replayed.items():
+                self._pending.setdefault(course_id, (prerequisites, baseline, 0))
+            if replayed:
+                print(f"[*] Graph sync: replaying {len(replayed)} writes left pending by the previous process", flush=True)
+                self._idle.clear()
+                self._wakeup.set()
+
+    def enqueue(self, course_id: str, prerequisites: dict, baseline: dict | None):
+        if course_id in self._pending:
+            # The pending write never landed, so its baseline is still what the store holds
+            _, baseline, _ = self._pending[course_id]
+            self.coalesced += 1
+        self._pending[course_id] = (prerequisites, baseline, 0)
+        if self._journal:
+            self._journal.save_graph_sync(course_id, prerequisites, baseline)
+        self._idle.clear()
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            retry_in = None
+            for course_id in list(self._pending):
+                prerequisites, baseline, attempts = self._pending[course_id]
+                try:
+                    await self._write(course_id, prerequisites, baseline)
+                except Exception as e:
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        # Still in the journal, so the next process retries it
+                        self.failed += 1
+                        print(f"[!] Graph sync for {course_id} dropped after {attempts} attempts: {str(e)}", flush=True)
+                    else:
+                        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                        print(f"[!] Graph sync for {course_id} failed ({str(e)}), retry {attempts}/{self.max_attempts - 1} in {delay:.1f}s", flush=True)
+                        retry_in = min(retry_in or delay, delay)
+                        if self._pending.get(course_id, (None,))[0] is prerequisites:
+                            self._pending[course_id] = (prerequisites, baseline, attempts)
+                        continue
+                else:
+                    self.synced += 1
+                # A newer version enqueued during the write stays pending, against what was just written
+                if self._pending.get(course_id, (None,))[0] is prerequisites:
+                    del self._pending[course_id]
+                    if attempts < self.max_attempts:
+                        if self._journal:
+                            self._journal.delete_graph_sync(course_id)
+                        if self._on_synced:
+                            self._on_synced(course_id)
+                elif course_id in self._pending and attempts < self.max_attempts:
+                    newer, _, _ = self._pending[course_id]
+                    self._pending[course_id] = (newer, prerequisites, 0)
+                    if self._journal:
+                        self._journal.save_graph_sync(course_id, newer, prerequisites)
+                    self._wakeup.set()
+            if not self._pending:
+                self._idle.set()
+            elif retry_in is not None:
+                asyncio.get_running_loop().call_later(retry_in, self._wakeup.set)
+
+    async def stop(self, timeout: float = 30.0):
+        """Flushes pending writes (up to `timeout` seconds), then stops the worker."""
+        if not self._task:
+            return
+        if self._pending:
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                print(f"[!] Graph sync: {len(self._pending)} courses not written to the graph store before shutdown"
+                      f"{'; they are replayed on the next start' if self._journal else ''}", flush=True)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "synced": self.synced, "coalesced": self.coalesced, "failed": self.failed}
@@ -0,0 +1,111 @@
+"""
+Local QA heuristics for generated modules (no LLM calls).
+
+Run over every module before any LLM audit is spent: theory length, MCQ structure,
+Markdown sanity and duplication (repeated paragraphs inside a module, near-identical
+theory or titles across modules). Each issue is (severity, message); only modules with
+issues are escalated to a per-module LLM audit.
+"""
+import re
+import json
+
+CRITICAL = "critical"
+WARNING = "warning"
+
+_FENCE = re.compile(r"^\s*(```|~~~)", re.MULTILINE)
+_HEADING = re.compile(r"^#{1,6}\s+\S", re.MULTILINE)
+_LEAKED_JSON = re.compile(r'"(theory|mcqs|code_lab|prerequisites)"\s*:')
+
+def _words(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _words(text)
+    return {hash(tuple(words[i:i + size])) for i in range(max(0, len(words) - size + 1))}
+
+def _answer_matches(answer, options: list) -> bool:
+    """Accepts the option text, its letter ("B", "B)") or its index."""
+    if isinstance(answer, bool):
+        return False
+    if isinstance(answer, int):
+        return 0 <= answer < len(options)
+    if not isinstance(answer, str) or not answer.strip():
+        return False
+    answer = answer.strip()
+    normalized = [str(o).strip().lower() for o in options]
+    if answer.lower() in normalized:
+        return True
+    letter = re.match(r"^\(?([A-Za-z])[\).:]?(\s|$)", answer)
+    return bool(letter) and ord(letter.group(1).upper()) - ord("A") < len(options)
+
+def check_mcqs(mcqs) -> list:
+    if not isinstance(mcqs, list) or not mcqs:
+        return [(WARNING, "no MCQs")]
+    issues = []
+    malformed = 0
+    for mcq in mcqs:
+        if not isinstance(mcq, dict):
+            malformed += 1
+            continue
+        options = mcq.get("options")
+        if (not str(mcq.get("question") or "").strip() or not isinstance(options, list) or len(options) < 2
+                or len({str(o).strip().lower() for o in options}) < len(options)
+                or not _answer_matches(mcq.get("answer"), options)):
+            malformed += 1
+    if malformed:
+        severity = CRITICAL if malformed == len(mcqs) else WARNING
+        issues.append((severity, f"{malformed}/{len(mcqs)} MCQs malformed (question, 2+ distinct options, answer among them)"))
+    return issues
+
+def check_markdown(theory: str) -> list:
+    issues = []
+    if theory.lstrip().startswith("{") or _LEAKED_JSON.search(theory):
+        issues.append((CRITICAL, "raw JSON leaked into theory"))
+    if len(_FENCE.findall(theory)) % 2:
+        issues.append((WARNING, "unclosed code fence"))
+    if not _HEADING.search(theory):
+        issues.append((WARNING, "no Markdown section headings"))
+    if theory.count("\\n") > 5:
+        issues.append((WARNING, "literal \\n escapes in theory"))
+    paragraphs = [p.strip() for p in theory.split("\n\n") if len(p.strip()) >= 40]
+    repeats = max((paragraphs.count(p) for p in set(paragraphs)), default=0)
+    if repeats >= 3:
+        issues.append((WARNING, f"a paragraph is repeated {repeats} times"))
+    return issues
+
+def check_module(module: dict, min_words: int) -> list:
+    """Issues found in one module on its own."""
+    if module.get("fallback"):
+        return [(CRITICAL, "module generation failed (fallback content)")]
+    theory = module.get("theory") or ""
+    if not isinstance(theory, str):
+        theory = json.dumps(theory)
+    issues = []
+    words = len(_words(theory))
+    if words < min_words // 4:
+        issues.append((CRITICAL, f"theory nearly empty ({words} words)"))
+    elif words < min_words:
+        issues.append((WARNING, f"theory short ({words} words, expected {min_words}+)"))
+    issues += check_markdown(theory)
+    if not str(module.get("code_lab") or "").strip():
+        issues.append((WARNING, "no code lab"))
+    issues += check_mcqs(module.get("mcqs"))
+    return issues
+
+def check_course(modules: list, min_words: int, duplicate_similarity: float = 0.8) -> list:
+    """One issue list per module, including duplicate titles and near-identical theory across modules."""
+    issues = [check_module(m, min_words) for m in modules]
+    titles = [str(m.get("title") or "").strip().lower() for m in modules]
+    shingles = [_shingles(m.get("theory") or "") if not m.get("fallback") and isinstance(m.get("theory"), str) else set() for m in modules]
+    for i in range(len(modules)):
+        for j in range(i):
+            if titles[i] and titles[i] == titles[j]:
+                issues[i].append((WARNING, f"same title as module {j + 1}"))
+            if shingles[i] and shingles[j]:
+                similarity = len(shingles[i] & shingles[j]) / len(shingles[i] | shingles[j])
+                if similarity >= duplicate_similarity:
+                    issues[i].append((WARNING, f"theory {similarity:.0%} identical to module {j + 1}"))
+    return issues
+
+def heuristic_score(issues: list) -> int:
+    return max(0, 100 - sum(30 if severity == CRITICAL else 10 for severity, _ in issues))
@@ -0,0 +1,153 @@
+"""
+Bounded pipeline scheduler with admission control and request coalescing.
+
+/generate used to hand every request to BackgroundTasks, so a burst of submissions ran
+dozens of pipelines at once in one process (each holding full course dicts and sharing
+one embedding model) and ended in OOM. At most `max_in_flight` pipelines now run at once,
+fed by a priority queue (higher priority first, FIFO within a priority). A job is started
+the moment a slot is free, so the state submit() returns is the job's real state:
+
+- a submission identical (same `key`) to a job that is already queued or running is
+  coalesced onto that job instead of starting a second pipeline
+- a different submission for an active course_id (e.g. another set of modules to
+  regenerate) waits behind the active job and is queued once that job ends
+- when `max_queued` jobs are already waiting, submit() raises QueueFull with a
+  Retry-After estimate based on recent pipeline durations, and the API answers 429
+"""
+import time
+import heapq
+import asyncio
+import itertools
+
+class QueueFull(Exception):
+    def __init__(self, queued: int, retry_after: int):
+        super().__init__(f"Generation queue is full ({queued} jobs waiting)")
+        self.queued = queued
+        self.retry_after = retry_after
+
+class JobScheduler:
+    def __init__(self, max_in_flight: int, max_queued: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(0, max_queued)
+        self._heap = []          # (-priority, seq, course_id)
+        self._queued = {}        # course_id -> (factory, enqueued_at)
+        self._running = {}       # course_id -> started_at
+        self._tasks = {}         # course_id -> asyncio.Task of the running pipeline
+        self._keys = {}          # course_id -> key of the active (queued or running) job
+        self._followups = {}     # course_id -> [(factory, priority, key)] waiting for the active job
+        self._seq = itertools.count()
+        self._accepting = False
+        self._avg_seconds = None # moving average of pipeline durations, for Retry-After
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def start(self):
+        self._accepting = True
+        self._dispatch()
+
+    async def stop(self):
+        """Stops starting queued jobs and cancels the running ones."""
+        self._accepting = False
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def state(self, course_id: str) -> dict | None:
+        """{"status": "running"} or {"status": "queued", "queue_position": n} for an active job, else None."""
+        if course_id in self._running:
+            return {"status": "running", "queue_position": 0}
+        if course_id in self._queued:
+            return {"status": "queued", "queue_position": self.position(course_id)}
+        return None
+
+    def position(self, course_id: str) -> int:
+        """1-based place in line (jobs that start before it + 1)."""
+        for rank, (_, _, queued_id) in enumerate(sorted(self._heap), start=1):
+            if queued_id == course_id:
+                return rank
+        return 0
+
+    def waiting(self) -> int:
+        return len(self._queued) + sum(len(jobs) for jobs in self._followups.values())
+
+    def coalesces(self, course_id: str, key=None) -> bool:
+        """True if a submission with `key` would join a job already active for course_id (key None: any)."""
+        if self.state(course_id) is None:
+            return False
+        return key is None or key == self._keys.get(course_id) or \
+            any(key == queued_key for _, _, queued_key in self._followups.get(course_id, ()))
+
+    def check_admission(self, course_id: str, key=None):
+        """Raises QueueFull if a new (non-coalesced) job for course_id would be rejected."""
+        if self.coalesces(course_id, key):
+            return
+        starts_now = self.state(course_id) is None and len(self._running) < self.max_in_flight
+        if not starts_now and self.waiting() >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull(self.waiting(), self.retry_after())
+
+    async def submit(self, course_id: str, factory, priority: int = 0, key=None) -> dict:
+        """
+        Queues `factory()` (a coroutine function) for course_id and returns its state plus
+        `coalesced`. Never starts a second pipeline for a course that is already active: an
+        identical submission joins it, a different one waits behind it (its queue_position
+        is then its place behind the active job).
+        """
+        if self.coalesces(course_id, key):
+            self.coalesced += 1
+            return {**self.state(course_id), "coalesced": True}
+        self.check_admission(course_id, key)
+        if self.state(course_id) is not None:
+            followups = self._followups.setdefault(course_id, [])
+            followups.append((factory, priority, key))
+            return {"status": "queued", "queue_position": len(followups), "coalesced": False}
+        self._enqueue(course_id, factory, priority, key)
+        self._dispatch()
+        return {**self.state(course_id), "coalesced": False}
+
+    def _enqueue(self, course_id: str, factory, priority: int, key):
+        self._queued[course_id] = (factory, time.time())
+        self._keys[course_id] = key
+        heapq.heappush(self._heap, (-priority, next(self._seq), course_id))
+
+    def _dispatch(self):
+        while self._accepting and self._heap and len(self._running) < self.max_in_flight:
+            _, _, course_id = heapq.heappop(self._heap)
+            factory, _ = self._queued.pop(course_id)
+            self._running[course_id] = time.perf_counter()
+            self._tasks[course_id] = asyncio.create_task(self._run(course_id, factory))
+
+    def retry_after(self) -> int:
+        average = self._avg_seconds or 60.0
+        waves = (self.waiting() // self.max_in_flight) + 1
+        return max(1, int(average * waves))
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running), "queued": self.waiting(),
+            "max_in_flight": self.max_in_flight, "max_queued": self.max_queued,
+            "completed": self.completed, "coalesced": self.coalesced, "rejected": self.rejected,
+            "avg_pipeline_seconds": round(self._avg_seconds, 1) if self._avg_seconds else None,
+        }
+
+    async def _run(self, course_id: str, factory):
+        try:
+            await factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Scheduled pipeline for {course_id} crashed: {str(e)}", flush=True)
+        finally:
+            seconds = time.perf_counter() - self._running.pop(course_id)
+            self._tasks.pop(course_id, None)
+            self._keys.pop(course_id, None)
+            self.completed += 1
+            self._avg_seconds = seconds if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * seconds
+            followups = self._followups.get(course_id)
+            if followups:
+                self._enqueue(course_id, *followups.pop(0))
+                if not followups:
+                    del self._followups[course_id]
+            self._dispatch()
@@ -0,0 +1,96 @@
+"""
+Incremental JSON parsing for streamed LLM output.
+
+Module expansion returns one JSON object whose members (title, theory, code_lab, mcqs...)
+arrive token by token. IncrementalObjectParser scans each chunk once, tracking only string
+and nesting state, and hands back every top-level member the moment its value closes, so
+the frontend can render `theory` while `mcqs` are still being generated. Members that do
+not parse as-is (unquoted keys, stray characters) set `malformed` and the caller repairs the
+full buffer once the stream ends. Structurally hopeless output (no object after the
+preamble) raises MalformedStream so the caller can abort the completion instead of paying
+for the full token budget.
+"""
+import json
+
+class MalformedStream(ValueError):
+    pass
+
+class IncrementalObjectParser:
+    def __init__(self, max_preamble: int = 400):
+        self.max_preamble = max_preamble
+        self.text = ""
+        self.result = {}
+        self.done = False
+        self.malformed = False  # a member failed to parse; the caller should repair the full buffer
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk and returns [(key, value), ...] for members completed by it."""
+        if self.done or not chunk:
+            return []
+        self.text += chunk
+        completed = []
+        text = self.text
+        pos = self._pos
+
+        if not self._started:
+            start = text.find("{", pos)
+            if start == -1:
+                self._pos = len(text)
+                if len(text) > self.max_preamble:
+                    raise MalformedStream(f"No JSON object within the first {self.max_preamble} characters")
+                return []
+            self._started = True
+            self._depth = 1
+            self._member_start = start + 1
+            pos = start + 1
+
+        n = len(text)
+        while pos < n:
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(text[self._member_start:pos], completed)
+                    self.done = True
+                    pos += 1
+                    break
+            elif ch == "," and self._depth == 1:
+                self._emit(text[self._member_start:pos], completed)
+                self._member_start = pos + 1
+            pos += 1
+
+        self._pos = pos
+        return completed
+
+    def _emit(self, member: str, completed: list):
+        member = member.strip()
+        if not member:
+            return  # `{}` or a trailing comma
+        if not member.startswith('"'):
+            self.malformed = True  # e.g. an unquoted key, which json_repair recovers
+            return
+        try:
+            parsed = json.loads("{" + member + "}", strict=False)
+        except ValueError:
+            self.malformed = True
+            return
+        for key, value in parsed.items():
+            self.result[key] = value
+            completed.append((key, value))
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# app.py reads its configuration at import time: keep the job store and LLM cache out of
+# storage/, never reach GitHub, and don't load the embedding model.
+_state_dir = tempfile.mkdtemp(prefix="generator-lab-tests-")
+os.environ.update({
+    "JOB_STORE_PATH": os.path.join(_state_dir, "jobs.sqlite3"),
+    "LLM_CACHE_PATH": os.path.join(_state_dir, "llm_cache.sqlite3"),
+    "GITHUB_TOKEN": "",
+    "EMBEDDING_WARMUP": "false",
+    "HF_HUB_OFFLINE": "1",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
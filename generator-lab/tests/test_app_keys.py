@@ -0,0 +1,57 @@
+import asyncio
+
+import app
+from llm_cache import LLMCache
+
+MESSAGES = [{"role": "system", "content": "You are a course designer."}, {"role": "user", "content": "Loops"}]
+
+def test_concept_point_ids_are_unique_for_repeated_module_titles():
+    units = [
+        ("Practice", 0, "first practice module", {"module_index": 1}),
+        ("Practice", 0, "second practice module", {"module_index": 4}),
+        ("Practice", 1, "second practice module, part two", {"module_index": 4}),
+    ]
+    ids = [app.concept_point_id("course-1", unit) for unit in units]
+    assert len(set(ids)) == 3
+
+def test_concept_point_ids_are_stable_and_scoped_to_the_course():
+    unit = ("Loops", 2, "text", {"module_index": 0})
+    edited = ("Loops", 2, "edited text", {"module_index": 0})
+    assert app.concept_point_id("course-1", unit) == app.concept_point_id("course-1", edited)
+    assert app.concept_point_id("course-1", unit) != app.concept_point_id("course-2", unit)
+
+def test_source_units_are_keyed_by_label():
+    unit = ("source: notes.pdf", 0, "text", {})
+    assert app.unit_key(unit) == ("source: notes.pdf", 0)
+
+def test_cache_key_covers_model_messages_and_params():
+    key = LLMCache.make_key("model-a", MESSAGES, {"temperature": 0.7, "max_tokens": 800})
+    assert key == LLMCache.make_key("model-a", MESSAGES, {"max_tokens": 800, "temperature": 0.7})
+    assert key != LLMCache.make_key("model-b", MESSAGES, {"temperature": 0.7, "max_tokens": 800})
+    assert key != LLMCache.make_key("model-a", MESSAGES[:1], {"temperature": 0.7, "max_tokens": 800})
+    assert key != LLMCache.make_key("model-a", MESSAGES, {"temperature": 0.2, "max_tokens": 800})
+
+def test_cache_round_trip(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_bytes=1 << 20, ttl_seconds=3600)
+    key = LLMCache.make_key("model-a", MESSAGES, {})
+    assert cache.get(key) is None
+    cache.put(key, '{"title": "Loops"}')
+    assert cache.get(key) == '{"title": "Loops"}'
+    cache.discard(key)
+    assert cache.get(key) is None
+
+def test_fallback_answers_are_not_cached(monkeypatch):
+    async def complete(messages, model, span, reserve_tokens, fallback_model=None, **params):
+        if fallback_model:
+            span.fallback(fallback_model, "rate limited")
+            return "fallback answer"
+        return "primary answer"
+    monkeypatch.setattr(app.llm, "complete", complete)
+
+    fallback_messages = [{"role": "user", "content": "fallback test"}]
+    assert asyncio.run(app.chat_completion(fallback_messages, model="model-a", fallback_model="model-b")) == "fallback answer"
+    assert app.llm_cache.get(LLMCache.make_key("model-a", fallback_messages, {})) is None
+
+    primary_messages = [{"role": "user", "content": "primary test"}]
+    assert asyncio.run(app.chat_completion(primary_messages, model="model-a")) == "primary answer"
+    assert app.llm_cache.get(LLMCache.make_key("model-a", primary_messages, {})) == "primary answer"
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from json_repair import parse_llm_json, repair_json
+
+def test_valid_json_is_unchanged():
+    text = '{"title": "Loops", "mcqs": [{"q": "?", "answer": 1}]}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+def test_markdown_fence_and_preamble_are_stripped():
+    text = 'Sure! Here is the course:\n```json\n{"title": "Loops"}\n```'
+    assert parse_llm_json(text) == {"title": "Loops"}
+
+def test_bracket_in_preamble_does_not_hide_the_object():
+    assert parse_llm_json('Here are [notes]: {"modules": [{"title": "x"}]}') == {"modules": [{"title": "x"}]}
+
+def test_truncated_output_is_closed():
+    assert parse_llm_json('{"a": [1, 2, True,') == {"a": [1, 2, True]}
+
+def test_unquoted_keys_and_trailing_commas():
+    assert parse_llm_json('{title: "Loops", tags: ["a", "b",],}') == {"title": "Loops", "tags": ["a", "b"]}
+
+def test_raw_newlines_in_strings_are_escaped():
+    assert parse_llm_json('{"theory": "line one\nline two"}') == {"theory": "line one\nline two"}
+
+def test_top_level_array_is_repaired_when_allowed():
+    assert json.loads(repair_json('Result: [1, 2', "{[")) == [1, 2]
+
+@pytest.mark.parametrize("text", ["[1, 2]", "no json here", ""])
+def test_parse_llm_json_only_returns_objects(text):
+    try:
+        value = parse_llm_json(text)
+    except ValueError:
+        return
+    assert isinstance(value, dict)
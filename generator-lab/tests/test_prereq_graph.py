@@ -0,0 +1,36 @@
+from prereq_graph import PrerequisiteGraph, concept_key
+
+def test_order_puts_prerequisites_first():
+    graph = PrerequisiteGraph({"Loops": ["Variables"], "Functions": ["loops"], "Variables": []})
+    assert graph.acyclic
+    assert graph.order == ["Variables", "Loops", "Functions"]
+    assert graph.edges == 2
+
+def test_names_match_case_and_whitespace_insensitively():
+    assert concept_key("  Control   Flow ") == concept_key("control flow")
+    graph = PrerequisiteGraph({"Loops": ["variables"], "Variables": []})
+    assert graph.find("LOOPS") == "Loops"
+    assert graph.before("loops") == ["Variables"]
+
+def test_before_and_unlocks_are_transitive():
+    graph = PrerequisiteGraph({"Loops": ["Variables"], "Functions": ["Loops"], "Variables": []})
+    assert graph.before("Functions") == ["Variables", "Loops"]
+    assert graph.unlocks("Variables") == ["Loops", "Functions"]
+    assert graph.closure()["Functions"] == ["Variables", "Loops"]
+
+def test_cycles_are_reported():
+    graph = PrerequisiteGraph({"A": ["C"], "B": ["A"], "C": ["B"], "D": ["A"]})
+    assert not graph.acyclic
+    assert len(graph.cycles) == 1
+    assert sorted(graph.cycles[0]) == ["A", "B", "C"]
+    # every concept still appears in the order, so callers can render it
+    assert sorted(graph.order) == ["A", "B", "C", "D"]
+    assert graph.summary()["acyclic"] is False
+
+def test_self_loop_is_a_cycle():
+    graph = PrerequisiteGraph({"A": ["A"]})
+    assert graph.cycles == [["A"]]
+
+def test_dangling_prerequisites_are_listed():
+    graph = PrerequisiteGraph({"Loops": ["Variables", "Recursion"], "Variables": []})
+    assert graph.dangling == ["Recursion"]
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from scheduler import JobScheduler, QueueFull
+
+def run(coro):
+    return asyncio.run(coro)
+
+def pipeline(log, name, gate):
+    async def factory():
+        log.append(f"start {name}")
+        await gate.wait()
+        log.append(f"end {name}")
+    return factory
+
+def test_submit_reports_running_when_a_slot_is_free():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=1, max_queued=4)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        first = await scheduler.submit("c1", pipeline(log, "c1", gate), key="a")
+        second = await scheduler.submit("c2", pipeline(log, "c2", gate), key="b")
+        await asyncio.sleep(0)
+        assert first == {"status": "running", "queue_position": 0, "coalesced": False}
+        assert second == {"status": "queued", "queue_position": 1, "coalesced": False}
+        assert log == ["start c1"]
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert log == ["start c1", "end c1", "start c2", "end c2"]
+        assert scheduler.stats()["completed"] == 2
+    run(scenario())
+
+def test_identical_submission_is_coalesced():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=2, max_queued=4)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        await scheduler.submit("c1", pipeline(log, "first", gate), key="same")
+        duplicate = await scheduler.submit("c1", pipeline(log, "duplicate", gate), key="same")
+        assert duplicate["coalesced"] and duplicate["status"] == "running"
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert log == ["start first", "end first"]
+        assert scheduler.stats()["coalesced"] == 1
+    run(scenario())
+
+def test_different_submission_for_active_course_runs_after_it():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=2, max_queued=4)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        await scheduler.submit("c1", pipeline(log, "modules 1", gate), key="m1")
+        followup = await scheduler.submit("c1", pipeline(log, "modules 2", gate), key="m2")
+        assert followup == {"status": "queued", "queue_position": 1, "coalesced": False}
+        # the queued follow-up is itself a coalescing target
+        assert scheduler.coalesces("c1", "m2")
+        assert not scheduler.coalesces("c1", "m3")
+        await asyncio.sleep(0)
+        assert log == ["start modules 1"]
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert log == ["start modules 1", "end modules 1", "start modules 2", "end modules 2"]
+        assert scheduler.state("c1") is None
+    run(scenario())
+
+def test_full_queue_rejects_new_jobs_but_not_duplicates():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=1, max_queued=1)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        await scheduler.submit("c1", pipeline(log, "c1", gate), key="a")
+        await scheduler.submit("c2", pipeline(log, "c2", gate), key="b")
+        with pytest.raises(QueueFull) as rejected:
+            await scheduler.submit("c3", pipeline(log, "c3", gate), key="c")
+        assert rejected.value.queued == 1 and rejected.value.retry_after >= 1
+        with pytest.raises(QueueFull):
+            scheduler.check_admission("c1", "different")
+        assert (await scheduler.submit("c2", pipeline(log, "c2 again", gate), key="b"))["coalesced"]
+        assert scheduler.stats()["rejected"] == 2
+        gate.set()
+        await asyncio.sleep(0.01)
+        scheduler.check_admission("c3", "c")
+    run(scenario())
+
+def test_priority_orders_the_queue():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=1, max_queued=4)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        await scheduler.submit("busy", pipeline(log, "busy", gate))
+        await scheduler.submit("low", pipeline(log, "low", gate), priority=0)
+        await scheduler.submit("high", pipeline(log, "high", gate), priority=5)
+        assert scheduler.position("high") == 1 and scheduler.position("low") == 2
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert [entry for entry in log if entry.startswith("start")] == ["start busy", "start high", "start low"]
+    run(scenario())
+
+def test_crashing_pipeline_frees_its_slot():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=1, max_queued=4)
+        scheduler.start()
+        log = []
+        async def crash():
+            raise RuntimeError("boom")
+        async def ok():
+            log.append("ok")
+        await scheduler.submit("c1", crash)
+        await scheduler.submit("c2", ok)
+        await asyncio.sleep(0.01)
+        assert log == ["ok"] and scheduler.stats()["running"] == 0
+    run(scenario())
+
+def test_stop_cancels_running_jobs_and_keeps_queued_ones():
+    async def scenario():
+        scheduler = JobScheduler(max_in_flight=1, max_queued=4)
+        scheduler.start()
+        gate, log = asyncio.Event(), []
+        await scheduler.submit("c1", pipeline(log, "c1", gate))
+        await scheduler.submit("c2", pipeline(log, "c2", gate))
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        assert scheduler.state("c1") is None
+        assert scheduler.state("c2")["status"] == "queued"
+        assert log == ["start c1"]
+    run(scenario())
@@ -0,0 +1,37 @@
+import pytest
+
+from stream_json import IncrementalObjectParser, MalformedStream
+
+def test_members_are_emitted_as_soon_as_they_close():
+    parser = IncrementalObjectParser()
+    assert parser.feed('Sure! {"title": "Loops", "theo') == [("title", "Loops")]
+    assert parser.feed('ry": "for and while", "mcqs": [{"q": "a, b"}') == [("theory", "for and while")]
+    assert not parser.done
+    assert parser.feed("]}") == [("mcqs", [{"q": "a, b"}])]
+    assert parser.done
+    assert parser.result == {"title": "Loops", "theory": "for and while", "mcqs": [{"q": "a, b"}]}
+
+def test_braces_and_escapes_inside_strings_are_ignored():
+    parser = IncrementalObjectParser()
+    completed = []
+    for ch in '{"code": "if (x) { print(\\"}\\") }", "n": 1}':
+        completed += parser.feed(ch)
+    assert completed == [("code", 'if (x) { print("}") }'), ("n", 1)]
+    assert parser.done and not parser.malformed
+
+def test_unquoted_key_marks_the_stream_malformed():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{title: "Loops", "n": 1}') == [("n", 1)]
+    assert parser.malformed
+    assert parser.text == '{title: "Loops", "n": 1}'
+
+def test_long_preamble_aborts_the_stream():
+    parser = IncrementalObjectParser(max_preamble=10)
+    with pytest.raises(MalformedStream):
+        parser.feed("I cannot help with that request.")
+
+def test_feed_after_done_is_ignored():
+    parser = IncrementalObjectParser()
+    parser.feed('{"a": 1}')
+    assert parser.feed(' {"b": 2}') == []
+    assert parser.result == {"a": 1}